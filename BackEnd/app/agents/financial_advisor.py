@@ -1,50 +1,83 @@
 import os
+from functools import lru_cache
 from pathlib import Path
 from agno.agent import Agent
-from agno.models.ollama import Ollama
 from agno.knowledge.combined import CombinedKnowledgeBase
 from agno.knowledge.pdf import PDFKnowledgeBase
 from agno.knowledge.docx import DocxKnowledgeBase
 from agno.knowledge.text import TextKnowledgeBase
-from agno.vectordb.lancedb import LanceDb, SearchType
-from agno.embedder.ollama import OllamaEmbedder
+from agno.vectordb.lancedb import SearchType
 from agno.tools.yfinance import YFinanceTools
 from agno.storage.sqlite import SqliteStorage
 from agno.memory.v2.db.sqlite import SqliteMemoryDb
 from agno.memory.v2.memory import Memory
 
-def get_agent() -> Agent:
+from app.core.config import settings
+from app.services.embedding_cache import CachedEmbedder, get_embedding_cache
+from app.services.ollama_pool import get_ollama_pool
+from app.services.vector_store import LEGACY_TABLES, KnowledgeStore
+
+@lru_cache(maxsize=1)
+def get_knowledge() -> CombinedKnowledgeBase:
     """
-    Configures and returns the Financial Advisor agent with a knowledge base,
-    reasoning tools, and enhanced memory.
+    The knowledge base, built once: every instance of the agent searches
+    the same table and shares its result cache.
     """
-    agent_name = "Financial Advisor"
-    
     # Ensure tmp directory for databases and uploads exists
     os.makedirs("tmp/uploads", exist_ok=True)
     
     upload_path = Path("tmp/uploads")
-    lancedb_uri = "tmp/lancedb"
-    embedder = OllamaEmbedder(id="mxbai-embed-large", host="http://localhost:11434", dimensions=1024)
+    lancedb_uri = settings.LANCEDB_URI
+    ollama = get_ollama_pool()
+    # Serve previously embedded chunks (and repeated queries) from the local cache
+    embedder = CachedEmbedder(
+        embedder=ollama.embedder(id=settings.EMBEDDING_MODEL, dimensions=settings.EMBEDDING_DIMENSIONS),
+        cache=get_embedding_cache(settings.EMBEDDING_CACHE_PATH, settings.EMBEDDING_CACHE_MAX_BYTES),
+    )
     
-    # 1. Knowledge Base from local directory using CombinedKnowledgeBase
+    # Knowledge Base from local directory using CombinedKnowledgeBase
     knowledge = CombinedKnowledgeBase(
+        # The sources only read and chunk their file types; every chunk goes to the one table below
         sources=[
-            PDFKnowledgeBase(
-                path=upload_path,
-                vector_db=LanceDb(uri=lancedb_uri, table_name="local_docs_pdf", search_type=SearchType.hybrid, embedder=embedder)
-            ),
-            DocxKnowledgeBase(
-                path=upload_path,
-                vector_db=LanceDb(uri=lancedb_uri, table_name="local_docs_docx", search_type=SearchType.hybrid, embedder=embedder)
-            ),
-            TextKnowledgeBase(
-                path=upload_path,
-                vector_db=LanceDb(uri=lancedb_uri, table_name="local_docs_txt", search_type=SearchType.hybrid, embedder=embedder)
-            ),
+            PDFKnowledgeBase(path=upload_path),
+            DocxKnowledgeBase(path=upload_path),
+            TextKnowledgeBase(path=upload_path),
         ],
-        vector_db=LanceDb(uri=lancedb_uri, table_name="local_docs_combined", search_type=SearchType.hybrid, embedder=embedder)
+        # Chunks of every source type, searchable by source_type / file_id; cached, ANN-indexed once large
+        vector_db=KnowledgeStore(
+            uri=lancedb_uri,
+            table_name="knowledge_vectors",
+            search_type=SearchType.hybrid,
+            embedder=embedder,
+            cache_max_entries=settings.RETRIEVAL_CACHE_MAX_ENTRIES,
+            nprobes=settings.RETRIEVAL_NPROBES or None,
+            refine_factor=settings.RETRIEVAL_REFINE_FACTOR or None,
+            ef=settings.RETRIEVAL_HNSW_EF or None,
+            rerank=settings.RETRIEVAL_RERANKER,
+            vector_weight=settings.RETRIEVAL_VECTOR_WEIGHT,
+            index_type=settings.VECTOR_INDEX_TYPE or None,
+            index_min_rows=settings.VECTOR_INDEX_MIN_ROWS,
+            index_refresh_rows=settings.VECTOR_INDEX_REFRESH_ROWS,
+        ),
+        num_documents=settings.RETRIEVAL_TOP_K,
+        # Lets the agent's knowledge_filters restrict searches, e.g. {"source_type": "pdf"}
+        valid_metadata_filters={"source_type", "file_id", "filename"},
     )
+    # One-shot move of chunks from the former per-source and combined tables
+    knowledge.vector_db.migrate(LEGACY_TABLES)
+    return knowledge
+
+def get_agent() -> Agent:
+    """
+    Configures and returns the Financial Advisor agent with a knowledge base,
+    reasoning tools, and enhanced memory.
+    """
+    agent_name = "Financial Advisor"
+    # Chat and memory share pooled connections to the configured Ollama hosts
+    ollama = get_ollama_pool()
+
+    # 1. Knowledge base, shared by every instance
+    knowledge = get_knowledge()
 
     # 2. Storage for agent sessions
     storage = SqliteStorage(table_name="agent_sessions", db_file="tmp/agent.db")
@@ -52,7 +85,7 @@ def get_agent() -> Agent:
     # 3. Enhanced Memory
     memory = Memory(
         # Use Ollama for creating and managing memories
-        model=Ollama(id="mistral", host="http://localhost:11434"),
+        model=ollama.model(id=settings.OLLAMA_CHAT_MODEL),
         # Store memories in a SQLite database
         db=SqliteMemoryDb(table_name="user_memories", db_file="tmp/agent.db"),
         # Enable memory management
@@ -73,7 +106,7 @@ def get_agent() -> Agent:
     return Agent(
         name=agent_name,
         description="Expert financial advisor with reasoning, knowledge, and memory capabilities.",
-        model=Ollama(id="mistral", host="http://localhost:11434"),
+        model=ollama.model(id=settings.OLLAMA_CHAT_MODEL),
         instructions=instructions,
         knowledge=knowledge,
         tools=[
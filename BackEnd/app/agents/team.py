@@ -0,0 +1,10 @@
+from agno.agent import Agent
+
+from app.services.agent_team import get_agent_team
+
+def get_agent() -> Agent:
+    """
+    Returns a Manager of the specialist team defined in app/core/default_agents.py.
+    It delegates each question to one or several specialists, who answer in parallel.
+    """
+    return get_agent_team().build_manager()
@@ -1,22 +1,133 @@
-from sqlalchemy import create_engine
+import logging
+
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
 
-engine = create_engine(
-    settings.SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False, "timeout": 15},
-)
+logger = logging.getLogger(__name__)
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers proceed while one writer commits, which matters with
+    # several uvicorn workers sharing the file; NORMAL is durable under WAL
+    # except for the last transactions on power loss.
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_SECONDS * 1000)}")
+    cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_BYTES}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+def _normalize_url(url: str) -> str:
+    if url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://"):]
+    return url
+
+def _engine_options(url: str) -> dict:
+    if url.startswith("sqlite"):
+        return {"connect_args": {"check_same_thread": False, "timeout": settings.SQLITE_BUSY_TIMEOUT_SECONDS}}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": True,
+    }
+
+def create_db_engine(url: str) -> Engine:
+    """
+    Creates the engine for `url`: SQLite gets WAL and busy-timeout pragmas on
+    every connection, other databases (PostgreSQL) a tuned connection pool.
+    """
+    url = _normalize_url(url)
+    db_engine = create_engine(url, **_engine_options(url))
+    if url.startswith("sqlite"):
+        event.listen(db_engine, "connect", _set_sqlite_pragmas)
+    return db_engine
+
+def async_database_url(url: str) -> str:
+    """Maps a sync database URL to its async driver (aiosqlite / asyncpg)."""
+    parsed = make_url(_normalize_url(url))
+    if parsed.get_backend_name() == "sqlite":
+        return parsed.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+    if parsed.get_backend_name() == "postgresql":
+        return parsed.set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+    return url
+
+def create_async_db_engine(url: str) -> AsyncEngine:
+    """The async counterpart of `create_db_engine`, with the same pragmas and pool."""
+    async_engine = create_async_engine(url, **_engine_options(url))
+    if url.startswith("sqlite"):
+        event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return async_engine
+
+engine = create_db_engine(settings.SQLALCHEMY_DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Used by the async endpoints, so they never wait for a threadpool slot
+async_engine = create_async_db_engine(settings.ASYNC_DATABASE_URL or async_database_url(settings.SQLALCHEMY_DATABASE_URL))
+
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
+def _column_names(bind, table_name: str) -> set:
+    return {column["name"] for column in inspect(bind).get_columns(table_name)}
+
+def _add_column(bind, table, column) -> None:
+    preparer = bind.dialect.identifier_preparer
+    column_type = column.type.compile(dialect=bind.dialect)
+    try:
+        with bind.begin() as connection:
+            # Every worker migrates at startup; another may have added it since we looked
+            if column.name in _column_names(connection, table.name):
+                return
+            connection.execute(text(
+                f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.format_column(column)} {column_type}"
+            ))
+        logger.info(f"Added column {table.name}.{column.name}")
+    except SQLAlchemyError:
+        # Losing the race to add it (duplicate column) is fine
+        if column.name not in _column_names(bind, table.name):
+            raise
+
+def add_missing_columns(bind=engine):
+    """
+    `create_all` only creates missing tables. Adds columns that models gained
+    since a table was created (they must be nullable) and any missing indexes.
+    Safe to run from several workers at once.
+    """
+    inspector = inspect(bind)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                _add_column(bind, table, column)
+        for index in table.indexes:
+            try:
+                index.create(bind=bind, checkfirst=True)
+            except SQLAlchemyError as e:
+                if index.name in {existing_index["name"] for existing_index in inspect(bind).get_indexes(table.name)}:
+                    continue
+                # e.g. a unique index over rows that already repeat a value
+                logger.error(f"Could not create index {index.name}: {e}")
+
 # Dependency to get a DB session
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db 
\ No newline at end of file
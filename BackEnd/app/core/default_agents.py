@@ -13,6 +13,8 @@ BASE_INSTRUCTIONS = [
 # Default tools for most agents
 DEFAULT_TOOLS = ["reasoning", "duckduckgo"]
 
+# `keywords` are case-insensitive regexes: a message matching those of exactly
+# one specialist is routed straight to it, without asking the Manager.
 SPECIALIST_AGENTS: List[Dict[str, Any]] = [
     {
         "name": "PersonalFinanceGPT",
@@ -22,6 +24,7 @@ SPECIALIST_AGENTS: List[Dict[str, Any]] = [
             "Your domain is personal finance.",
             "Provide clear, actionable advice on topics like creating budgets, managing debt, saving for goals, and understanding retirement accounts (e.g., 401(k), IRA)."
         ],
+        "keywords": [r"\b(budget\w*|saving|savings|debt|credit card|mortgage|loan|ira|roth|retire\w*|emergency fund|net worth)\b|\b401\(?k\b"],
         "tools": DEFAULT_TOOLS
     },
     {
@@ -33,6 +36,7 @@ SPECIALIST_AGENTS: List[Dict[str, Any]] = [
             "Answer questions related to financial statements, tax laws, compliance, and auditing procedures.",
             "Use tables to present numerical data clearly."
         ],
+        "keywords": [r"\b(tax\w*|vat|gst|deduct\w*|audit\w*|balance sheet|income statement|cash flow statement|ledger|depreciation|accounting|ifrs|gaap)\b"],
         "tools": DEFAULT_TOOLS
     },
     {
@@ -44,6 +48,7 @@ SPECIALIST_AGENTS: List[Dict[str, Any]] = [
             "Explain legal concepts, summarize case law, and describe legal procedures.",
             "Always include a disclaimer that you are an AI assistant and not a substitute for a human lawyer."
         ],
+        "keywords": [r"\b(law|laws|legal\w*|lawsuit|sue|court|contract|lawyer|attorney|liabilit\w*|regulation\w*|compliance|copyright|trademark)\b"],
         "tools": DEFAULT_TOOLS
     },
     {
@@ -55,6 +60,7 @@ SPECIALIST_AGENTS: List[Dict[str, Any]] = [
             "Analyze stocks using the provided tools, interpret market trends, and explain investment strategies.",
             "Use the yfinance tool to get real-time data."
         ],
+        "keywords": [r"\b(stocks?|shares?|ticker|nasdaq|nyse|s&p|dow jones|dividend\w*|earnings|ipo|etf\w*|options?|portfolio)\b|\$[A-Za-z]{1,5}\b"],
         "tools": DEFAULT_TOOLS + ["yfinance"]
     },
     {
@@ -65,6 +71,7 @@ SPECIALIST_AGENTS: List[Dict[str, Any]] = [
             "Your domain is economics.",
             "Analyze and explain macroeconomic indicators (e.g., GDP, inflation, unemployment), fiscal and monetary policy, and market structures."
         ],
+        "keywords": [r"\b(econom\w*|inflation|gdp|recession|interest rates?|unemployment|central bank|federal reserve|fed|monetary|fiscal|cpi)\b"],
         "tools": DEFAULT_TOOLS + ["yfinance"]
     },
     {
@@ -76,6 +83,7 @@ SPECIALIST_AGENTS: List[Dict[str, Any]] = [
             "Describe symptoms, explain medical conditions and treatments, and offer general wellness tips.",
             "Always include a disclaimer that you are an AI assistant and not a substitute for a human medical professional."
         ],
+        "keywords": [r"\b(health|medical|medicine|doctor|symptoms?|disease|diagnos\w*|treatment|medication|pain|fever|diet|blood pressure)\b"],
         "tools": DEFAULT_TOOLS
     }
 ]
@@ -4,12 +4,11 @@ import bcrypt
 from jose import jwt, JWTError, ExpiredSignatureError
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
 
 from app.core.config import settings
-from app.core.database import get_db
-from app.models.user import User
+from app.core.database import SessionLocal
 from app.schemas.token import TokenPayload
+from app.services.principal_cache import Principal, get_principal_cache
 
 security = HTTPBearer()
 
@@ -27,13 +26,12 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
 def get_password_hash(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)).decode('utf-8')
 
 def get_current_user(
-    db: Session = Depends(get_db),
     credentials: HTTPAuthorizationCredentials = Depends(security)
-) -> User:
-    """Verify JWT token and return user object"""
+) -> Principal:
+    """Verify JWT token and return the (cached) user principal"""
     if not credentials or credentials.credentials == "null":
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -46,7 +44,7 @@ def get_current_user(
             credentials.credentials, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
         )
         token_data = TokenPayload(**payload)
-        username = token_data.username
+        username = token_data.sub or token_data.username
         if username is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -66,7 +64,7 @@ def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
         
-    user = db.query(User).filter(User.username == username).first()
+    user = get_principal_cache().load(username, SessionLocal)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -79,7 +77,7 @@ def get_current_user(
         )
     return user
 
-def get_current_active_admin(current_user: User = Depends(get_current_user)) -> User:
+def get_current_active_admin(current_user: Principal = Depends(get_current_user)) -> Principal:
     if not current_user.is_admin:
         raise HTTPException(
             status_code=403, detail="The user doesn't have enough privileges"
@@ -1,10 +1,12 @@
-from sqlalchemy import Column, Integer, Text, Boolean, DateTime, String, ForeignKey
+from sqlalchemy import Column, Integer, Text, Boolean, DateTime, String, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 from datetime import datetime
 
 class UserQuestion(Base):
     __tablename__ = "user_questions"
+    # Serves a user's history newest first (keyset pagination on timestamp, id)
+    __table_args__ = (Index("ix_user_questions_user_id_timestamp", "user_id", "timestamp", "id"),)
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     question = Column(Text, nullable=False)
@@ -12,5 +14,6 @@ class UserQuestion(Base):
     agent_used = Column(String)
     timestamp = Column(DateTime, default=datetime.utcnow)
     success = Column(Boolean, default=True)
+    latency_ms = Column(Integer)
 
     user = relationship("User", back_populates="questions")
\ No newline at end of file
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, DateTime, func
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, ForeignKey, Index, func
 from app.core.database import Base
 from enum import Enum as PyEnum
+from datetime import datetime
 
 class IngestionStatus(str, PyEnum):
     PROCESSING = "processing"
@@ -9,9 +10,71 @@ class IngestionStatus(str, PyEnum):
 
 class KnowledgeFile(Base):
     __tablename__ = "knowledge_files"
+    # Concurrent uploads of the same content can't both be registered
+    __table_args__ = (Index("ux_knowledge_files_content_hash", "content_hash", unique=True),)
 
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String, unique=True, index=True, nullable=False)
     status = Column(String, default=IngestionStatus.PROCESSING, nullable=False)
+    content_hash = Column(String(64))
+    size_bytes = Column(BigInteger)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now()) 
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now()) 
+
+class KnowledgeChunk(Base):
+    """Maps a knowledge file to the vector db rows (chunk ids) it produced."""
+    __tablename__ = "knowledge_chunks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    file_id = Column(Integer, ForeignKey("knowledge_files.id"), index=True, nullable=False)
+    doc_id = Column(String, index=True, nullable=False)
+
+class JobKind(str, PyEnum):
+    INGEST = "ingest"
+    REBUILD = "rebuild"
+
+class JobStatus(str, PyEnum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+class IngestionJob(Base):
+    """
+    A durable unit of knowledge base work. Workers claim pending jobs (or
+    running jobs whose lease expired, e.g. after a restart) and report progress
+    on the row while they work.
+    """
+    __tablename__ = "ingestion_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, default=JobKind.INGEST, nullable=False)
+    file_id = Column(Integer, ForeignKey("knowledge_files.id"), index=True, nullable=True)
+    status = Column(String, default=JobStatus.PENDING, index=True, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    error = Column(Text)
+    pages_parsed = Column(Integer, default=0, nullable=False)
+    chunks_total = Column(Integer, default=0, nullable=False)
+    chunks_embedded = Column(Integer, default=0, nullable=False)
+    lease_owner = Column(String)
+    lease_expires_at = Column(DateTime)
+    available_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = Column(DateTime)
+
+class UploadSession(Base):
+    """A resumable upload in progress; `received_bytes` is where the next chunk starts."""
+    __tablename__ = "upload_sessions"
+
+    id = Column(String(32), primary_key=True)
+    filename = Column(String, nullable=False)
+    size_bytes = Column(BigInteger, nullable=False)
+    received_bytes = Column(BigInteger, default=0, nullable=False)
+    # Held by the request appending a chunk, so requests on other workers can't append concurrently
+    lease_owner = Column(String(32))
+    lease_expires_at = Column(DateTime)
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -5,4 +5,10 @@ class SystemConfig(Base):
     __tablename__ = "system_config"
     id = Column(Integer, primary_key=True)
     key = Column(String, unique=True, index=True, nullable=False)
-    value = Column(String, nullable=False) 
\ No newline at end of file
+    value = Column(String, nullable=False)
+
+class SystemConfigVersion(Base):
+    """A single row bumped on every config write; workers poll it to notice changes."""
+    __tablename__ = "system_config_version"
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
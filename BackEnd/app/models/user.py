@@ -12,6 +12,9 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     is_admin = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Maintained by the chat history writer as questions are recorded
+    chat_requests_count = Column(Integer, default=0)
+    last_activity = Column(DateTime)
     
     sessions = relationship("UserSession", back_populates="user")
     questions = relationship("UserQuestion", back_populates="user")
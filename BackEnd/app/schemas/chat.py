@@ -1,10 +1,53 @@
 from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime
 
 class ChatRequest(BaseModel):
     """Chat request model"""
     message: str
+    # Set to False to always generate a fresh answer
+    use_cache: bool = True
 
 class ChatResponse(BaseModel):
     """Chat response model"""
     response: str
-    timestamp: str 
\ No newline at end of file
+    timestamp: str
+
+class ChatStreamRequest(ChatRequest):
+    """Streaming chat request model"""
+    pass
+
+class ChatStreamChunk(BaseModel):
+    """A single event of a streamed chat answer.
+
+    `event` is "delta" for an incremental piece of the answer, "done" for the
+    final event (carrying the full `response`, like `ChatResponse`) and
+    "error" if generation failed midway. `cached` is set on "done" when the
+    answer came from the answer cache, `coalesced` when it was shared with a
+    concurrent request for the same question.
+    """
+    event: str
+    content: str = ""
+    response: Optional[str] = None
+    timestamp: Optional[str] = None
+    cached: Optional[bool] = None
+    coalesced: Optional[bool] = None
+
+
+class ChatHistoryItem(BaseModel):
+    """A recorded question and the agent's answer"""
+    id: int
+    question: str
+    answer: Optional[str] = None
+    agent_used: Optional[str] = None
+    timestamp: datetime
+    success: bool
+    latency_ms: Optional[int] = None
+
+    class Config:
+        from_attributes = True
+
+class ChatHistoryPage(BaseModel):
+    """A page of history, newest first; pass `next_cursor` as `cursor` for the next page"""
+    items: List[ChatHistoryItem]
+    next_cursor: Optional[str] = None
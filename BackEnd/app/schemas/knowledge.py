@@ -15,8 +15,42 @@ class KnowledgeFileBase(BaseModel):
 class KnowledgeFileCreate(KnowledgeFileBase):
     pass
 
+class IngestionJob(BaseModel):
+    id: int
+    kind: str
+    file_id: Optional[int] = None
+    status: str
+    attempts: int
+    error: Optional[str] = None
+    pages_parsed: int
+    chunks_total: int
+    chunks_embedded: int
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 class KnowledgeFile(KnowledgeFileBase):
     id: int
+    content_hash: Optional[str] = None
+    size_bytes: Optional[int] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    job: Optional[IngestionJob] = None
+
+    class Config:
+        from_attributes = True
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    size_bytes: int
+
+class UploadSession(BaseModel):
+    id: str
+    filename: str
+    size_bytes: int
+    received_bytes: int
     created_at: datetime
     updated_at: Optional[datetime] = None
 
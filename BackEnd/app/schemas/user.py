@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, ConfigDict
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class UserBase(BaseModel):
@@ -38,6 +38,10 @@ class UserAdminDetailResponse(User):
     last_activity: Optional[datetime] = None
     total_requests: int = 0
 
+class UserPage(BaseModel):
+    items: List[UserAdminDetailResponse]
+    next_cursor: Optional[str] = None
+
 class UserInDB(UserInDBBase):
     hashed_password: str
 
@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class AgentQueueFullError(Exception):
+    """Raised when the runner is at capacity and the wait queue is full."""
+
+
+class AgentRunTimeoutError(Exception):
+    """Raised when a run (including its time in the queue) exceeds its timeout."""
+
+
+class _StreamError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_STREAM_DONE = object()
+
+
+class AgentRunner:
+    """
+    Runs blocking agent calls on a dedicated thread pool so they never block
+    the event loop.
+
+    At most `max_concurrency` runs execute at once and at most `max_queue`
+    more may wait for a slot; anything beyond that is rejected immediately.
+    A slot is only released once the worker thread has actually finished, so
+    timed-out runs still count against capacity until Ollama lets go of them.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, timeout_seconds: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout_seconds = timeout_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="agent-run")
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+        self.running = 0
+        self.waiting = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.cancelled = 0
+        self.dequeued = 0
+        self.total_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.max_run_seconds = 0.0
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        return self._slots
+
+    def _release(self, started: float, failed: bool) -> None:
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.running -= 1
+            self.total_run_seconds += elapsed
+            self.max_run_seconds = max(self.max_run_seconds, elapsed)
+            if failed:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    async def _acquire(self, timeout: Optional[float]) -> Tuple[asyncio.Semaphore, float, float]:
+        """Admits a run and waits for a free slot; returns (slots, deadline, timeout)."""
+        with self._lock:
+            if self.running + self.waiting >= self.max_concurrency + self.max_queue:
+                self.rejected += 1
+                raise AgentQueueFullError(
+                    f"Agent runner is at capacity ({self.running} running, {self.waiting} waiting)."
+                )
+            self.waiting += 1
+
+        timeout = self.timeout_seconds if timeout is None else timeout
+        deadline = time.perf_counter() + timeout
+        slots = self._get_slots()
+        queued = time.perf_counter()
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timed_out += 1
+            raise AgentRunTimeoutError(f"Timed out after {timeout:.0f}s waiting for a free agent worker.")
+        finally:
+            waited = time.perf_counter() - queued
+            with self._lock:
+                self.waiting -= 1
+                self.dequeued += 1
+                self.total_wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        return slots, deadline, timeout
+
+    def _start(self, slots: asyncio.Semaphore, fn: Callable[[], Any]) -> asyncio.Future:
+        with self._lock:
+            self.running += 1
+        started = time.perf_counter()
+        future = asyncio.get_running_loop().run_in_executor(self._executor, fn)
+
+        def _on_done(f: asyncio.Future) -> None:
+            self._release(started, failed=f.cancelled() or f.exception() is not None)
+            slots.release()
+
+        future.add_done_callback(_on_done)
+        return future
+
+    async def run(self, fn: Callable[..., Any], *args: Any, timeout: Optional[float] = None, **kwargs: Any) -> Any:
+        """Runs `fn(*args, **kwargs)` on the pool, subject to admission control."""
+        slots, deadline, timeout = await self._acquire(timeout)
+        future = self._start(slots, lambda: fn(*args, **kwargs))
+        try:
+            # shield() keeps the executor future alive so the slot is released
+            # only when the worker thread is really done.
+            return await asyncio.wait_for(asyncio.shield(future), timeout=max(deadline - time.perf_counter(), 0))
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timed_out += 1
+            raise AgentRunTimeoutError(f"Agent run exceeded the {timeout:.0f}s timeout.")
+
+    async def stream(
+        self, fn: Callable[..., Iterable[Any]], *args: Any, timeout: Optional[float] = None, **kwargs: Any
+    ) -> AsyncIterator[Any]:
+        """
+        Admits `fn(*args, **kwargs)` (which must return an iterator) and starts
+        consuming it on the pool. Admission errors are raised here, before any
+        item is produced; the returned async iterator yields the items.
+
+        Closing the returned iterator early (e.g. the client went away) stops
+        the worker at the next item and closes the underlying generator.
+        """
+        slots, deadline, timeout = await self._acquire(timeout)
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+
+        def _put(item: Any) -> None:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                # The loop is gone (shutdown); nobody is listening any more.
+                stop.set()
+
+        def _pump() -> None:
+            try:
+                iterator = iter(fn(*args, **kwargs))
+                try:
+                    for item in iterator:
+                        if stop.is_set():
+                            break
+                        _put(item)
+                finally:
+                    close = getattr(iterator, "close", None)
+                    if close is not None:
+                        close()
+            except BaseException as e:
+                _put(_StreamError(e))
+                raise
+            finally:
+                _put(_STREAM_DONE)
+
+        self._start(slots, _pump)
+        return self._drain(queue, stop, deadline, timeout)
+
+    async def _drain(
+        self, queue: asyncio.Queue, stop: threading.Event, deadline: float, timeout: float
+    ) -> AsyncIterator[Any]:
+        finished = False
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=max(deadline - time.perf_counter(), 0))
+                except asyncio.TimeoutError:
+                    with self._lock:
+                        self.timed_out += 1
+                    raise AgentRunTimeoutError(f"Agent stream exceeded the {timeout:.0f}s timeout.")
+                if item is _STREAM_DONE:
+                    finished = True
+                    return
+                if isinstance(item, _StreamError):
+                    finished = True
+                    raise item.error
+                yield item
+        finally:
+            if not finished:
+                stop.set()
+                with self._lock:
+                    self.cancelled += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            finished = self.completed + self.failed
+            return {
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "timeout_seconds": self.timeout_seconds,
+                "running": self.running,
+                "queue_depth": self.waiting,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "cancelled_streams": self.cancelled,
+                "avg_wait_seconds": self.total_wait_seconds / self.dequeued if self.dequeued else 0.0,
+                "max_wait_seconds": self.max_wait_seconds,
+                "avg_run_seconds": self.total_run_seconds / finished if finished else 0.0,
+                "max_run_seconds": self.max_run_seconds,
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
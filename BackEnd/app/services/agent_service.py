@@ -1 +1,221 @@
- 
\ No newline at end of file
+import hashlib
+import importlib.util
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from agno.agent import Agent
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AgentEntry:
+    """A loaded agent, the pool of instances built like it and the fingerprint of the file it came from."""
+    agent: Optional[Agent] = None
+    factory: Optional[Callable[[], Agent]] = None
+    idle: List[Agent] = field(default_factory=list)
+    instances: int = 0
+    mtime_ns: int = 0
+    sha256: str = ""
+    loaded_at: float = 0.0
+    load_seconds: float = 0.0
+    loads: int = 0
+    reloads: int = 0
+    hits: int = 0
+    failures: int = 0
+    last_error: Optional[str] = None
+    # Fingerprint of the file version that failed to load, and when to try it again
+    failed_mtime_ns: int = 0
+    failed_sha256: str = ""
+    retry_at: float = 0.0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+
+class AgentRegistry:
+    """
+    Process-wide registry of agents defined in `<agent_dir>/<name>.py`.
+
+    Each agent module is executed once and kept warm, and only reloaded when
+    the file's contents change (checked cheaply by mtime first, then
+    confirmed by hash). Agents keep per-run state (session, run id and
+    response), so every `run`/`stream` takes an idle instance of its own,
+    calling the module's `get_agent()` again only when all are busy.
+
+    A file that fails to load is not tried again for `retry_seconds`,
+    unless it changes; meanwhile the previous instance (if any) is served.
+    """
+
+    def __init__(self, agent_dir: Path, retry_seconds: float = 30.0):
+        self.agent_dir = Path(agent_dir)
+        self.retry_seconds = retry_seconds
+        self._entries: Dict[str, AgentEntry] = {}
+        self._entries_lock = threading.Lock()
+        self._pool_lock = threading.Lock()
+
+    def _entry(self, name: str) -> AgentEntry:
+        with self._entries_lock:
+            return self._entries.setdefault(name, AgentEntry())
+
+    def _build(self, name: str, agent_file: Path) -> Tuple[Agent, Callable[[], Agent]]:
+        spec = importlib.util.spec_from_file_location(name, agent_file)
+        agent_module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(agent_module)
+        if not hasattr(agent_module, "get_agent"):
+            raise AttributeError(f"{agent_file.name} does not define get_agent()")
+        return agent_module.get_agent(), agent_module.get_agent
+
+    def _backing_off(self, entry: AgentEntry, mtime_ns: int, sha256: Optional[str] = None) -> bool:
+        if time.monotonic() >= entry.retry_at:
+            return False
+        if sha256 is None:
+            return entry.failed_mtime_ns == mtime_ns
+        return entry.failed_sha256 == sha256
+
+    def get(self, name: str) -> Optional[Agent]:
+        """
+        Returns the warm agent for `name`, (re)loading it if its file changed.
+        Use it for the agent's name and knowledge; runs go through `run`/`stream`.
+        """
+        agent_file = self.agent_dir / f"{name}.py"
+        if not agent_file.exists():
+            logger.error(f"Agent file not found: {agent_file}")
+            return None
+
+        entry = self._entry(name)
+        mtime_ns = agent_file.stat().st_mtime_ns
+        if entry.agent is not None and entry.mtime_ns == mtime_ns:
+            entry.hits += 1
+            return entry.agent
+        if self._backing_off(entry, mtime_ns):
+            return entry.agent
+
+        with entry.lock:
+            # Another thread may have finished the load while we waited.
+            mtime_ns = agent_file.stat().st_mtime_ns
+            if entry.agent is not None and entry.mtime_ns == mtime_ns:
+                entry.hits += 1
+                return entry.agent
+
+            source = agent_file.read_bytes()
+            sha256 = hashlib.sha256(source).hexdigest()
+            if entry.agent is not None and entry.sha256 == sha256:
+                # Touched but unchanged: keep the warm instance.
+                entry.mtime_ns = mtime_ns
+                entry.hits += 1
+                return entry.agent
+            if self._backing_off(entry, mtime_ns, sha256):
+                # Touched but still the version that failed
+                entry.failed_mtime_ns = mtime_ns
+                return entry.agent
+
+            reloading = entry.agent is not None
+            logger.info(f"{'Reloading' if reloading else 'Loading'} agent '{name}' from {agent_file}.")
+            started = time.perf_counter()
+            try:
+                agent, factory = self._build(name, agent_file)
+            except Exception as e:
+                entry.failures += 1
+                entry.last_error = str(e)
+                entry.failed_mtime_ns = mtime_ns
+                entry.failed_sha256 = sha256
+                entry.retry_at = time.monotonic() + self.retry_seconds
+                logger.error(
+                    f"Failed to load agent from {agent_file.name}, retrying in {self.retry_seconds:.0f}s "
+                    f"or once it changes: {e}", exc_info=True
+                )
+                # Keep serving the previous instance if a hot reload fails.
+                return entry.agent
+
+            entry.agent = agent
+            entry.factory = factory
+            with self._pool_lock:
+                # Instances of the previous version go back to the old list and are dropped with it
+                entry.idle = [agent]
+                entry.instances = 1
+            entry.mtime_ns = mtime_ns
+            entry.sha256 = sha256
+            entry.loaded_at = time.time()
+            entry.load_seconds = time.perf_counter() - started
+            entry.loads += 1
+            entry.last_error = None
+            entry.retry_at = 0.0
+            if reloading:
+                entry.reloads += 1
+            logger.info(f"Loaded agent '{agent.name}' in {entry.load_seconds:.3f}s.")
+            return agent
+
+    def _take(self, name: str) -> Tuple[Agent, List[Agent]]:
+        """Returns an idle instance of the agent and the pool to give it back to."""
+        if self.get(name) is None:
+            raise RuntimeError(f"Agent '{name}' is not available.")
+        entry = self._entry(name)
+        with self._pool_lock:
+            idle, factory = entry.idle, entry.factory
+            agent = idle.pop() if idle else None
+            if agent is None:
+                entry.instances += 1
+        if agent is not None:
+            return agent, idle
+        try:
+            return factory(), idle
+        except Exception:
+            with self._pool_lock:
+                entry.instances -= 1
+            raise
+
+    def _give_back(self, agent: Agent, idle: List[Agent]) -> None:
+        with self._pool_lock:
+            idle.append(agent)
+
+    def run(self, name: str, message: str, user_id: Optional[str] = None, session_id: Optional[str] = None) -> Any:
+        """Runs the agent on an instance no other run is using; blocking."""
+        agent, idle = self._take(name)
+        try:
+            # Explicit: agno would otherwise fall back to the instance's sticky `stream` flag
+            return agent.run(message, stream=False, user_id=user_id, session_id=session_id)
+        finally:
+            self._give_back(agent, idle)
+
+    def stream(self, name: str, message: str, user_id: Optional[str] = None, session_id: Optional[str] = None) -> Iterator[Any]:
+        """Runs the agent with streaming on an instance of its own, yielding its run events."""
+        agent, idle = self._take(name)
+        stream, stream_intermediate_steps = agent.stream, agent.stream_intermediate_steps
+        try:
+            yield from agent.run(message, stream=True, user_id=user_id, session_id=session_id)
+        finally:
+            # agno leaves stream=True set on the instance; the next run may not want it
+            agent.stream, agent.stream_intermediate_steps = stream, stream_intermediate_steps
+            self._give_back(agent, idle)
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        """Drops one (or every) cached agent so the next `get` rebuilds it."""
+        with self._entries_lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._entries_lock:
+            entries = dict(self._entries)
+        return {
+            name: {
+                "loaded": entry.agent is not None,
+                "instances": entry.instances,
+                "idle_instances": len(entry.idle),
+                "agent_name": entry.agent.name if entry.agent is not None else None,
+                "sha256": entry.sha256,
+                "loaded_at": entry.loaded_at,
+                "load_seconds": entry.load_seconds,
+                "loads": entry.loads,
+                "reloads": entry.reloads,
+                "cache_hits": entry.hits,
+                "failures": entry.failures,
+                "last_error": entry.last_error,
+            }
+            for name, entry in entries.items()
+        }
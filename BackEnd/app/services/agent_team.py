@@ -0,0 +1,269 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Dict, Iterator, List, Optional
+
+from agno.agent import Agent
+
+from app.core.config import settings
+from app.core.default_agents import MANAGER_AGENT, SPECIALIST_AGENTS
+from app.services.ollama_pool import OllamaPool, get_ollama_pool
+
+logger = logging.getLogger(__name__)
+
+
+def build_tools(names: List[str]) -> List[Any]:
+    """Instantiates the agno toolkits named in an agent definition; unavailable ones are skipped."""
+    tools = []
+    for name in names:
+        try:
+            if name == "reasoning":
+                from agno.tools.reasoning import ReasoningTools
+                tools.append(ReasoningTools())
+            elif name == "duckduckgo":
+                from agno.tools.duckduckgo import DuckDuckGoTools
+                tools.append(DuckDuckGoTools())
+            elif name == "yfinance":
+                from agno.tools.yfinance import YFinanceTools
+                tools.append(YFinanceTools(stock_price=True, analyst_recommendations=True, company_info=True))
+            else:
+                logger.warning(f"Unknown agent tool '{name}', skipping it.")
+        except ImportError as e:
+            logger.warning(f"Agent tool '{name}' is not available, skipping it: {e}")
+    return tools
+
+
+class Specialist:
+    """
+    A specialist built from its definition. Agents keep per-run state, so
+    concurrent calls each take an idle instance, building another only when
+    all are busy.
+    """
+
+    def __init__(self, definition: Dict[str, Any], ollama: OllamaPool):
+        self.definition = definition
+        self.name: str = definition["name"]
+        self.ollama = ollama
+        self._idle: List[Agent] = [self._build()]
+        self._lock = threading.Lock()
+        self.instances = 1
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.total_seconds = 0.0
+
+    def _build(self) -> Agent:
+        return Agent(
+            name=self.name,
+            description=self.definition["description"],
+            model=self.ollama.model(id=self.definition.get("model_id") or settings.OLLAMA_CHAT_MODEL),
+            instructions=self.definition["instructions"],
+            tools=build_tools(self.definition.get("tools", [])),
+            markdown=True,
+        )
+
+    def _take(self) -> Agent:
+        with self._lock:
+            agent = self._idle.pop() if self._idle else None
+            if agent is None:
+                self.instances += 1
+        return agent if agent is not None else self._build()
+
+    def run(self, task: str) -> str:
+        agent = self._take()
+        started = time.perf_counter()
+        try:
+            # Explicit: agno would otherwise fall back to the instance's sticky `stream` flag
+            response = agent.run(task, stream=False)
+            return response.content if isinstance(getattr(response, "content", None), str) else str(response)
+        except Exception:
+            with self._lock:
+                self.failures += 1
+            raise
+        finally:
+            with self._lock:
+                self.calls += 1
+                self.total_seconds += time.perf_counter() - started
+                self._idle.append(agent)
+
+    def stream(self, task: str) -> Iterator[Any]:
+        """Runs the specialist with streaming, yielding the agent's run events."""
+        agent = self._take()
+        stream, stream_intermediate_steps = agent.stream, agent.stream_intermediate_steps
+        started = time.perf_counter()
+        try:
+            yield from agent.run(task, stream=True)
+        except Exception:
+            with self._lock:
+                self.failures += 1
+            raise
+        finally:
+            # agno leaves stream=True set on the instance; the next run may not want it
+            agent.stream, agent.stream_intermediate_steps = stream, stream_intermediate_steps
+            with self._lock:
+                self.calls += 1
+                self.total_seconds += time.perf_counter() - started
+                self._idle.append(agent)
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "failures": self.failures,
+                "timeouts": self.timeouts,
+                "instances": self.instances,
+                "avg_seconds": self.total_seconds / self.calls if self.calls else 0.0,
+            }
+
+
+class AgentTeam:
+    """
+    The Manager and its specialists, built from `default_agents`.
+
+    The Manager answers through its `delegate_to_specialist` tool, which
+    asks one or several specialists at once: their runs execute in parallel
+    on a dedicated pool, each limited to `specialist_timeout_seconds` and all
+    together to `latency_budget_seconds`, so a question spanning several
+    domains takes about as long as its slowest specialist. Specialists that
+    miss the deadline are reported as such and their answers dropped.
+    """
+
+    def __init__(
+        self,
+        specialists: List[Dict[str, Any]],
+        manager: Dict[str, Any],
+        ollama: OllamaPool,
+        max_parallel: int,
+        specialist_timeout_seconds: float,
+        latency_budget_seconds: float,
+    ):
+        self.specialist_timeout_seconds = specialist_timeout_seconds
+        self.latency_budget_seconds = latency_budget_seconds
+        self.specialists: Dict[str, Specialist] = {d["name"]: Specialist(d, ollama) for d in specialists}
+        self._executor = ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="specialist")
+        self._lock = threading.Lock()
+        self.delegations = 0
+        self.specialist_calls = 0
+        self.unknown_specialists = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.manager_definition = manager
+        self.ollama = ollama
+
+    def build_manager(self) -> Agent:
+        """A new Manager instance; the registry pools them, as runs must not share one."""
+        manager = self.manager_definition
+        return Agent(
+            name=manager["name"],
+            description=manager["description"],
+            model=self.ollama.model(id=manager.get("model_id") or settings.OLLAMA_CHAT_MODEL),
+            instructions=manager["instructions"] + [
+                "To consult several specialists, name them all in a single 'delegate_to_specialist' call; they work in parallel.",
+            ],
+            tools=build_tools(manager.get("tools", [])) + [self.delegate_to_specialist],
+            add_datetime_to_instructions=True,
+            markdown=True,
+        )
+
+    def _resolve(self, names: List[str]) -> List[str]:
+        by_key = {name.casefold(): name for name in self.specialists}
+        resolved = []
+        for name in names:
+            match = by_key.get(str(name).strip().casefold())
+            if match is None:
+                with self._lock:
+                    self.unknown_specialists += 1
+            elif match not in resolved:
+                resolved.append(match)
+        return resolved
+
+    def ask(self, names: List[str], task: str) -> Dict[str, str]:
+        """Asks the named specialists in parallel; returns each one's answer or why there is none."""
+        started = time.monotonic()
+        deadline = started + self.latency_budget_seconds
+        futures = {name: self._executor.submit(self.specialists[name].run, task) for name in names}
+        answers = {}
+        for name, future in futures.items():
+            timeout = max(0.0, min(started + self.specialist_timeout_seconds, deadline) - time.monotonic())
+            try:
+                answers[name] = future.result(timeout=timeout)
+            except FutureTimeoutError:
+                # The run keeps its worker until Ollama finishes; only its answer is dropped.
+                future.cancel()
+                self.specialists[name].record_timeout()
+                logger.warning(f"Specialist {name} did not answer within {time.monotonic() - started:.1f}s.")
+                answers[name] = "(No answer in time.)"
+            except Exception as e:
+                logger.error(f"Specialist {name} failed: {e}")
+                answers[name] = "(Unavailable.)"
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self.delegations += 1
+            self.specialist_calls += len(names)
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+        return answers
+
+    def delegate_to_specialist(self, specialists: List[str], task: str) -> str:
+        """Delegates a task to one or more specialists, who work on it in parallel.
+
+        Args:
+            specialists: Names of the specialists to ask, e.g. ["StockMarketGPT", "EconomistGPT"].
+            task: A precise, self-contained description of what they should answer.
+
+        Returns:
+            Each specialist's answer, headed by its name.
+        """
+        names = self._resolve(specialists if isinstance(specialists, list) else [specialists])
+        if not names:
+            return "No such specialist. Available specialists: " + ", ".join(self.specialists) + "."
+        answers = self.ask(names, task)
+        return "\n\n".join(f"## {name}\n{answer}" for name, answer in answers.items())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "specialist_timeout_seconds": self.specialist_timeout_seconds,
+                "latency_budget_seconds": self.latency_budget_seconds,
+                "delegations": self.delegations,
+                "specialist_calls": self.specialist_calls,
+                "avg_fan_out": self.specialist_calls / self.delegations if self.delegations else 0.0,
+                "avg_delegation_seconds": self.total_seconds / self.delegations if self.delegations else 0.0,
+                "max_delegation_seconds": self.max_seconds,
+                "unknown_specialists": self.unknown_specialists,
+                "specialists": {name: specialist.stats() for name, specialist in self.specialists.items()},
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_team: Optional[AgentTeam] = None
+_team_lock = threading.Lock()
+
+
+def get_agent_team() -> AgentTeam:
+    """Returns the process-wide team, building it on first use."""
+    global _team
+    with _team_lock:
+        if _team is None:
+            _team = AgentTeam(
+                specialists=SPECIALIST_AGENTS,
+                manager=MANAGER_AGENT,
+                ollama=get_ollama_pool(),
+                max_parallel=settings.TEAM_MAX_PARALLEL_SPECIALISTS,
+                specialist_timeout_seconds=settings.TEAM_SPECIALIST_TIMEOUT_SECONDS,
+                latency_budget_seconds=settings.TEAM_LATENCY_BUDGET_SECONDS,
+            )
+        return _team
+
+
+def get_agent_team_if_built() -> Optional[AgentTeam]:
+    """Returns the team if something has used it, without building it."""
+    return _team
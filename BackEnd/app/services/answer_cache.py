@@ -0,0 +1,255 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.shared_state import SharedState
+
+logger = logging.getLogger(__name__)
+
+Embed = Callable[[str], Optional[List[float]]]
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    generation_seconds: float
+    created_at: float
+    vector: Optional[np.ndarray] = None
+    scope: str = ""
+
+
+class AnswerCache:
+    """
+    Caches agent answers by question so repeated questions skip generation.
+
+    Answers are kept per `scope` (the asking user's agent session), since
+    they depend on that user's history and memories. Within a scope,
+    questions are matched exactly after normalization (case, whitespace,
+    trailing punctuation) and, if `similarity_threshold` is set, by cosine
+    similarity of their embeddings. Entries expire after `ttl_seconds` and the
+    whole cache is dropped by `invalidate()` whenever the knowledge base
+    changes. Answers generated across an invalidation are not stored: callers
+    pass the `version` they read before generating.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int, similarity_threshold: Optional[float]):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[str, CachedAnswer]" = OrderedDict()
+        self._matrices: Dict[str, Tuple[List[str], np.ndarray]] = {}
+        self._lock = threading.Lock()
+        self.version = 0
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.invalidations = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        return re.sub(r"\s+", " ", question).strip().rstrip("?!. ").casefold()
+
+    @classmethod
+    def key(cls, question: str, scope: str) -> str:
+        return f"{scope}:{cls.normalize(question)}"
+
+    @property
+    def semantic(self) -> bool:
+        return bool(self.similarity_threshold)
+
+    def _expire_locked(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        expired = [key for key, entry in self._entries.items() if entry.created_at < cutoff]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrices.clear()
+
+    def _nearest_locked(self, vector: np.ndarray, scope: str) -> Optional[CachedAnswer]:
+        if scope not in self._matrices:
+            keys = [key for key, entry in self._entries.items() if entry.vector is not None and entry.scope == scope]
+            matrix = np.stack([self._entries[key].vector for key in keys]) if keys else np.empty((0, len(vector)))
+            self._matrices[scope] = (keys, matrix)
+        keys, matrix = self._matrices[scope]
+        if not keys or matrix.shape[1] != len(vector):
+            return None
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+        return self._entries[keys[best]]
+
+    def _hit_locked(self, key: str, entry: CachedAnswer, semantic: bool) -> CachedAnswer:
+        self._entries.move_to_end(key)
+        if semantic:
+            self.semantic_hits += 1
+        else:
+            self.exact_hits += 1
+        self.saved_seconds += entry.generation_seconds
+        return entry
+
+    @staticmethod
+    def _unit(embedding: Optional[List[float]]) -> Optional[np.ndarray]:
+        if not embedding:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else None
+
+    def lookup(self, question: str, embed: Optional[Embed] = None, scope: str = "") -> Tuple[Optional[CachedAnswer], Optional[np.ndarray]]:
+        """
+        Returns `(cached answer or None, question vector)` for `question`
+        asked in `scope`. `embed` is only
+        called when there is no exact match; pass the vector back to `store`
+        on a miss. May block on `embed`, so call it off the event loop.
+        """
+        key = self.key(question, scope)
+        with self._lock:
+            self._expire_locked()
+            entry = self._entries.get(key)
+            if entry is not None:
+                return self._hit_locked(key, entry, semantic=False), None
+            if not self.semantic or embed is None:
+                self.misses += 1
+                return None, None
+
+        try:
+            vector = self._unit(embed(question))
+        except Exception as e:
+            logger.warning(f"Could not embed question for the answer cache: {e}")
+            vector = None
+
+        with self._lock:
+            entry = self._nearest_locked(vector, scope) if vector is not None else None
+            if entry is not None:
+                return self._hit_locked(self.key(entry.question, scope), entry, semantic=True), vector
+            self.misses += 1
+            return None, vector
+
+    def store(
+        self,
+        question: str,
+        answer: str,
+        generation_seconds: float,
+        version: int,
+        vector: Optional[np.ndarray] = None,
+        scope: str = "",
+    ) -> None:
+        if not answer:
+            return
+        key = self.key(question, scope)
+        with self._lock:
+            if version != self.version:
+                return
+            self._entries[key] = CachedAnswer(question, answer, generation_seconds, time.time(), vector, scope)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrices.clear()
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self.bypassed += 1
+
+    def invalidate(self) -> None:
+        """Drops every cached answer, e.g. because the knowledge base changed."""
+        with self._lock:
+            self._entries.clear()
+            self._matrices.clear()
+            self.version += 1
+            self.invalidations += 1
+        logger.info("Answer cache invalidated.")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            lookups = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "similarity_threshold": self.similarity_threshold,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_ratio": hits / lookups if lookups else 0.0,
+                "saved_generation_seconds": round(self.saved_seconds, 3),
+                "invalidations": self.invalidations,
+            }
+
+
+class SharedAnswers:
+    """
+    Second-level answer cache in shared state (Redis), so a question answered
+    by one worker is a hit on all of them. Exact matches only, per scope as
+    in `AnswerCache`.
+
+    `invalidate()` bumps a shared generation and broadcasts it; every worker
+    then drops its local `AnswerCache` and ignores shared entries stored
+    under an older generation. Without Redis only the local cache is used.
+    """
+
+    def __init__(self, state: SharedState, cache: AnswerCache):
+        self.state = state
+        self.cache = cache
+        self.generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stored = 0
+        state.subscribe("answers", self._on_invalidate)
+
+    @staticmethod
+    def _key(question: str, scope: str) -> str:
+        return "answer:" + hashlib.sha256(AnswerCache.key(question, scope).encode()).hexdigest()
+
+    def _on_invalidate(self, generation: str) -> None:
+        with self._lock:
+            self.generation = max(self.generation, int(generation))
+        self.cache.invalidate()
+
+    async def start(self) -> None:
+        self.generation = int(await self.state.get_json("answers:generation") or 0)
+
+    async def get(self, question: str, scope: str = "") -> Optional[CachedAnswer]:
+        if not self.state.shared:
+            return None
+        entry = await self.state.get_json(self._key(question, scope))
+        if not entry or entry["generation"] < self.generation:
+            return None
+        with self._lock:
+            self.hits += 1
+        return CachedAnswer(entry["question"], entry["answer"], entry["generation_seconds"], entry["created_at"], scope=scope)
+
+    async def put(self, question: str, answer: str, generation_seconds: float, version: int, scope: str = "") -> None:
+        """Shares an answer; `version` is the local cache version read before generating."""
+        if not answer or not self.state.shared or version != self.cache.version:
+            return
+        entry = {
+            "question": question,
+            "answer": answer,
+            "generation_seconds": generation_seconds,
+            "created_at": time.time(),
+            "generation": self.generation,
+        }
+        await self.state.set_json(self._key(question, scope), entry, self.cache.ttl_seconds)
+        with self._lock:
+            self.stored += 1
+
+    async def invalidate(self) -> None:
+        """Drops every cached answer on every worker."""
+        await self.state.publish("answers", str(await self.state.incr("answers:generation")))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"shared": self.state.shared, "generation": self.generation, "hits": self.hits, "stored": self.stored}
@@ -0,0 +1,221 @@
+import asyncio
+import base64
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, case, func, insert, or_, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from app.models.chat import UserQuestion
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """An opaque keyset cursor pointing just past the given row."""
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{row_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Raises ValueError for a malformed cursor."""
+    try:
+        timestamp, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def backfill_user_stats(bind: Engine) -> int:
+    """
+    Computes chat_requests_count and last_activity for users that predate
+    the maintained counters. Returns the number of users updated.
+    """
+    questions = UserQuestion.__table__
+    users = User.__table__
+    with bind.begin() as connection:
+        result = connection.execute(
+            update(users)
+            .where(users.c.chat_requests_count.is_(None))
+            .values(
+                chat_requests_count=select(func.count(questions.c.id)).where(questions.c.user_id == users.c.id).scalar_subquery(),
+                last_activity=select(func.max(questions.c.timestamp)).where(questions.c.user_id == users.c.id).scalar_subquery(),
+            )
+        )
+    if result.rowcount:
+        logger.info(f"Backfilled chat statistics for {result.rowcount} users")
+    return result.rowcount
+
+
+class ChatHistoryWriter:
+    """
+    Write-behind buffer for chat history.
+
+    `record()` only appends to an in-memory buffer, so answering a question
+    never waits on the database. A background task inserts buffered rows in
+    batches every `flush_seconds`, or sooner once `batch_size` rows are
+    waiting. If the database falls behind, the buffer is capped at
+    `max_buffer` rows and the oldest are dropped (and counted). When a
+    batch fails, its rows are written one by one: rows the database rejects
+    (e.g. of a user deleted meanwhile) are dropped, so they can't hold up
+    the rows behind them.
+
+    Each batch also bumps the users' chat_requests_count and last_activity
+    in the same transaction, so admin pages never have to count questions.
+    """
+
+    def __init__(self, session_factory: sessionmaker, batch_size: int, flush_seconds: float, max_buffer: int):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_buffer = max_buffer
+        self._buffer: Deque[Dict[str, Any]] = deque()
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.rejected = 0
+
+    def record(
+        self,
+        user_id: int,
+        question: str,
+        answer: Optional[str],
+        agent_used: Optional[str],
+        latency_ms: Optional[int],
+        success: bool,
+    ) -> None:
+        row = {
+            "user_id": user_id,
+            "question": question,
+            "answer": answer,
+            "agent_used": agent_used,
+            "latency_ms": latency_ms,
+            "success": success,
+            "timestamp": datetime.utcnow(),
+        }
+        with self._lock:
+            self._buffer.append(row)
+            while len(self._buffer) > self.max_buffer:
+                self._buffer.popleft()
+                self.dropped += 1
+            full = len(self._buffer) >= self.batch_size
+        if full and self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _take(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+        return rows
+
+    def _write(self, rows: List[Dict[str, Any]]) -> None:
+        activity: Dict[int, Tuple[int, datetime]] = {}
+        for row in rows:
+            count, last = activity.get(row["user_id"], (0, row["timestamp"]))
+            activity[row["user_id"]] = (count + 1, max(last, row["timestamp"]))
+        users = User.__table__
+        with self.session_factory() as db:
+            db.execute(insert(UserQuestion), rows)
+            # Updated in id order so concurrent workers lock rows in the same order.
+            db.connection().execute(
+                update(users)
+                .where(users.c.id == bindparam("user_id_"))
+                .values(
+                    chat_requests_count=func.coalesce(users.c.chat_requests_count, 0) + bindparam("count_"),
+                    last_activity=case(
+                        (or_(users.c.last_activity.is_(None), users.c.last_activity < bindparam("last_")), bindparam("last_")),
+                        else_=users.c.last_activity,
+                    ),
+                ),
+                [{"user_id_": user_id, "count_": count, "last_": last} for user_id, (count, last) in sorted(activity.items())],
+            )
+            db.commit()
+
+    def _write_each(self, rows: List[Dict[str, Any]]) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        Writes the rows of a failed batch one at a time, dropping those the
+        database rejects. Returns the number written and the rows to retry
+        later, from the first that failed for another reason (e.g. the
+        database is down).
+        """
+        written = 0
+        for index, row in enumerate(rows):
+            try:
+                self._write([row])
+            except (IntegrityError, DataError) as e:
+                logger.error(f"Dropped a chat history row of user {row['user_id']} that the database rejects: {e}")
+                with self._lock:
+                    self.rejected += 1
+            except Exception as e:
+                logger.error(f"Failed to write {len(rows) - index} chat history rows: {e}")
+                return written, rows[index:]
+            else:
+                written += 1
+        return written, []
+
+    async def flush(self) -> None:
+        """Writes everything buffered so far."""
+        loop = asyncio.get_running_loop()
+        while rows := self._take():
+            try:
+                await loop.run_in_executor(None, self._write, rows)
+                written, retry = len(rows), []
+            except Exception as e:
+                logger.warning(f"Failed to write a batch of {len(rows)} chat history rows, writing them one by one: {e}")
+                with self._lock:
+                    self.failed_flushes += 1
+                written, retry = await loop.run_in_executor(None, self._write_each, rows)
+            with self._lock:
+                self.written += written
+                self.flushes += 1
+                if retry:
+                    # Put them back for the next flush; the cap still applies.
+                    self._buffer.extendleft(reversed(retry))
+                    while len(self._buffer) > self.max_buffer:
+                        self._buffer.popleft()
+                        self.dropped += 1
+            if retry:
+                return
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "buffered": len(self._buffer),
+                "max_buffer": self.max_buffer,
+                "batch_size": self.batch_size,
+                "written": self.written,
+                "dropped": self.dropped,
+                "flushes": self.flushes,
+                "failed_flushes": self.failed_flushes,
+                "rejected": self.rejected,
+            }
@@ -0,0 +1,50 @@
+import ipaddress
+import logging
+from typing import List, Optional, Union
+
+from fastapi import Request
+
+logger = logging.getLogger(__name__)
+
+
+class TrustedProxies:
+    """
+    Resolves the client IP of requests that come through reverse proxies.
+
+    `proxies` is a comma-separated list of addresses or networks (e.g. the
+    ingress pods' range). When a request arrives from one of them, the
+    client is the nearest `X-Forwarded-For` hop that is not a trusted proxy;
+    from anyone else, the header could be forged and is ignored.
+    """
+
+    def __init__(self, proxies: str):
+        self.networks: List[Union[ipaddress.IPv4Network, ipaddress.IPv6Network]] = []
+        for proxy in proxies.split(","):
+            if not proxy.strip():
+                continue
+            try:
+                self.networks.append(ipaddress.ip_network(proxy.strip(), strict=False))
+            except ValueError:
+                logger.error(f"Ignoring invalid trusted proxy '{proxy.strip()}'")
+
+    def trusts(self, host: Optional[str]) -> bool:
+        try:
+            address = ipaddress.ip_address(host or "")
+        except ValueError:
+            return False
+        return any(address in network for network in self.networks)
+
+    def resolve(self, peer: Optional[str], forwarded_for: List[str]) -> str:
+        """The client IP, given the connecting peer and the `X-Forwarded-For` header values."""
+        client = peer or "unknown"
+        if not self.trusts(peer):
+            return client
+        hops = [hop.strip() for value in forwarded_for for hop in value.split(",") if hop.strip()]
+        for hop in reversed(hops):
+            client = hop
+            if not self.trusts(hop):
+                break
+        return client
+
+    def client_ip(self, request: Request) -> str:
+        return self.resolve(request.client.host if request.client else None, request.headers.getlist("x-forwarded-for"))
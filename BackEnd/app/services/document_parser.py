@@ -0,0 +1,137 @@
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Deque, Iterator, List, Optional, Tuple
+
+from agno.document import Document
+from agno.document.reader.base import Reader
+from agno.knowledge.agent import AgentKnowledge
+from agno.knowledge.pdf import PDFKnowledgeBase
+from pypdf import PdfReader
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ParsedBatch:
+    """Chunks parsed from part (or all) of one file."""
+    path: Path
+    pages: int
+    documents: List[Document] = field(default_factory=list)
+    last: bool = True
+    error: Optional[BaseException] = None
+
+
+def source_for(knowledge: AgentKnowledge, path: Path) -> Optional[AgentKnowledge]:
+    """Finds the knowledge source (PDF, DOCX, text, ...) that handles `path`."""
+    for source in getattr(knowledge, "sources", None) or [knowledge]:
+        if path.suffix.lower() in getattr(source, "formats", []):
+            return source
+    return None
+
+
+def _read_pdf_pages(reader: Reader, path: Path, start: int, end: int) -> List[Document]:
+    """Extracts and chunks pages [start, end) of a PDF. Runs in a worker process."""
+    pdf = PdfReader(path)
+    contents = [pdf.pages[index].extract_text() for index in range(start, end)]
+    doc_name = path.name.split(".")[0]
+    return reader._create_documents(contents, doc_name, use_uuid_for_id=True, page_number_shift=start + 1)
+
+
+def _read_file(reader: Reader, path: Path, is_pdf: bool) -> List[Document]:
+    """Reads and chunks a whole file. Runs in a worker process."""
+    if is_pdf:
+        return reader.read(pdf=path)
+    return reader.read(file=path)
+
+
+class DocumentParser:
+    """
+    Parses documents on a pool of worker processes so ingestion uses every
+    core instead of one executor thread.
+
+    PDFs are split into tasks of `pages_per_task` pages; other formats are one
+    task per file. Results are yielded in order as they complete, with at most
+    `max_pending` tasks in flight, so a huge file is never fully materialized
+    and the embedding stage starts on the first pages while the rest parse.
+    """
+
+    def __init__(self, max_workers: int, pages_per_task: int, max_pending: int):
+        self.max_workers = max_workers
+        self.pages_per_task = pages_per_task
+        self.max_pending = max_pending
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: forking a process that runs threads (uvicorn, executors) is unsafe.
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def _tasks(self, knowledge: AgentKnowledge, paths: List[Path]) -> Iterator[Tuple[Path, int, bool, tuple]]:
+        """Yields (path, pages, last, (fn, *args)) work items, or an error item."""
+        for path in paths:
+            source = source_for(knowledge, path)
+            if source is None:
+                yield path, 0, True, (ValueError(f"No knowledge source handles '{path.suffix}' files."),)
+                continue
+            if not isinstance(source, PDFKnowledgeBase):
+                yield path, 1, True, (_read_file, source.reader, path, False)
+                continue
+            try:
+                pdf = PdfReader(path)
+                num_pages = 0 if pdf.is_encrypted else len(pdf.pages)
+            except Exception as e:
+                yield path, 0, True, (e,)
+                continue
+            if num_pages == 0 or not getattr(source.reader, "split_on_pages", False):
+                # Encrypted or unusual PDFs go through the stock reader in one piece.
+                yield path, num_pages, True, (_read_file, source.reader, path, True)
+                continue
+            for start in range(0, num_pages, self.pages_per_task):
+                end = min(start + self.pages_per_task, num_pages)
+                yield path, end - start, end == num_pages, (_read_pdf_pages, source.reader, path, start, end)
+
+    def iter_files(self, knowledge: AgentKnowledge, paths: List[Path]) -> Iterator[ParsedBatch]:
+        """Parses `paths` in parallel, yielding batches in file and page order."""
+        window: Deque[Tuple[Path, int, bool, Optional[Future], Optional[BaseException]]] = deque()
+        tasks = self._tasks(knowledge, paths)
+        try:
+            while True:
+                while len(window) < self.max_pending:
+                    item = next(tasks, None)
+                    if item is None:
+                        break
+                    path, pages, last, work = item
+                    if isinstance(work[0], BaseException):
+                        window.append((path, pages, last, None, work[0]))
+                    else:
+                        window.append((path, pages, last, self.pool.submit(*work), None))
+                if not window:
+                    return
+
+                path, pages, last, future, error = window.popleft()
+                documents: List[Document] = []
+                if future is not None:
+                    try:
+                        documents = future.result()
+                    except Exception as e:
+                        error = e
+                if error is not None:
+                    logger.error(f"Failed to parse '{path.name}': {error}")
+                    yield ParsedBatch(path=path, pages=0, last=True, error=error)
+                else:
+                    yield ParsedBatch(path=path, pages=pages, documents=documents, last=last)
+        finally:
+            for _, _, _, future, _ in window:
+                if future is not None:
+                    future.cancel()
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,117 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from agno.embedder.base import Embedder
+
+from app.services.embedding_cache import CachedEmbedder, EmbeddingCache
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """
+    Embeds many texts with few round trips to Ollama.
+
+    Texts missing from the embedding cache are grouped into batches of
+    `batch_size`, at most `max_in_flight` batches are sent concurrently over
+    the embedder's pooled client, and failed batches are retried with
+    exponential backoff. Results land in the cache, so the per-chunk
+    `embed()` calls made while inserting into the vector db become hits.
+    """
+
+    def __init__(self, batch_size: int, max_in_flight: int, max_retries: int, retry_backoff_seconds: float = 0.5):
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="embed-batch")
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.chunks = 0
+        self.retries = 0
+        self.failed_batches = 0
+        self.seconds = 0.0
+
+    def _embed_batch(self, embedder: Embedder, texts: List[str]) -> List[List[float]]:
+        client = getattr(embedder, "client", None)
+        model = getattr(embedder, "id", None)
+        if client is None or model is None:
+            # Not an Ollama embedder: no batch API, fall back to one call per text.
+            return [embedder.get_embedding(text) for text in texts]
+
+        kwargs: Dict[str, Any] = {}
+        if getattr(embedder, "options", None) is not None:
+            kwargs["options"] = embedder.options
+        response = client.embed(model=model, input=texts, **kwargs)
+        embeddings = response["embeddings"]
+        if len(embeddings) != len(texts):
+            raise ValueError(f"Expected {len(texts)} embeddings, got {len(embeddings)}")
+        return embeddings
+
+    def _embed_with_retries(self, embedder: Embedder, texts: List[str]) -> Optional[List[List[float]]]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._embed_batch(embedder, texts)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error(f"Embedding batch of {len(texts)} failed after {attempt + 1} attempts: {e}")
+                    with self._lock:
+                        self.failed_batches += 1
+                    return None
+                with self._lock:
+                    self.retries += 1
+                logger.warning(f"Embedding batch of {len(texts)} failed (attempt {attempt + 1}), retrying: {e}")
+                time.sleep(self.retry_backoff_seconds * 2 ** attempt)
+
+    def prefetch(self, embedder: Embedder, texts: List[str]) -> int:
+        """
+        Embeds every text not yet in `embedder`'s cache and stores the results.
+        Returns the number of texts embedded. Texts whose batch failed are left
+        uncached and will be embedded one by one on insert.
+        """
+        if not isinstance(embedder, CachedEmbedder):
+            return 0
+
+        keys = {EmbeddingCache.key(embedder.model, embedder.dimensions, text): text for text in texts}
+        missing = [keys[key] for key in embedder.cache.missing(list(keys))]
+        if not missing:
+            return 0
+
+        started = time.perf_counter()
+        batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+        embedded = 0
+        for batch, embeddings in zip(
+            batches, self._executor.map(lambda b: self._embed_with_retries(embedder.embedder, b), batches)
+        ):
+            if embeddings is None:
+                continue
+            items = [
+                (EmbeddingCache.key(embedder.model, embedder.dimensions, text), embedder.model, embedder.dimensions, vector)
+                for text, vector in zip(batch, embeddings)
+                if vector and len(vector) == embedder.dimensions
+            ]
+            embedder.cache.put_many(items)
+            embedded += len(items)
+
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.batches += len(batches)
+            self.chunks += embedded
+            self.seconds += elapsed
+        logger.info(f"Embedded {embedded} chunks in {len(batches)} batches ({embedded / elapsed if elapsed else 0:.1f} chunks/s).")
+        return embedded
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "batch_size": self.batch_size,
+                "max_in_flight": self.max_in_flight,
+                "batches": self.batches,
+                "chunks": self.chunks,
+                "retries": self.retries,
+                "failed_batches": self.failed_batches,
+                "chunks_per_second": self.chunks / self.seconds if self.seconds else 0.0,
+            }
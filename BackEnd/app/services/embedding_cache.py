@@ -0,0 +1,211 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from array import array
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from agno.embedder.base import Embedder
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed store of embeddings.
+
+    Vectors are keyed by sha256(model id, dimensions, text) and kept as
+    float32 blobs in a small SQLite file, shared by every worker and parser
+    process. When the stored vectors exceed `max_bytes`, the least recently
+    used ones are evicted. Hits are recorded in memory and written back in
+    batches, so lookups never wait for the file's write lock.
+    """
+
+    # Hits are written back once this many are pending, or this long after the last write.
+    TOUCH_BATCH_SIZE = 1000
+    TOUCH_INTERVAL_SECONDS = 30.0
+    # Rows read per step while evicting
+    EVICT_BATCH_SIZE = 1000
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " dimensions INTEGER NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)")
+        self._lock = threading.Lock()
+        self._touched: Dict[str, float] = {}
+        self._touched_at = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(model: str, dimensions: Optional[int], text: str) -> str:
+        return hashlib.sha256(f"{model}\0{dimensions}\0{text}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            row = self._conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touched[key] = time.time()
+            if len(self._touched) >= self.TOUCH_BATCH_SIZE or time.monotonic() - self._touched_at >= self.TOUCH_INTERVAL_SECONDS:
+                try:
+                    self._conn.execute("BEGIN IMMEDIATE")
+                    self._write_touched_locked()
+                    self._conn.execute("COMMIT")
+                except sqlite3.Error as e:
+                    # Only recency is lost; the next write tries again.
+                    if self._conn.in_transaction:
+                        self._conn.execute("ROLLBACK")
+                    logger.warning(f"Could not record embedding cache hits: {e}")
+        return array("f", row[0]).tolist()
+
+    def _write_touched_locked(self) -> None:
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = MAX(last_used, ?) WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()],
+            )
+            self._touched.clear()
+        self._touched_at = time.monotonic()
+
+    def _put_locked(self, key: str, model: str, dimensions: Optional[int], vector: List[float]) -> None:
+        blob = array("f", vector).tobytes()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO embeddings (key, model, dimensions, vector, size, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, model, dimensions or len(vector), blob, len(blob), time.time()),
+        )
+
+    def _size_locked(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+
+    def put(self, key: str, model: str, dimensions: Optional[int], vector: List[float]) -> None:
+        self.put_many([(key, model, dimensions, vector)])
+
+    def missing(self, keys: List[str]) -> List[str]:
+        """Returns the keys that are not cached yet (not counted as lookups)."""
+        found = set()
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ", ".join("?" for _ in batch)
+                found.update(
+                    key for (key,) in self._conn.execute(f"SELECT key FROM embeddings WHERE key IN ({placeholders})", batch)
+                )
+        return [key for key in keys if key not in found]
+
+    def put_many(self, items: List[Tuple[str, str, Optional[int], List[float]]]) -> None:
+        """Stores many (key, model, dimensions, vector) items in one transaction."""
+        with self._lock:
+            # Taking the write lock up front makes the size below include other processes' writes.
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._write_touched_locked()
+                for key, model, dimensions, vector in items:
+                    self._put_locked(key, model, dimensions, vector)
+                size = self._size_locked()
+                if size > self.max_bytes:
+                    self._evict(size)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _evict(self, size: int) -> None:
+        # Trim to 90% of the budget so we don't evict on every insert.
+        target = int(self.max_bytes * 0.9)
+        evicted = 0
+        while size > target:
+            rows = self._conn.execute(
+                "SELECT key, size FROM embeddings ORDER BY last_used LIMIT ?", (self.EVICT_BATCH_SIZE,)
+            ).fetchall()
+            if not rows:
+                break
+            batch = []
+            for key, row_size in rows:
+                if size <= target:
+                    break
+                batch.append((key,))
+                size -= row_size
+            self._conn.executemany("DELETE FROM embeddings WHERE key = ?", batch)
+            evicted += len(batch)
+        self.evictions += evicted
+        logger.info(f"Evicted {evicted} embeddings from the cache at {self.path}.")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._touched.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM embeddings").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "path": self.path,
+                "entries": entries,
+                "bytes": size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(path: str, max_bytes: int) -> EmbeddingCache:
+    """Returns the process-wide cache for `path`, so agent reloads share it."""
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = EmbeddingCache(path, max_bytes)
+        return _caches[path]
+
+
+@dataclass
+class CachedEmbedder(Embedder):
+    """Wraps an embedder so repeated texts are served from an `EmbeddingCache`."""
+
+    embedder: Optional[Embedder] = None
+    cache: Optional[EmbeddingCache] = field(default=None, repr=False)
+
+    def __post_init__(self):
+        self.dimensions = self.embedder.dimensions
+
+    @property
+    def model(self) -> str:
+        return getattr(self.embedder, "id", type(self.embedder).__name__)
+
+    def get_embedding_and_usage(self, text: str) -> Tuple[List[float], Optional[Dict]]:
+        key = EmbeddingCache.key(self.model, self.dimensions, text)
+        vector = self.cache.get(key)
+        if vector is not None:
+            return vector, None
+        vector, usage = self.embedder.get_embedding_and_usage(text)
+        if vector:
+            self.cache.put(key, self.model, self.dimensions, vector)
+        return vector, usage
+
+    def get_embedding(self, text: str) -> List[float]:
+        return self.get_embedding_and_usage(text)[0]
@@ -0,0 +1,368 @@
+import asyncio
+import logging
+import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, List, Optional, Set
+
+from agno.knowledge.agent import AgentKnowledge
+from sqlalchemy import and_, exists, or_, text
+from sqlalchemy.orm import Session, aliased, sessionmaker
+
+from app.models.knowledge import (
+    KnowledgeFile as KnowledgeFileModel,
+    KnowledgeChunk,
+    IngestionJob,
+    IngestionStatus,
+    JobKind,
+    JobStatus,
+)
+from app.services import knowledge_service
+from app.services.document_parser import DocumentParser
+from app.services.embedding_batcher import EmbeddingBatcher
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQL advisory lock serializing job claims across workers
+CLAIM_LOCK_KEY = 0x4A4F4253
+
+
+class IngestionQueue:
+    """
+    DB-backed queue of knowledge base jobs processed by a pool of workers.
+
+    Jobs are claimed with a conditional UPDATE, so several uvicorn workers can
+    share one queue. A claimed job holds a lease that its worker renews while
+    it runs; if the process dies, the lease expires and another worker (or the
+    restarted process) picks the job up again. Each job uses its own DB
+    sessions and records its progress on the job row.
+    """
+
+    def __init__(
+        self,
+        session_factory: sessionmaker,
+        get_knowledge: Callable[[], Optional[AgentKnowledge]],
+        batcher: Optional[EmbeddingBatcher],
+        parser: Optional[DocumentParser],
+        upload_dir: Path,
+        workers: int,
+        poll_seconds: float,
+        lease_seconds: float,
+        max_attempts: int,
+        on_change: Optional[Callable[[], None]] = None,
+    ):
+        self.session_factory = session_factory
+        self.get_knowledge = get_knowledge
+        self.batcher = batcher
+        self.parser = parser
+        self.upload_dir = Path(upload_dir)
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.on_change = on_change
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    # --- Enqueueing (called with the request's session; the caller commits) ---
+
+    def enqueue_ingest(self, db: Session, file_id: int) -> IngestionJob:
+        """Queues ingestion of a file, reusing an already pending job for it."""
+        job = db.query(IngestionJob).filter(
+            IngestionJob.kind == JobKind.INGEST,
+            IngestionJob.file_id == file_id,
+            IngestionJob.status == JobStatus.PENDING,
+        ).first()
+        if job is None:
+            job = IngestionJob(kind=JobKind.INGEST, file_id=file_id, status=JobStatus.PENDING)
+            db.add(job)
+        return job
+
+    def enqueue_rebuild(self, db: Session) -> IngestionJob:
+        """
+        Queues a full rebuild. Overlapping requests coalesce into the pending
+        rebuild, and pending ingest jobs are folded into it.
+        """
+        job = db.query(IngestionJob).filter(
+            IngestionJob.kind == JobKind.REBUILD,
+            IngestionJob.status == JobStatus.PENDING,
+        ).first()
+        if job is None:
+            job = IngestionJob(kind=JobKind.REBUILD, status=JobStatus.PENDING)
+            db.add(job)
+        db.query(IngestionJob).filter(
+            IngestionJob.kind == JobKind.INGEST,
+            IngestionJob.status == JobStatus.PENDING,
+        ).update({IngestionJob.status: JobStatus.CANCELLED, IngestionJob.error: "Coalesced into a rebuild"}, synchronize_session=False)
+        return job
+
+    def release_file(self, db: Session, file_id: int) -> bool:
+        """
+        Cancels pending jobs for a file that is about to be deleted and detaches
+        its job history. Returns False if a job for it, or a rebuild (which
+        reads every file), is running right now.
+        """
+        if self._running(db).filter(or_(IngestionJob.file_id == file_id, IngestionJob.kind == JobKind.REBUILD)).first():
+            return False
+        db.query(IngestionJob).filter(
+            IngestionJob.file_id == file_id,
+            IngestionJob.status == JobStatus.PENDING,
+        ).update({IngestionJob.status: JobStatus.CANCELLED, IngestionJob.error: "File deleted"}, synchronize_session=False)
+        db.query(IngestionJob).filter(IngestionJob.file_id == file_id).update(
+            {IngestionJob.file_id: None}, synchronize_session=False
+        )
+        return True
+
+    def notify(self) -> None:
+        """Wakes idle workers after a job was committed."""
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    # --- Lifecycle ---
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        await self._loop.run_in_executor(None, self._resume)
+        self._tasks = [asyncio.create_task(self._start_workers())]
+
+    async def _start_workers(self) -> None:
+        # Index a knowledge base that outgrew brute-force search before this process writes to it again
+        try:
+            await self._loop.run_in_executor(self._executor, self._maintain_index)
+        except Exception as e:
+            logger.error(f"Could not maintain the vector index at startup: {e}", exc_info=True)
+        self._tasks += [asyncio.create_task(self._worker(index)) for index in range(self.workers)]
+        logger.info(f"Started {self.workers} ingestion workers as {self.owner}.")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _maintain_index(self) -> None:
+        knowledge = self.get_knowledge()
+        if knowledge is not None:
+            knowledge_service.maintain_vector_index(knowledge)
+
+    def _resume(self) -> None:
+        """Queues files left in PROCESSING without a job (e.g. uploaded before a crash)."""
+        with self.session_factory() as db:
+            active = db.query(IngestionJob.file_id).filter(
+                IngestionJob.status.in_([JobStatus.PENDING, JobStatus.RUNNING]),
+                IngestionJob.file_id.isnot(None),
+            )
+            orphans = db.query(KnowledgeFileModel).filter(
+                KnowledgeFileModel.status == IngestionStatus.PROCESSING,
+                KnowledgeFileModel.id.notin_(active),
+            ).all()
+            for db_file in orphans:
+                self.enqueue_ingest(db, db_file.id)
+            db.commit()
+            if orphans:
+                logger.info(f"Resumed ingestion of {len(orphans)} unfinished files.")
+
+    # --- Workers ---
+
+    def _running(self, db: Session):
+        return db.query(IngestionJob).filter(
+            IngestionJob.status == JobStatus.RUNNING,
+            IngestionJob.lease_expires_at > datetime.utcnow(),
+        )
+
+    def _claim(self) -> Optional[int]:
+        """
+        Atomically claims the oldest runnable job, returning its id. A rebuild
+        needs the knowledge base to itself, so it is only claimed with no other
+        job running, and nothing else is claimed while it runs.
+        """
+        with self.session_factory() as db:
+            if db.get_bind().dialect.name == "postgresql":
+                # Under READ COMMITTED two workers could both pass the checks below; claim one at a time.
+                db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": CLAIM_LOCK_KEY})
+            now = datetime.utcnow()
+            if self._running(db).filter(IngestionJob.kind == JobKind.REBUILD).first():
+                return None
+            candidates = db.query(IngestionJob).filter(or_(
+                and_(IngestionJob.status == JobStatus.PENDING, IngestionJob.available_at <= now),
+                and_(IngestionJob.status == JobStatus.RUNNING, IngestionJob.lease_expires_at <= now),
+            )).order_by(IngestionJob.id).limit(10).all()
+
+            running = aliased(IngestionJob)
+            for job in candidates:
+                others_running = exists().where(
+                    running.id != job.id,
+                    running.status == JobStatus.RUNNING,
+                    running.lease_expires_at > now,
+                )
+                if job.kind == JobKind.REBUILD and self._running(db).first():
+                    # Wait for running jobs to drain rather than starving the rebuild.
+                    return None
+                claim = db.query(IngestionJob).filter(IngestionJob.id == job.id, IngestionJob.status == job.status)
+                if job.status == JobStatus.RUNNING:
+                    claim = claim.filter(IngestionJob.lease_expires_at == job.lease_expires_at)
+                    logger.warning(f"Reclaiming ingestion job {job.id} whose lease held by {job.lease_owner} expired.")
+                # Re-checked in the UPDATE itself, against jobs claimed since the checks above
+                if job.kind == JobKind.REBUILD:
+                    claim = claim.filter(~others_running)
+                else:
+                    claim = claim.filter(~others_running.where(running.kind == JobKind.REBUILD))
+                claimed = claim.update({
+                    IngestionJob.status: JobStatus.RUNNING,
+                    IngestionJob.lease_owner: self.owner,
+                    IngestionJob.lease_expires_at: now + timedelta(seconds=self.lease_seconds),
+                    IngestionJob.attempts: IngestionJob.attempts + 1,
+                }, synchronize_session=False)
+                if claimed == 1:
+                    db.commit()
+                    return job.id
+            return None
+
+    async def _worker(self, index: int) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                job_id = await loop.run_in_executor(None, self._claim)
+                if job_id is None:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+                    except asyncio.TimeoutError:
+                        pass
+                    self._wakeup.clear()
+                    continue
+                heartbeat = asyncio.create_task(self._heartbeat(job_id))
+                try:
+                    await loop.run_in_executor(self._executor, self._process, job_id)
+                finally:
+                    heartbeat.cancel()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ingestion worker {index} failed: {e}", exc_info=True)
+                await asyncio.sleep(self.poll_seconds)
+
+    async def _heartbeat(self, job_id: int) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            await loop.run_in_executor(None, self._renew_lease, job_id)
+
+    def _renew_lease(self, job_id: int) -> None:
+        with self.session_factory() as db:
+            db.query(IngestionJob).filter(IngestionJob.id == job_id, IngestionJob.lease_owner == self.owner).update(
+                {IngestionJob.lease_expires_at: datetime.utcnow() + timedelta(seconds=self.lease_seconds)},
+                synchronize_session=False,
+            )
+            db.commit()
+
+    def _report(self, job_id: int, pages_parsed: int, chunks_total: int, chunks_embedded: int) -> None:
+        with self.session_factory() as db:
+            db.query(IngestionJob).filter(IngestionJob.id == job_id).update({
+                IngestionJob.pages_parsed: pages_parsed,
+                IngestionJob.chunks_total: chunks_total,
+                IngestionJob.chunks_embedded: chunks_embedded,
+            }, synchronize_session=False)
+            db.commit()
+
+    def _process(self, job_id: int) -> None:
+        with self.session_factory() as db:
+            job = db.query(IngestionJob).filter(IngestionJob.id == job_id).first()
+            try:
+                knowledge = self.get_knowledge()
+                if knowledge is None:
+                    raise RuntimeError("The knowledge base is not available.")
+                if job.kind == JobKind.REBUILD:
+                    self._rebuild(db, job, knowledge)
+                else:
+                    self._ingest(db, job, knowledge)
+                job.status = JobStatus.DONE
+                job.error = None
+            except Exception as e:
+                logger.error(f"Ingestion job {job_id} failed (attempt {job.attempts}): {e}", exc_info=True)
+                db.rollback()
+                job = db.query(IngestionJob).filter(IngestionJob.id == job_id).first()
+                job.error = str(e)
+                if job.attempts >= self.max_attempts:
+                    job.status = JobStatus.FAILED
+                    if job.file_id is not None:
+                        db.query(KnowledgeFileModel).filter(KnowledgeFileModel.id == job.file_id).update(
+                            {KnowledgeFileModel.status: IngestionStatus.FAILED}, synchronize_session=False
+                        )
+                else:
+                    job.status = JobStatus.PENDING
+                    job.available_at = datetime.utcnow() + timedelta(seconds=self.poll_seconds * 2 ** job.attempts)
+            if job.status != JobStatus.PENDING:
+                job.finished_at = datetime.utcnow()
+            job.lease_owner = None
+            job.lease_expires_at = None
+            db.commit()
+        if self.on_change is not None:
+            # Even a failed job may have changed part of the knowledge base.
+            self.on_change()
+
+    def _record_chunks(self, db: Session, file_id: int, doc_ids: List[str]) -> None:
+        db.query(KnowledgeChunk).filter(KnowledgeChunk.file_id == file_id).delete(synchronize_session=False)
+        db.add_all([KnowledgeChunk(file_id=file_id, doc_id=doc_id) for doc_id in set(doc_ids)])
+
+    def _ingest(self, db: Session, job: IngestionJob, knowledge: AgentKnowledge) -> None:
+        db_file = db.query(KnowledgeFileModel).filter(KnowledgeFileModel.id == job.file_id).first()
+        if db_file is None:
+            logger.info(f"Skipping ingestion job {job.id}: its file was deleted.")
+            return
+        logger.info(f"Server is now parsing '{db_file.filename}' for consumption as knowledge for the agent.")
+        doc_ids = knowledge_service.ingest_file(
+            knowledge,
+            self.upload_dir / db_file.filename,
+            db_file.id,
+            batcher=self.batcher,
+            progress=lambda *counts: self._report(job.id, *counts),
+            parser=self.parser,
+        )
+        self._record_chunks(db, db_file.id, doc_ids)
+        db_file.status = IngestionStatus.INGESTED
+        logger.info(f"Successfully parsed and added '{db_file.filename}' to the knowledge base.")
+
+    def _rebuild(self, db: Session, job: IngestionJob, knowledge: AgentKnowledge) -> None:
+        logger.info("Rebuilding the knowledge base from all uploaded files.")
+        knowledge_service.clear(knowledge)
+        db.query(KnowledgeChunk).delete(synchronize_session=False)
+        db.commit()
+
+        db_files = {db_file.id: db_file for db_file in db.query(KnowledgeFileModel).order_by(KnowledgeFileModel.id).all()}
+        files = [(self.upload_dir / db_file.filename, file_id) for file_id, db_file in db_files.items()]
+        deleted_doc_ids: Set[str] = set()
+        # Files are parsed in parallel; each one is committed as soon as it is done.
+        for file_id, doc_ids, error in knowledge_service.ingest_files(
+            knowledge,
+            files,
+            batcher=self.batcher,
+            parser=self.parser,
+            progress=lambda *counts: self._report(job.id, *counts),
+        ):
+            db_file = db_files[file_id]
+            if db.query(KnowledgeFileModel.id).filter(KnowledgeFileModel.id == file_id).first() is None:
+                # Deleted while the rebuild read it (e.g. after its lease lapsed): don't record it
+                logger.info(f"'{db_file.filename}' was deleted during the rebuild; dropping its chunks.")
+                db.expunge(db_file)
+                deleted_doc_ids.update(doc_ids)
+                continue
+            if error is not None:
+                logger.error(f"Failed to rebuild knowledge from '{db_file.filename}': {error}")
+                db_file.status = IngestionStatus.FAILED
+            else:
+                db_file.status = IngestionStatus.INGESTED
+            # Record chunks even for partial failures so a later delete removes them.
+            self._record_chunks(db, file_id, doc_ids)
+            db.commit()
+        if deleted_doc_ids:
+            # Only once every file is recorded, so chunks that remaining files share are kept
+            shared = {doc_id for (doc_id,) in db.query(KnowledgeChunk.doc_id).filter(KnowledgeChunk.doc_id.in_(deleted_doc_ids))}
+            knowledge_service.remove_chunks(knowledge, deleted_doc_ids - shared)
+        logger.info("Knowledge base rebuild finished.")
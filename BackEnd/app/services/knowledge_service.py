@@ -0,0 +1,174 @@
+import logging
+from hashlib import md5
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from agno.document import Document
+from agno.knowledge.agent import AgentKnowledge
+from agno.knowledge.pdf import PDFKnowledgeBase
+
+from app.services.document_parser import DocumentParser, ParsedBatch, source_for
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.retrieval import CachedLanceDb
+
+logger = logging.getLogger(__name__)
+
+# Keep LanceDB delete predicates to a reasonable size.
+DELETE_BATCH_SIZE = 500
+# Chunks inserted between progress reports.
+INSERT_SLICE_SIZE = 64
+
+ProgressCallback = Callable[[int, int, int], None]
+
+
+def chunk_id(document: Document) -> str:
+    """The row id LanceDb assigns to a chunk (md5 of its cleaned content)."""
+    cleaned_content = document.content.replace("\x00", "\ufffd")
+    return md5(cleaned_content.encode()).hexdigest()
+
+
+def read_file(knowledge: AgentKnowledge, path: Path) -> List[Document]:
+    """Parses and chunks a single file with the reader of the matching source."""
+    source = source_for(knowledge, path)
+    if source is None:
+        raise ValueError(f"No knowledge source handles '{path.suffix}' files.")
+    if isinstance(source, PDFKnowledgeBase):
+        return source.reader.read(pdf=path)
+    return source.reader.read(file=path)
+
+
+def _refresh_search_index(knowledge: AgentKnowledge) -> None:
+    # LanceDb builds its full-text index once per instance; the agent is kept
+    # warm now, so force a rebuild on the next hybrid search.
+    if knowledge.vector_db is not None and hasattr(knowledge.vector_db, "fts_index_exists"):
+        knowledge.vector_db.fts_index_exists = False
+    maintain_vector_index(knowledge)
+
+
+def maintain_vector_index(knowledge: AgentKnowledge) -> Optional[str]:
+    """Builds or extends the ANN index of the knowledge base's vector db, if it keeps one."""
+    if not isinstance(knowledge.vector_db, CachedLanceDb):
+        return None
+    try:
+        return knowledge.vector_db.maintain_index()
+    except Exception as e:
+        logger.error(f"Could not update the vector index: {e}")
+        return None
+
+
+def _parsed_batches(
+    knowledge: AgentKnowledge, paths: List[Path], parser: Optional[DocumentParser]
+) -> Iterator[ParsedBatch]:
+    if parser is not None:
+        yield from parser.iter_files(knowledge, paths)
+        return
+    for path in paths:
+        try:
+            documents = read_file(knowledge, path)
+            pages = len({document.meta_data.get("page") for document in documents}) if documents else 0
+            yield ParsedBatch(path=path, pages=pages, documents=documents)
+        except Exception as e:
+            yield ParsedBatch(path=path, pages=0, error=e)
+
+
+def ingest_files(
+    knowledge: AgentKnowledge,
+    files: List[Tuple[Path, int]],
+    batcher: Optional[EmbeddingBatcher] = None,
+    parser: Optional[DocumentParser] = None,
+    progress: Optional[ProgressCallback] = None,
+) -> Iterator[Tuple[int, List[str], Optional[BaseException]]]:
+    """
+    Chunks, embeds and inserts `(path, file_id)` files into the knowledge
+    base's vector db, skipping chunks that are already stored, and yields
+    `(file_id, chunk_ids, error)` as each file finishes. The chunk ids let a
+    file's vectors be removed later without a rebuild.
+
+    With a `parser`, files are parsed on worker processes and chunks are
+    inserted as soon as their pages are parsed. With a `batcher`, each slice
+    of chunks is embedded in batches up front so the vector db's per-chunk
+    embedding calls are served from the cache. `progress(pages_parsed,
+    chunks_total, chunks_embedded)` is called as work advances.
+    """
+    file_ids = {path: file_id for path, file_id in files}
+    doc_ids: Dict[Path, List[str]] = {}
+    failed: Set[Path] = set()
+    pages = total = embedded = 0
+
+    for batch in _parsed_batches(knowledge, [path for path, _ in files], parser):
+        if batch.path in failed:
+            continue
+        file_doc_ids = doc_ids.setdefault(batch.path, [])
+        if batch.error is None:
+            try:
+                pages += batch.pages
+                total += len(batch.documents)
+                if progress is not None:
+                    progress(pages, total, embedded)
+                for start in range(0, len(batch.documents), INSERT_SLICE_SIZE):
+                    documents_slice = batch.documents[start:start + INSERT_SLICE_SIZE]
+                    if batcher is not None and knowledge.vector_db is not None:
+                        batcher.prefetch(knowledge.vector_db.embedder, [document.content for document in documents_slice])
+                    knowledge.load_documents(
+                        documents=documents_slice,
+                        skip_existing=True,
+                        filters={"file_id": file_ids[batch.path], "filename": batch.path.name},
+                    )
+                    file_doc_ids.extend(chunk_id(document) for document in documents_slice)
+                    embedded += len(documents_slice)
+                    if progress is not None:
+                        progress(pages, total, embedded)
+            except Exception as e:
+                batch.error = e
+
+        if batch.error is not None:
+            failed.add(batch.path)
+            yield file_ids[batch.path], file_doc_ids, batch.error
+        elif batch.last:
+            logger.info(f"Ingested {len(file_doc_ids)} chunks from '{batch.path.name}'.")
+            yield file_ids[batch.path], file_doc_ids, None
+
+    _refresh_search_index(knowledge)
+
+
+def ingest_file(
+    knowledge: AgentKnowledge,
+    path: Path,
+    file_id: int,
+    batcher: Optional[EmbeddingBatcher] = None,
+    progress: Optional[ProgressCallback] = None,
+    parser: Optional[DocumentParser] = None,
+) -> List[str]:
+    """Ingests a single file (see `ingest_files`), returning its chunk ids."""
+    for _, doc_ids, error in ingest_files(knowledge, [(path, file_id)], batcher, parser, progress):
+        if error is not None:
+            raise error
+        return doc_ids
+    return []
+
+
+def clear(knowledge: AgentKnowledge) -> None:
+    """Empties the knowledge base's vector db, ahead of a full rebuild."""
+    if knowledge.vector_db is None:
+        return
+    knowledge.vector_db.drop()
+    knowledge.vector_db.create()
+    _refresh_search_index(knowledge)
+
+
+def remove_chunks(knowledge: AgentKnowledge, doc_ids: Iterable[str]) -> int:
+    """Deletes the given chunk ids from the knowledge base's vector db."""
+    vector_db = knowledge.vector_db
+    doc_ids = sorted(set(doc_ids))
+    if vector_db is None or not doc_ids or not vector_db.exists():
+        return 0
+
+    table = vector_db.connection.open_table(vector_db.table_name)
+    for start in range(0, len(doc_ids), DELETE_BATCH_SIZE):
+        batch = doc_ids[start:start + DELETE_BATCH_SIZE]
+        ids = ", ".join(f"'{doc_id}'" for doc_id in batch)
+        table.delete(f"{vector_db._id} IN ({ids})")
+    vector_db.table = table
+    _refresh_search_index(knowledge)
+    logger.info(f"Removed {len(doc_ids)} chunks from the knowledge base.")
+    return len(doc_ids)
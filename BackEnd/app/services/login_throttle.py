@@ -0,0 +1,63 @@
+import math
+import threading
+from typing import Any, Dict, Optional
+
+from app.services.shared_state import SharedState
+
+
+class LoginThrottle:
+    """
+    Sliding-window limits on authentication attempts, checked before any
+    password is hashed.
+
+    Each client IP may make `max_attempts_per_ip` attempts per
+    `ip_window_seconds`, and each username may fail `max_failures_per_user`
+    times per `failure_window_seconds` before further attempts are refused.
+    A successful login clears the username's failures. The counters live in
+    `state`, so with Redis the limits hold across all workers and replicas.
+    """
+
+    def __init__(
+        self,
+        state: SharedState,
+        max_attempts_per_ip: int,
+        ip_window_seconds: float,
+        max_failures_per_user: int,
+        failure_window_seconds: float,
+    ):
+        self.state = state
+        self.max_attempts_per_ip = max_attempts_per_ip
+        self.ip_window_seconds = ip_window_seconds
+        self.max_failures_per_user = max_failures_per_user
+        self.failure_window_seconds = failure_window_seconds
+        self._lock = threading.Lock()
+        self.throttled = 0
+
+    def _throttle(self, wait_seconds: float) -> int:
+        with self._lock:
+            self.throttled += 1
+        return max(1, math.ceil(wait_seconds))
+
+    async def check(self, ip: str, username: Optional[str] = None) -> Optional[int]:
+        """
+        Records an attempt from `ip`. Returns None if it may proceed, or the
+        number of seconds to wait before retrying.
+        """
+        if username is not None:
+            failures, expires_in = await self.state.window_count(f"login-failures:{username.casefold()}", self.failure_window_seconds)
+            if failures >= self.max_failures_per_user:
+                return self._throttle(expires_in or self.failure_window_seconds)
+        wait_seconds = await self.state.window_acquire(f"login-attempts:{ip}", self.ip_window_seconds, self.max_attempts_per_ip)
+        if wait_seconds is not None:
+            return self._throttle(wait_seconds)
+        return None
+
+    async def record_failure(self, username: str) -> None:
+        await self.state.window_add(f"login-failures:{username.casefold()}", self.failure_window_seconds)
+
+    async def record_success(self, username: str) -> None:
+        await self.state.delete(f"login-failures:{username.casefold()}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"throttled": self.throttled}
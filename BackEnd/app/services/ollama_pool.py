@@ -0,0 +1,296 @@
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Union
+
+import httpx
+from agno.embedder.ollama import OllamaEmbedder
+from agno.models.ollama import Ollama
+from ollama import Client as OllamaClient
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Endpoints that load a model, and so accept `keep_alive`
+_MODEL_PATHS = {"/api/chat", "/api/generate", "/api/embed", "/api/embeddings"}
+
+
+def parse_keep_alive(value: Optional[Union[str, float]]) -> Optional[Union[str, float]]:
+    """Ollama reads a bare number as seconds, but not a numeric string such as "-1"."""
+    if not isinstance(value, str):
+        return value
+    for number in (int, float):
+        try:
+            return number(value)
+        except ValueError:
+            pass
+    return value
+
+
+class OllamaHost:
+    """One Ollama server and its pooled, keep-alive connections."""
+
+    def __init__(self, url: str, limits: httpx.Limits):
+        self.url = httpx.URL(url.rstrip("/"))
+        self.transport = httpx.HTTPTransport(limits=limits)
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.healthy = True
+        self.down_until = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": str(self.url),
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """A response body that frees its host's slot once it has been read or closed."""
+
+    def __init__(self, stream: httpx.SyncByteStream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            release, self._release = self._release, None
+            if release is not None:
+                release()
+
+
+class _BalancedTransport(httpx.BaseTransport):
+    def __init__(self, pool: "OllamaPool"):
+        self.pool = pool
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        return self.pool._send(request)
+
+    def close(self) -> None:
+        pass
+
+
+class OllamaPool:
+    """
+    Shared HTTP access to one or more Ollama servers.
+
+    Chat, memory and embedding calls all go through one `ollama.Client`
+    whose transport keeps connections to each host alive and sends every
+    request to the healthy host with the fewest requests in flight. A host
+    that refuses connections is skipped (and the request retried on
+    another) until a health check finds it up again, or for
+    `failure_cooldown_seconds` when health checks are not running.
+    Requests that load a model get `keep_alive` unless they set their own,
+    so models stay resident between questions.
+    """
+
+    def __init__(
+        self,
+        hosts: List[str],
+        keep_alive: Optional[Union[str, float]] = None,
+        max_connections_per_host: int = 32,
+        connect_timeout_seconds: float = 5.0,
+        health_check_seconds: float = 10.0,
+        failure_cooldown_seconds: float = 30.0,
+    ):
+        if not hosts:
+            raise ValueError("At least one Ollama host is required")
+        limits = httpx.Limits(max_connections=max_connections_per_host, max_keepalive_connections=max_connections_per_host)
+        self.hosts = [OllamaHost(url, limits) for url in hosts]
+        self.keep_alive = parse_keep_alive(keep_alive)
+        self.connect_timeout_seconds = connect_timeout_seconds
+        self.health_check_seconds = health_check_seconds
+        self.failure_cooldown_seconds = failure_cooldown_seconds
+        self._lock = threading.Lock()
+        self._client: Optional[OllamaClient] = None
+        self._stop = threading.Event()
+        self._health_thread: Optional[threading.Thread] = None
+        self.failovers = 0
+
+    @classmethod
+    def from_urls(cls, urls: str, **kwargs) -> "OllamaPool":
+        """Builds a pool from a comma-separated list of host URLs."""
+        return cls([url.strip() for url in urls.split(",") if url.strip()], **kwargs)
+
+    @property
+    def primary_url(self) -> str:
+        return str(self.hosts[0].url)
+
+    # Balancing
+
+    def _acquire(self, exclude: List[OllamaHost]) -> Optional[OllamaHost]:
+        now = time.monotonic()
+        with self._lock:
+            candidates = [host for host in self.hosts if host not in exclude]
+            if not candidates:
+                return None
+            for host in candidates:
+                if not host.healthy and host.down_until <= now and self._health_thread is None:
+                    host.healthy = True
+            healthy = [host for host in candidates if host.healthy]
+            if healthy:
+                host = min(healthy, key=lambda h: (h.outstanding, h.requests))
+            else:
+                # Everything is down: try the host that failed longest ago
+                host = min(candidates, key=lambda h: h.down_until)
+            host.outstanding += 1
+            host.requests += 1
+            return host
+
+    def _release(self, host: OllamaHost) -> None:
+        with self._lock:
+            host.outstanding -= 1
+
+    def _mark_down(self, host: OllamaHost, error: Any) -> None:
+        with self._lock:
+            host.failures += 1
+            if host.healthy:
+                logger.warning(f"Ollama host {host.url} is unreachable, routing around it: {error}")
+            host.healthy = False
+            host.down_until = time.monotonic() + self.failure_cooldown_seconds
+
+    def _with_keep_alive(self, request: httpx.Request) -> httpx.Request:
+        if self.keep_alive is None or request.method != "POST" or request.url.path not in _MODEL_PATHS:
+            return request
+        body = json.loads(request.read() or b"{}")
+        if body.get("keep_alive") is not None:
+            return request
+        body["keep_alive"] = self.keep_alive
+        headers = [(name, value) for name, value in request.headers.raw if name.lower() != b"content-length"]
+        return httpx.Request(request.method, request.url, headers=headers, content=json.dumps(body).encode("utf-8"), extensions=request.extensions)
+
+    def _send(self, request: httpx.Request) -> httpx.Response:
+        request = self._with_keep_alive(request)
+        tried: List[OllamaHost] = []
+        while True:
+            host = self._acquire(tried)
+            if host is None:
+                raise httpx.ConnectError(f"No Ollama host reachable (tried {len(tried)})", request=request)
+            tried.append(host)
+            request.url = request.url.copy_with(scheme=host.url.scheme, host=host.url.host, port=host.url.port)
+            request.headers["host"] = host.url.netloc.decode("ascii")
+            try:
+                response = host.transport.handle_request(request)
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                # Nothing reached the server, so the request is safe to retry elsewhere
+                self._release(host)
+                self._mark_down(host, e)
+                if len(tried) == len(self.hosts):
+                    raise
+                with self._lock:
+                    self.failovers += 1
+                continue
+            except BaseException:
+                self._release(host)
+                raise
+            response.stream = _ReleasingStream(response.stream, lambda: self._release(host))
+            return response
+
+    # Clients
+
+    def client(self) -> OllamaClient:
+        """The process-wide Ollama client; safe to share across threads."""
+        with self._lock:
+            if self._client is None:
+                self._client = OllamaClient(
+                    host=self.primary_url,
+                    transport=_BalancedTransport(self),
+                    timeout=httpx.Timeout(None, connect=self.connect_timeout_seconds),
+                )
+            return self._client
+
+    def model(self, id: str, **kwargs) -> Ollama:
+        """An agno chat model that sends its (sync) requests through the pool."""
+        return Ollama(id=id, host=self.primary_url, client=self.client(), keep_alive=self.keep_alive, **kwargs)
+
+    def embedder(self, id: str, dimensions: int, **kwargs) -> OllamaEmbedder:
+        """An agno embedder that sends its requests through the pool."""
+        return OllamaEmbedder(id=id, dimensions=dimensions, host=self.primary_url, ollama_client=self.client(), **kwargs)
+
+    # Health checks
+
+    def _probe(self, host: OllamaHost) -> Optional[str]:
+        """Returns None if `host` answers, otherwise why not."""
+        timeout = httpx.Timeout(self.connect_timeout_seconds).as_dict()
+        request = httpx.Request("GET", host.url.join("/api/version"), extensions={"timeout": timeout})
+        try:
+            response = host.transport.handle_request(request)
+            try:
+                response.read()
+            finally:
+                response.close()
+        except httpx.HTTPError as e:
+            return str(e) or type(e).__name__
+        return f"status {response.status_code}" if response.status_code >= 500 else None
+
+    def check_health(self) -> None:
+        """Probes every host and marks it up or down."""
+        for host in self.hosts:
+            error = self._probe(host)
+            if error is not None:
+                self._mark_down(host, error)
+                continue
+            with self._lock:
+                if not host.healthy:
+                    logger.info(f"Ollama host {host.url} is reachable again")
+                host.healthy = True
+
+    def _health_loop(self) -> None:
+        while not self._stop.wait(self.health_check_seconds):
+            try:
+                self.check_health()
+            except Exception as e:
+                logger.error(f"Ollama health check failed: {e}")
+
+    def start(self) -> None:
+        """Starts periodic health checks, when there is more than one host to choose from."""
+        if len(self.hosts) < 2 or self.health_check_seconds <= 0 or self._health_thread is not None:
+            return
+        self._stop.clear()
+        self._health_thread = threading.Thread(target=self._health_loop, name="ollama-health", daemon=True)
+        self._health_thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._health_thread is not None:
+            self._health_thread.join(timeout=self.connect_timeout_seconds * len(self.hosts) + 1)
+            self._health_thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "keep_alive": self.keep_alive,
+                "failovers": self.failovers,
+                "hosts": [host.stats() for host in self.hosts],
+            }
+
+
+_pool: Optional[OllamaPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_ollama_pool() -> OllamaPool:
+    """Returns the process-wide pool configured from settings, so agent reloads share it."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = OllamaPool.from_urls(
+                settings.OLLAMA_BASE_URL,
+                keep_alive=settings.OLLAMA_KEEP_ALIVE or None,
+                max_connections_per_host=settings.OLLAMA_MAX_CONNECTIONS_PER_HOST,
+                connect_timeout_seconds=settings.OLLAMA_CONNECT_TIMEOUT_SECONDS,
+                health_check_seconds=settings.OLLAMA_HEALTH_CHECK_SECONDS,
+                failure_cooldown_seconds=settings.OLLAMA_FAILURE_COOLDOWN_SECONDS,
+            )
+        return _pool
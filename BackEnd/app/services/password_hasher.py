@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional
+
+import bcrypt
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordHasherBusyError(Exception):
+    """Raised when too many hash operations are already pending."""
+
+
+def _hash(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+
+
+def _check(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a dedicated process pool so password hashing uses several
+    cores and never occupies the threadpool shared by the sync endpoints.
+
+    At most `max_pending` operations may be queued or running; beyond that
+    callers get `PasswordHasherBusyError` instead of piling up.
+    """
+
+    def __init__(self, workers: int, max_pending: int, rounds: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.hashed = 0
+        self.verified = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.total_seconds = 0.0
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a process that runs threads (uvicorn, executors) is unsafe.
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    async def _submit(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordHasherBusyError(f"{self.pending} password operations are already pending.")
+            self.pending += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.wrap_future(self.pool.submit(fn, *args))
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.total_seconds += time.perf_counter() - started
+
+    async def hash(self, password: str) -> str:
+        hashed = await self._submit(_hash, password.encode("utf-8"), self.rounds)
+        with self._lock:
+            self.hashed += 1
+        return hashed.decode("utf-8")
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        try:
+            ok = await self._submit(_check, password.encode("utf-8"), hashed.encode("utf-8"))
+        except ValueError:
+            logger.warning("Stored password hash is not a valid bcrypt hash.")
+            ok = False
+        with self._lock:
+            self.verified += 1
+        return ok
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """True if `hashed` was made with a different bcrypt cost than configured."""
+        try:
+            return int(hashed.split("$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return False
+
+    def record_rehash(self) -> None:
+        with self._lock:
+            self.rehashed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            operations = self.hashed + self.verified
+            return {
+                "workers": self.workers,
+                "rounds": self.rounds,
+                "pending": self.pending,
+                "max_pending": self.max_pending,
+                "hashed": self.hashed,
+                "verified": self.verified,
+                "rehashed": self.rehashed,
+                "rejected": self.rejected,
+                "avg_seconds": self.total_seconds / operations if operations else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
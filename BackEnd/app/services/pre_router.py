@@ -0,0 +1,159 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.default_agents import BASE_INSTRUCTIONS
+
+logger = logging.getLogger(__name__)
+
+Embed = Callable[[str], Optional[List[float]]]
+
+# Whole-message small talk, answered without running any agent
+SMALL_TALK: List[Tuple[re.Pattern, str]] = [
+    (
+        re.compile(r"^(hi|hello|hey|hiya|howdy|greetings|good (morning|afternoon|evening|day))( there)?[\s!.,]*$", re.IGNORECASE),
+        "Hello! How can I help you today?",
+    ),
+    (
+        re.compile(r"^(thanks|thank you|thx|ty|cheers|great,? thanks)( (so|very) much)?[\s!.,]*$", re.IGNORECASE),
+        "You're welcome! Is there anything else I can help you with?",
+    ),
+    (
+        re.compile(r"^(bye|goodbye|see you|see ya|good night)( later)?[\s!.,]*$", re.IGNORECASE),
+        "Goodbye! Come back any time you have a question.",
+    ),
+]
+
+
+@dataclass(frozen=True)
+class Route:
+    """
+    Where a message goes. `reply` is set when it needs no agent at all;
+    otherwise `target` names the specialist to ask directly, or is None to
+    leave the decision to the chat agent.
+    """
+    method: str
+    target: Optional[str] = None
+    reply: Optional[str] = None
+    score: Optional[float] = None
+    seconds: float = 0.0
+
+
+class PreRouter:
+    """
+    Routes messages before any LLM is involved.
+
+    Small talk gets a canned reply. Otherwise a message matching the
+    `keywords` of exactly one specialist goes to it; failing that, its
+    embedding is compared with each specialist's description, and the
+    closest specialist is chosen if it scores at least `min_similarity`
+    and beats the runner-up by `min_margin`. Messages spanning several
+    domains, and anything the router is unsure about, are left to the
+    chat agent (the Manager can fan out to several specialists).
+    """
+
+    def __init__(self, specialists: List[Dict[str, Any]], embed: Optional[Embed], min_similarity: float, min_margin: float):
+        self.embed = embed
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.specialists = [definition["name"] for definition in specialists]
+        self._keywords = {
+            definition["name"]: [re.compile(pattern, re.IGNORECASE) for pattern in definition.get("keywords", [])]
+            for definition in specialists
+        }
+        self._profiles = {
+            definition["name"]: " ".join([definition["description"]] + [
+                line for line in definition.get("instructions", []) if line not in BASE_INSTRUCTIONS
+            ])
+            for definition in specialists
+        }
+        self._matrix: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self.methods: Counter = Counter()
+        self.targets: Counter = Counter()
+        self.embedding_errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    @staticmethod
+    def _unit(vector: Optional[List[float]]) -> Optional[np.ndarray]:
+        if not vector:
+            return None
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else None
+
+    def _profile_matrix(self) -> Optional[np.ndarray]:
+        """Embeds the specialist descriptions once (the embedding cache keeps them across restarts)."""
+        if self._matrix is None:
+            vectors = [self._unit(self.embed(self._profiles[name])) for name in self.specialists]
+            if any(vector is None for vector in vectors):
+                return None
+            self._matrix = np.vstack(vectors)
+        return self._matrix
+
+    def _classify(self, message: str) -> Tuple[str, Optional[str], Optional[float]]:
+        matched = [name for name in self.specialists if any(pattern.search(message) for pattern in self._keywords[name])]
+        if len(matched) == 1:
+            return "keywords", matched[0], None
+        if len(matched) > 1:
+            return "multi_domain", None, None
+        if self.embed is None:
+            return "unmatched", None, None
+        try:
+            matrix = self._profile_matrix()
+            vector = self._unit(self.embed(message))
+        except Exception as e:
+            logger.warning(f"Routing by embedding failed, leaving the message to the chat agent: {e}")
+            with self._lock:
+                self.embedding_errors += 1
+            return "embedding_error", None, None
+        if matrix is None or vector is None:
+            return "unmatched", None, None
+        scores = matrix @ vector
+        order = np.argsort(scores)[::-1]
+        best = float(scores[order[0]])
+        runner_up = float(scores[order[1]]) if len(order) > 1 else -1.0
+        if best >= self.min_similarity and best - runner_up >= self.min_margin:
+            return "embedding", self.specialists[order[0]], best
+        return "unsure", None, best
+
+    def route(self, message: str) -> Route:
+        """Decides where `message` goes; may call the embedder, so run it off the event loop."""
+        started = time.perf_counter()
+        text = message.strip()
+        reply = next((answer for pattern, answer in SMALL_TALK if pattern.match(text)), None)
+        if reply is not None:
+            method, target, score = "small_talk", None, None
+        elif self.specialists:
+            method, target, score = self._classify(text)
+        else:
+            method, target, score = "disabled", None, None
+        seconds = time.perf_counter() - started
+        with self._lock:
+            self.methods[method] += 1
+            if target is not None:
+                self.targets[target] += 1
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+        logger.info(f"Routed message via {method} to {target or ('reply' if reply else 'chat agent')} in {seconds * 1000:.1f} ms")
+        return Route(method=method, target=target, reply=reply, score=score, seconds=seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            routed = sum(self.methods.values())
+            return {
+                "routed": routed,
+                "by_method": dict(self.methods),
+                "by_specialist": dict(self.targets),
+                "llm_routing_skipped": self.methods["small_talk"] + sum(self.targets.values()),
+                "embedding_errors": self.embedding_errors,
+                "avg_seconds": self.total_seconds / routed if routed else 0.0,
+                "max_seconds": self.max_seconds,
+            }
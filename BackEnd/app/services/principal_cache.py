@@ -0,0 +1,138 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.models.user import User as UserModel
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    A detached snapshot of the authenticated user. Handlers that need to
+    change the user load the ORM row themselves.
+    """
+    id: int
+    username: str
+    email: str
+    is_active: bool
+    is_admin: bool
+    created_at: datetime
+    chat_requests_count: int = 0
+
+
+class PrincipalCache:
+    """
+    Caches authenticated users by username (the JWT subject) for a short TTL,
+    so requests only open a DB session when the principal is not cached.
+    Call `invalidate` whenever a user is changed or deleted.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Principal, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, username: str) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[username]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(username)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, principal: Principal) -> None:
+        with self._lock:
+            self._entries[principal.username] = (principal, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(principal.username)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def _principal(user: UserModel) -> Principal:
+        return Principal(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            is_active=bool(user.is_active),
+            is_admin=bool(user.is_admin),
+            created_at=user.created_at,
+            chat_requests_count=user.chat_requests_count or 0,
+        )
+
+    def load(self, username: str, session_factory: sessionmaker) -> Optional[Principal]:
+        """Returns the cached principal, or loads (and caches) it from the DB."""
+        principal = self.get(username)
+        if principal is not None:
+            return principal
+        with session_factory() as db:
+            user = db.query(UserModel).filter(UserModel.username == username).first()
+            if user is None:
+                return None
+            principal = self._principal(user)
+        self.put(principal)
+        return principal
+
+    async def load_async(self, username: str, session_factory: async_sessionmaker) -> Optional[Principal]:
+        """Like `load`, but reads a cache miss through an async session."""
+        principal = self.get(username)
+        if principal is not None:
+            return principal
+        async with session_factory() as db:
+            user = await db.scalar(select(UserModel).where(UserModel.username == username))
+            if user is None:
+                return None
+            principal = self._principal(user)
+        self.put(principal)
+        return principal
+
+    def invalidate(self, user_id: Optional[int] = None, username: Optional[str] = None) -> None:
+        """Drops a user's cached principal (by id or username)."""
+        with self._lock:
+            for key, (principal, _) in list(self._entries.items()):
+                if principal.id == user_id or principal.username == username:
+                    del self._entries[key]
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+_principal_cache: Optional[PrincipalCache] = None
+_principal_cache_lock = threading.Lock()
+
+
+def get_principal_cache() -> PrincipalCache:
+    """Returns the process-wide principal cache shared by all auth dependencies."""
+    global _principal_cache
+    with _principal_cache_lock:
+        if _principal_cache is None:
+            _principal_cache = PrincipalCache(settings.AUTH_CACHE_TTL_SECONDS, settings.AUTH_CACHE_MAX_ENTRIES)
+        return _principal_cache
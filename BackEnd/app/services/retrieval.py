@@ -0,0 +1,285 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from agno.document import Document
+from agno.vectordb.distance import Distance
+from agno.vectordb.lancedb import LanceDb, SearchType
+from lancedb.index import IvfFlat, IvfHnswSq, IvfPq
+from lancedb.rerankers import LinearCombinationReranker, RRFReranker
+
+logger = logging.getLogger(__name__)
+
+# ANN index types that can be configured, by their LanceDB name
+INDEX_TYPES = {"IVF_PQ": IvfPq, "IVF_HNSW_SQ": IvfHnswSq, "IVF_FLAT": IvfFlat}
+
+_METRICS = {Distance.cosine: "cosine", Distance.l2: "l2", Distance.max_inner_product: "dot"}
+
+
+def _literal(value: Any) -> str:
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return str(value)
+
+
+def _predicate(column: str, value: Any) -> str:
+    if isinstance(value, (list, tuple, set)):
+        return f"{column} IN ({', '.join(_literal(item) for item in value)})"
+    return f"{column} = {_literal(value)}"
+
+
+class CachedLanceDb(LanceDb):
+    """
+    A LanceDb table tuned for repeated questions.
+
+    Search results are cached per (query, limit, filters) for the table
+    version they were read from: any write to the table, from this process
+    or another, starts a new version and so a fresh cache. Query embeddings
+    are kept in memory as well, since they don't depend on the table.
+
+    Once the table holds `index_min_rows` chunks, `maintain_index()` builds
+    an ANN index on the vectors (IVF-PQ by default) so searches stop
+    scanning every row, and later folds newly inserted rows into it.
+    `nprobes`, `refine_factor` and `ef` trade recall for latency on indexed
+    searches; `rerank` picks how hybrid search fuses its vector and
+    full-text results ("rrf", or "linear" weighted by `vector_weight`).
+
+    Search filters on `filter_columns` are applied by LanceDB before
+    ranking; other filters are matched against the metadata of the top
+    results, as LanceDb does.
+    """
+
+    filter_columns: Tuple[str, ...] = ()
+
+    def __init__(
+        self,
+        *args,
+        cache_max_entries: int = 1024,
+        refine_factor: Optional[int] = None,
+        ef: Optional[int] = None,
+        rerank: str = "rrf",
+        vector_weight: float = 0.7,
+        index_type: Optional[str] = "IVF_PQ",
+        index_min_rows: int = 5000,
+        index_refresh_rows: int = 1000,
+        **kwargs,
+    ):
+        # LanceDB's own full-text index; current releases no longer support tantivy
+        kwargs.setdefault("use_tantivy", False)
+        super().__init__(*args, **kwargs)
+        if index_type and index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown vector index type '{index_type}', expected one of {', '.join(INDEX_TYPES)}")
+        if rerank not in ("rrf", "linear"):
+            raise ValueError(f"Unknown hybrid reranker '{rerank}', expected 'rrf' or 'linear'")
+        self.cache_max_entries = cache_max_entries
+        self.refine_factor = refine_factor
+        self.ef = ef
+        self.rerank = rerank
+        self.vector_weight = vector_weight
+        self.index_type = index_type
+        self.index_min_rows = index_min_rows
+        self.index_refresh_rows = index_refresh_rows
+        self._hybrid_reranker = RRFReranker() if rerank == "rrf" else LinearCombinationReranker(weight=vector_weight)
+        self._results: "OrderedDict[Tuple[str, int, Optional[str]], List[Document]]" = OrderedDict()
+        self._results_version: Optional[int] = None
+        self._query_vectors: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.embedding_hits = 0
+        self.search_seconds = 0.0
+        self.index_builds = 0
+        self.index_refreshes = 0
+
+    @property
+    def metric(self) -> str:
+        return _METRICS.get(self.distance, "cosine")
+
+    # Search
+
+    def _embed_query(self, query: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._query_vectors.get(query)
+            if vector is not None:
+                self._query_vectors.move_to_end(query)
+                self.embedding_hits += 1
+                return vector
+        vector = self.embedder.get_embedding(query)
+        if vector and self.cache_max_entries > 0:
+            with self._lock:
+                self._query_vectors[query] = vector
+                while len(self._query_vectors) > self.cache_max_entries:
+                    self._query_vectors.popitem(last=False)
+        return vector
+
+    def _tune(self, builder):
+        builder = builder.distance_type(self.metric)
+        if self.nprobes:
+            builder = builder.nprobes(self.nprobes)
+        if self.refine_factor:
+            builder = builder.refine_factor(self.refine_factor)
+        if self.ef:
+            builder = builder.ef(self.ef)
+        return builder
+
+    def vector_search(self, query: str, limit: int = 5, where: Optional[str] = None):
+        query_embedding = self._embed_query(query)
+        if query_embedding is None:
+            logger.error(f"Error getting embedding for query: {query}")
+            return None
+        if self.table is None:
+            logger.error("Table not initialized. Please create the table first")
+            return None
+        builder = self.table.search(query=query_embedding, vector_column_name=self._vector_col)
+        if where:
+            builder = builder.where(where, prefilter=True)
+        return self._tune(builder).limit(limit).to_pandas()
+
+    def hybrid_search(self, query: str, limit: int = 5, where: Optional[str] = None):
+        query_embedding = self._embed_query(query)
+        if query_embedding is None:
+            logger.error(f"Error getting embedding for query: {query}")
+            return []
+        if self.table is None:
+            logger.error("Table not initialized. Please create the table first")
+            return []
+        if not self.fts_index_exists:
+            self.table.create_fts_index("payload", use_tantivy=self.use_tantivy, replace=True)
+            self.fts_index_exists = True
+        builder = self.table.search(vector_column_name=self._vector_col, query_type="hybrid").vector(query_embedding).text(query)
+        if where:
+            builder = builder.where(where, prefilter=True)
+        return self._tune(builder).rerank(self._hybrid_reranker).limit(limit).to_pandas()
+
+    def _search(self, query: str, limit: int, filters: Optional[Dict[str, Any]]) -> List[Document]:
+        pushed = {key: value for key, value in (filters or {}).items() if key in self.filter_columns}
+        if not pushed or self.search_type == SearchType.keyword:
+            return super().search(query, limit, filters)
+        self.table = self.connection.open_table(name=self.table_name)
+        where = " AND ".join(_predicate(key, value) for key, value in pushed.items())
+        search = self.hybrid_search if self.search_type == SearchType.hybrid else self.vector_search
+        results = search(query, limit, where=where)
+        documents = self._build_search_results(results) if results is not None and len(results) else []
+        rest = {key: value for key, value in filters.items() if key not in pushed}
+        documents = [d for d in documents if all((d.meta_data or {}).get(key) == value for key, value in rest.items())]
+        if self.reranker and documents:
+            documents = self.reranker.rerank(query=query, documents=documents)
+        return documents
+
+    def search(self, query: str, limit: int = 5, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
+        if self.cache_max_entries <= 0:
+            return self._search(query, limit, filters)
+        try:
+            version = self.connection.open_table(name=self.table_name).version
+        except Exception:
+            return self._search(query, limit, filters)
+
+        key = (query, limit, json.dumps(filters, sort_keys=True, default=str) if filters else None)
+        with self._lock:
+            if version != self._results_version:
+                # The table changed since these results were read
+                self._results.clear()
+                self._results_version = version
+            documents = self._results.get(key)
+            if documents is not None:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return list(documents)
+            self.misses += 1
+
+        started = time.perf_counter()
+        documents = self._search(query, limit, filters)
+        with self._lock:
+            self.search_seconds += time.perf_counter() - started
+            if version == self._results_version:
+                self._results[key] = documents
+                while len(self._results) > self.cache_max_entries:
+                    self._results.popitem(last=False)
+        return list(documents)
+
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._results.clear()
+            self._query_vectors.clear()
+
+    # ANN index
+
+    def _vector_index(self, table) -> Optional[Any]:
+        for index in table.list_indices():
+            if index.columns == [self._vector_col] and index.index_type != "FTS":
+                return index
+        return None
+
+    def maintain_index(self) -> Optional[str]:
+        """
+        Builds the vector index once the table is large enough, or folds
+        unindexed rows into it once there are `index_refresh_rows` of them.
+        Returns "built", "refreshed" or None. Slow; call it off the event loop.
+        """
+        if not self.index_type or not self.exists():
+            return None
+        table = self.connection.open_table(name=self.table_name)
+        index = self._vector_index(table)
+        started = time.perf_counter()
+        if index is None:
+            rows = table.count_rows()
+            if rows < self.index_min_rows:
+                return None
+            table.create_index(self._vector_col, config=INDEX_TYPES[self.index_type](distance_type=self.metric), replace=True)
+            logger.info(f"Built {self.index_type} index on '{self.table_name}' ({rows} rows) in {time.perf_counter() - started:.1f}s")
+            with self._lock:
+                self.index_builds += 1
+            return "built"
+        index_stats = table.index_stats(index.name)
+        if index_stats is None or index_stats.num_unindexed_rows < self.index_refresh_rows:
+            return None
+        # Merges the new rows into the existing index (and compacts small fragments)
+        table.optimize()
+        logger.info(
+            f"Added {index_stats.num_unindexed_rows} rows to the vector index of '{self.table_name}' "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+        with self._lock:
+            self.index_refreshes += 1
+        return "refreshed"
+
+    def stats(self) -> Dict[str, Any]:
+        index = None
+        rows = 0
+        if self.exists():
+            table = self.connection.open_table(name=self.table_name)
+            rows = table.count_rows()
+            vector_index = self._vector_index(table)
+            if vector_index is not None:
+                index_stats = table.index_stats(vector_index.name)
+                index = {
+                    "name": vector_index.name,
+                    "type": vector_index.index_type,
+                    "indexed_rows": index_stats.num_indexed_rows if index_stats else None,
+                    "unindexed_rows": index_stats.num_unindexed_rows if index_stats else None,
+                }
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "table": self.table_name,
+                "rows": rows,
+                "search_type": self.search_type.value,
+                "index": index,
+                "index_type": self.index_type,
+                "index_min_rows": self.index_min_rows,
+                "index_builds": self.index_builds,
+                "index_refreshes": self.index_refreshes,
+                "nprobes": self.nprobes,
+                "refine_factor": self.refine_factor,
+                "ef": self.ef,
+                "rerank": self.rerank,
+                "cached_results": len(self._results),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "query_embedding_hits": self.embedding_hits,
+                "avg_search_seconds": self.search_seconds / self.misses if self.misses else 0.0,
+            }
@@ -0,0 +1,197 @@
+import asyncio
+import logging
+from dataclasses import asdict, dataclass, field, fields
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.models.system import SystemConfig, SystemConfigVersion
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidConfigValueError(ValueError):
+    """Raised when a known runtime setting is given a value it cannot take."""
+
+
+def _parse_bool(value: str) -> bool:
+    lowered = value.strip().lower()
+    if lowered in ("true", "1", "yes", "on"):
+        return True
+    if lowered in ("false", "0", "no", "off"):
+        return False
+    raise ValueError(f"not a boolean: {value!r}")
+
+
+@dataclass(frozen=True)
+class RuntimeConfig:
+    """
+    Typed snapshot of the `system_config` table. Known keys are parsed into
+    the fields below (defaulting to the environment settings); any other
+    keys are kept as strings in `extra`.
+    """
+    web_access_enabled: bool = True
+    max_agents_per_user: int = 5
+    session_timeout_minutes: int = 30
+    answer_cache_enabled: bool = settings.ANSWER_CACHE_ENABLED
+    answer_cache_ttl_seconds: float = settings.ANSWER_CACHE_TTL_SECONDS
+    auth_cache_ttl_seconds: float = settings.AUTH_CACHE_TTL_SECONDS
+    agent_max_queue: int = settings.AGENT_MAX_QUEUE
+    agent_run_timeout_seconds: float = settings.AGENT_RUN_TIMEOUT_SECONDS
+    login_max_attempts_per_ip: int = settings.LOGIN_MAX_ATTEMPTS_PER_IP
+    login_max_failures_per_user: int = settings.LOGIN_MAX_FAILURES_PER_USER
+    version: int = 0
+    extra: Dict[str, str] = field(default_factory=dict)
+
+    @staticmethod
+    def parse(key: str, value: str) -> Any:
+        """Parses `value` for a known key; other keys are returned unchanged."""
+        kind = _TYPED_KEYS.get(key)
+        if kind is None:
+            return value
+        try:
+            parsed = _parse_bool(value) if kind is bool else kind(value)
+        except ValueError as e:
+            raise InvalidConfigValueError(f"Invalid value for '{key}': {e}") from e
+        if kind in (int, float) and parsed < 0:
+            raise InvalidConfigValueError(f"'{key}' must not be negative.")
+        return parsed
+
+    @classmethod
+    def from_values(cls, values: Dict[str, str], version: int) -> "RuntimeConfig":
+        typed: Dict[str, Any] = {}
+        extra: Dict[str, str] = {}
+        for key, value in values.items():
+            if key not in _TYPED_KEYS:
+                extra[key] = value
+                continue
+            try:
+                typed[key] = cls.parse(key, value)
+            except InvalidConfigValueError as e:
+                logger.warning(f"Ignoring system config: {e}")
+        return cls(**typed, version=version, extra=extra)
+
+
+_TYPED_KEYS = {f.name: f.type for f in fields(RuntimeConfig) if f.name not in ("version", "extra")}
+
+
+class SystemConfigStore:
+    """
+    Keeps the current `RuntimeConfig` in memory so requests never read the
+    `system_config` table.
+
+    Every write bumps the single `system_config_version` row in the same
+    transaction. Each worker polls that row every `poll_seconds` and reloads
+    the snapshot when it changed, then calls the `on_change` listeners, so
+    admin changes reach all workers without a restart.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker, poll_seconds: float):
+        self.session_factory = session_factory
+        self.poll_seconds = poll_seconds
+        self._snapshot = RuntimeConfig()
+        self._listeners: List[Callable[[RuntimeConfig], None]] = []
+        self._task: Optional[asyncio.Task] = None
+        self.reloads = 0
+        self.polls = 0
+        self.failed_polls = 0
+
+    @property
+    def snapshot(self) -> RuntimeConfig:
+        return self._snapshot
+
+    def on_change(self, listener: Callable[[RuntimeConfig], None]) -> None:
+        """Registers `listener`; it is called with every newly loaded snapshot."""
+        self._listeners.append(listener)
+
+    @staticmethod
+    async def _read_version(db: AsyncSession) -> int:
+        return await db.scalar(select(SystemConfigVersion.version).where(SystemConfigVersion.id == 1)) or 0
+
+    async def load(self) -> RuntimeConfig:
+        async with self.session_factory() as db:
+            version = await self._read_version(db)
+            values = {row.key: row.value for row in await db.scalars(select(SystemConfig))}
+        snapshot = RuntimeConfig.from_values(values, version)
+        self._snapshot = snapshot
+        self.reloads += 1
+        for listener in self._listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                logger.error(f"System config listener failed: {e}", exc_info=True)
+        return snapshot
+
+    async def refresh(self) -> bool:
+        """Reloads the snapshot if another worker changed it; returns True if it did."""
+        async with self.session_factory() as db:
+            version = await self._read_version(db)
+        self.polls += 1
+        if version == self._snapshot.version:
+            return False
+        await self.load()
+        logger.info(f"Reloaded system config (version {version})")
+        return True
+
+    async def save(self, db: AsyncSession, key: str, value: str) -> SystemConfig:
+        """
+        Validates and writes one setting, bumps the version and applies the
+        change to this worker immediately. Raises InvalidConfigValueError.
+        """
+        RuntimeConfig.parse(key, value)
+        config_item = await db.scalar(select(SystemConfig).where(SystemConfig.key == key))
+        if config_item:
+            config_item.value = value
+        else:
+            config_item = SystemConfig(key=key, value=value)
+            db.add(config_item)
+        await db.execute(
+            update(SystemConfigVersion).where(SystemConfigVersion.id == 1).values(version=SystemConfigVersion.version + 1)
+        )
+        await db.commit()
+        await db.refresh(config_item)
+        await self.load()
+        return config_item
+
+    async def _ensure_version_row(self) -> None:
+        async with self.session_factory() as db:
+            if await db.get(SystemConfigVersion, 1) is None:
+                db.add(SystemConfigVersion(id=1, version=0))
+                try:
+                    await db.commit()
+                except IntegrityError:
+                    # Another worker created it first.
+                    await db.rollback()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                await self.refresh()
+            except Exception as e:
+                self.failed_polls += 1
+                logger.error(f"Failed to poll system config version: {e}")
+
+    async def start(self) -> None:
+        await self._ensure_version_row()
+        await self.load()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self._snapshot.version,
+            "poll_seconds": self.poll_seconds,
+            "polls": self.polls,
+            "failed_polls": self.failed_polls,
+            "reloads": self.reloads,
+            "values": asdict(self._snapshot),
+        }
@@ -0,0 +1,52 @@
+import secrets
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.services.shared_state import SharedState
+
+
+class SessionStore:
+    """
+    Login sessions, kept in shared state so every worker sees them.
+
+    Each access token carries its session id (`sid`). Logging out revokes
+    that session, and disabling or deleting a user revokes all of theirs;
+    with Redis this takes effect on every worker, without it only on the
+    worker that handled the request. Sessions expire with their tokens.
+    """
+
+    def __init__(self, state: SharedState, ttl_seconds: float):
+        self.state = state
+        self.ttl_seconds = ttl_seconds
+
+    async def create(self, user_id: int, ip: Optional[str]) -> str:
+        session_id = secrets.token_urlsafe(16)
+        record = {"session_id": session_id, "user_id": user_id, "ip": ip, "created_at": datetime.utcnow().isoformat()}
+        await self.state.set_json(f"session:{session_id}", record, self.ttl_seconds)
+        await self.state.set_add(f"user-sessions:{user_id}", session_id, self.ttl_seconds)
+        return session_id
+
+    async def is_revoked(self, session_id: str, user_id: int, issued_at: float) -> bool:
+        revoked, revoked_before = await self.state.get_many_json(
+            [f"session-revoked:{session_id}", f"user-sessions-revoked:{user_id}"]
+        )
+        return bool(revoked) or (revoked_before is not None and issued_at <= revoked_before)
+
+    async def revoke(self, session_id: str, user_id: int) -> None:
+        await self.state.set_json(f"session-revoked:{session_id}", True, self.ttl_seconds)
+        await self.state.delete(f"session:{session_id}")
+        await self.state.set_remove(f"user-sessions:{user_id}", session_id)
+
+    async def revoke_user(self, user_id: int) -> None:
+        """Revokes every session the user has, including ones not listed (e.g. from another worker's memory)."""
+        await self.state.set_json(f"user-sessions-revoked:{user_id}", time.time(), self.ttl_seconds)
+        session_ids = await self.state.set_members(f"user-sessions:{user_id}")
+        await self.state.delete(f"user-sessions:{user_id}", *[f"session:{session_id}" for session_id in session_ids])
+
+    async def list(self, user_id: int) -> List[Dict[str, Any]]:
+        session_ids = sorted(await self.state.set_members(f"user-sessions:{user_id}"))
+        if not session_ids:
+            return []
+        records = await self.state.get_many_json([f"session:{session_id}" for session_id in session_ids])
+        return sorted((record for record in records if record), key=lambda record: record["created_at"], reverse=True)
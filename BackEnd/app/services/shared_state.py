@@ -0,0 +1,363 @@
+import asyncio
+import json
+import logging
+import math
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Callable, Coroutine, Deque, Dict, List, Optional, Set, Tuple
+
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+
+class _LocalStore:
+    """In-process stand-in for the Redis data structures used by `SharedState`."""
+
+    # Keys kept before expired ones are swept.
+    SWEEP_THRESHOLD = 10000
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[Any, Optional[float]]] = {}
+        self._windows: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def _sweep_locked(self, now: float) -> None:
+        if len(self._values) > self.SWEEP_THRESHOLD:
+            for key in [key for key, (_, expires) in self._values.items() if expires is not None and expires <= now]:
+                del self._values[key]
+        if len(self._windows) > self.SWEEP_THRESHOLD:
+            for key in [key for key, times in self._windows.items() if not times]:
+                del self._windows[key]
+
+    def _get_locked(self, key: str, now: float) -> Any:
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= now:
+            del self._values[key]
+            return None
+        return entry[0]
+
+    def get_many(self, keys: List[str]) -> List[Any]:
+        now = time.monotonic()
+        with self._lock:
+            return [self._get_locked(key, now) for key in keys]
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._sweep_locked(now)
+            self._values[key] = (value, now + ttl_seconds if ttl_seconds else None)
+
+    def delete(self, keys: List[str]) -> None:
+        with self._lock:
+            for key in keys:
+                self._values.pop(key, None)
+                self._windows.pop(key, None)
+
+    def incr(self, key: str) -> int:
+        now = time.monotonic()
+        with self._lock:
+            value = int(self._get_locked(key, now) or 0) + 1
+            self._values[key] = (value, self._values[key][1] if key in self._values else None)
+            return value
+
+    def set_add(self, key: str, member: str, ttl_seconds: float) -> None:
+        now = time.monotonic()
+        with self._lock:
+            members = self._get_locked(key, now) or set()
+            members.add(member)
+            self._values[key] = (members, now + ttl_seconds)
+
+    def set_remove(self, key: str, member: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            members = self._get_locked(key, now)
+            if members:
+                members.discard(member)
+
+    def set_members(self, key: str) -> Set[str]:
+        now = time.monotonic()
+        with self._lock:
+            return set(self._get_locked(key, now) or ())
+
+    def _window_locked(self, key: str, window: float, now: float) -> Deque[float]:
+        times = self._windows.setdefault(key, deque())
+        while times and times[0] <= now - window:
+            times.popleft()
+        return times
+
+    def window_count(self, key: str, window: float) -> Tuple[int, Optional[float]]:
+        now = time.monotonic()
+        with self._lock:
+            times = self._window_locked(key, window, now)
+            return len(times), (times[0] + window - now if times else None)
+
+    def window_add(self, key: str, window: float) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._sweep_locked(now)
+            self._window_locked(key, window, now).append(now)
+
+    def window_acquire(self, key: str, window: float, limit: int) -> Optional[float]:
+        now = time.monotonic()
+        with self._lock:
+            self._sweep_locked(now)
+            times = self._window_locked(key, window, now)
+            if len(times) >= limit:
+                return times[0] + window - now
+            times.append(now)
+            return None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"local_keys": len(self._values), "local_windows": len(self._windows)}
+
+
+class SharedState:
+    """
+    Key/value, set, sliding-window and broadcast primitives shared by every
+    worker and replica through Redis.
+
+    Without a Redis URL, or while Redis is unreachable, the same operations
+    run against process memory: the app keeps working, but each worker then
+    only sees its own state. After a Redis error the local store is used for
+    `retry_seconds` before Redis is tried again. All keys and channels are
+    prefixed with `prefix`.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str],
+        prefix: str,
+        max_connections: int,
+        retry_seconds: float,
+        client: Optional[aioredis.Redis] = None,
+    ):
+        self.url = url
+        self.prefix = prefix
+        self.max_connections = max_connections
+        self.retry_seconds = retry_seconds
+        self._redis = client
+        self._local = _LocalStore()
+        self._handlers: Dict[str, List[Callable[[str], None]]] = {}
+        self._instance = uuid.uuid4().hex
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._down_until = 0.0
+        self.redis_errors = 0
+        self.local_operations = 0
+        self.published = 0
+        self.received = 0
+
+    # --- Connection ---
+
+    @property
+    def shared(self) -> bool:
+        """True while operations go to Redis, i.e. are visible to other workers."""
+        return self._redis is not None and time.monotonic() >= self._down_until
+
+    def _mark_down(self, error: Exception) -> None:
+        if self.shared:
+            logger.warning(f"Redis unavailable, using in-process state for {self.retry_seconds:g}s: {error}")
+        self._down_until = time.monotonic() + self.retry_seconds
+        self.redis_errors += 1
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    async def _call(self, redis_op: Callable[[], Coroutine[Any, Any, Any]], local_op: Callable[[], Any]) -> Any:
+        if self.shared:
+            try:
+                return await redis_op()
+            except (RedisError, OSError) as e:
+                self._mark_down(e)
+        self.local_operations += 1
+        return local_op()
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        if self._redis is None and self.url:
+            self._redis = aioredis.from_url(
+                self.url,
+                max_connections=self.max_connections,
+                decode_responses=True,
+                socket_connect_timeout=2,
+                socket_timeout=2,
+            )
+        if self._redis is None:
+            logger.info("Redis is not configured; shared state is kept per worker.")
+            return
+        try:
+            await self._redis.ping()
+            logger.info("Shared state is kept in Redis.")
+        except (RedisError, OSError) as e:
+            self._mark_down(e)
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        if self._redis is not None:
+            await self._redis.aclose()
+
+    # --- Values ---
+
+    async def get_json(self, key: str) -> Any:
+        return (await self.get_many_json([key]))[0]
+
+    async def get_many_json(self, keys: List[str]) -> List[Any]:
+        async def redis_op():
+            return [json.loads(value) if value is not None else None for value in await self._redis.mget([self._key(key) for key in keys])]
+        return await self._call(redis_op, lambda: self._local.get_many(keys))
+
+    async def set_json(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        async def redis_op():
+            await self._redis.set(self._key(key), json.dumps(value), px=int(ttl_seconds * 1000) if ttl_seconds else None)
+        await self._call(redis_op, lambda: self._local.set(key, value, ttl_seconds))
+
+    async def delete(self, *keys: str) -> None:
+        await self._call(lambda: self._redis.delete(*[self._key(key) for key in keys]), lambda: self._local.delete(list(keys)))
+
+    async def incr(self, key: str) -> int:
+        return int(await self._call(lambda: self._redis.incr(self._key(key)), lambda: self._local.incr(key)))
+
+    # --- Sets ---
+
+    async def set_add(self, key: str, member: str, ttl_seconds: float) -> None:
+        async def redis_op():
+            async with self._redis.pipeline(transaction=True) as pipe:
+                pipe.sadd(self._key(key), member)
+                pipe.expire(self._key(key), math.ceil(ttl_seconds))
+                await pipe.execute()
+        await self._call(redis_op, lambda: self._local.set_add(key, member, ttl_seconds))
+
+    async def set_remove(self, key: str, member: str) -> None:
+        await self._call(lambda: self._redis.srem(self._key(key), member), lambda: self._local.set_remove(key, member))
+
+    async def set_members(self, key: str) -> Set[str]:
+        return set(await self._call(lambda: self._redis.smembers(self._key(key)), lambda: self._local.set_members(key)))
+
+    # --- Sliding windows (rate limits) ---
+
+    async def window_count(self, key: str, window: float) -> Tuple[int, Optional[float]]:
+        """Returns the events in the last `window` seconds and when the oldest expires."""
+        async def redis_op():
+            now = time.time()
+            async with self._redis.pipeline(transaction=True) as pipe:
+                pipe.zremrangebyscore(self._key(key), 0, now - window)
+                pipe.zcard(self._key(key))
+                pipe.zrange(self._key(key), 0, 0, withscores=True)
+                _, count, oldest = await pipe.execute()
+            return count, (oldest[0][1] + window - now if oldest else None)
+        return await self._call(redis_op, lambda: self._local.window_count(key, window))
+
+    async def window_add(self, key: str, window: float) -> None:
+        async def redis_op():
+            now = time.time()
+            async with self._redis.pipeline(transaction=True) as pipe:
+                pipe.zadd(self._key(key), {f"{now}:{uuid.uuid4().hex[:8]}": now})
+                pipe.expire(self._key(key), math.ceil(window))
+                await pipe.execute()
+        await self._call(redis_op, lambda: self._local.window_add(key, window))
+
+    async def window_acquire(self, key: str, window: float, limit: int) -> Optional[float]:
+        """
+        Records an event unless `limit` events already happened in the last
+        `window` seconds. Returns None if recorded, else the seconds until
+        the oldest event leaves the window.
+        """
+        async def redis_op():
+            now = time.time()
+            member = f"{now}:{uuid.uuid4().hex[:8]}"
+            async with self._redis.pipeline(transaction=True) as pipe:
+                pipe.zremrangebyscore(self._key(key), 0, now - window)
+                pipe.zadd(self._key(key), {member: now})
+                pipe.zcard(self._key(key))
+                pipe.zrange(self._key(key), 0, 0, withscores=True)
+                pipe.expire(self._key(key), math.ceil(window))
+                _, _, count, oldest, _ = await pipe.execute()
+            if count <= limit:
+                return None
+            # Over the limit: take our event back out so it does not extend the lockout.
+            await self._redis.zrem(self._key(key), member)
+            return oldest[0][1] + window - now
+        return await self._call(redis_op, lambda: self._local.window_acquire(key, window, limit))
+
+    # --- Broadcast ---
+
+    def subscribe(self, channel: str, handler: Callable[[str], None]) -> None:
+        """Calls `handler(message)` in every worker for each message published on `channel`."""
+        self._handlers.setdefault(channel, []).append(handler)
+
+    def _dispatch(self, channel: str, message: str) -> None:
+        for handler in self._handlers.get(channel, []):
+            try:
+                handler(message)
+            except Exception as e:
+                logger.error(f"Handler for {channel} failed: {e}", exc_info=True)
+
+    async def publish(self, channel: str, message: str) -> None:
+        # This worker handles its own message right away; others get it through Redis.
+        self._dispatch(channel, message)
+        self.published += 1
+        payload = json.dumps({"from": self._instance, "message": message})
+        await self._call(lambda: self._redis.publish(self._key(channel), payload), lambda: None)
+
+    def run_threadsafe(self, coroutine: Coroutine[Any, Any, Any]) -> None:
+        """Schedules `coroutine` on the app's event loop from any thread, without waiting."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            asyncio.run(coroutine)
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            loop.create_task(coroutine)
+        else:
+            asyncio.run_coroutine_threadsafe(coroutine, loop)
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                channels = {self._key(channel): channel for channel in self._handlers}
+                if not channels:
+                    return
+                await pubsub.subscribe(*channels)
+                while True:
+                    # A short read timeout keeps the idle connection within socket_timeout.
+                    item = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if item is None:
+                        continue
+                    payload = json.loads(item["data"])
+                    if payload["from"] != self._instance:
+                        self.received += 1
+                        self._dispatch(channels[item["channel"]], payload["message"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Messages published while disconnected are lost; caches fall back on their TTLs.
+                self._mark_down(e)
+                await asyncio.sleep(self.retry_seconds)
+            finally:
+                await pubsub.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "redis" if self.shared else "local",
+            "redis_configured": self._redis is not None,
+            "redis_errors": self.redis_errors,
+            "local_operations": self.local_operations,
+            "published": self.published,
+            "received": self.received,
+            **self._local.stats(),
+        }
@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import threading
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Flight:
+    """
+    One in-flight generation, shared by every request that asked for it.
+
+    The producer `publish()`es pieces of the answer as they arrive; each
+    subscriber replays what it missed and then follows along. Subscribers
+    must `leave()` when done: once the last one has left an unfinished
+    flight, its generation is cancelled.
+    """
+
+    def __init__(self, key: Optional[str]):
+        self.key = key
+        self.parts: List[str] = []
+        self.result: Optional[str] = None
+        self.error: Optional[BaseException] = None
+        self.done = False
+        self.abandoned = False
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._started = asyncio.Event()
+        self._changed = asyncio.Condition()
+
+    async def _notify(self) -> None:
+        async with self._changed:
+            self._changed.notify_all()
+
+    def mark_started(self) -> None:
+        """Signals that the generation was admitted and is producing output."""
+        self._started.set()
+
+    async def publish(self, part: str) -> None:
+        self.parts.append(part)
+        await self._notify()
+
+    async def _finish(self, result: Optional[str], error: Optional[BaseException]) -> None:
+        self.result, self.error, self.done = result, error, True
+        self._started.set()
+        await self._notify()
+
+    async def started(self) -> None:
+        """Waits until output starts flowing; raises if the generation failed before that."""
+        await self._started.wait()
+        if self.error is not None and not self.parts:
+            raise self.error
+
+    async def wait(self) -> str:
+        """Waits for and returns the full answer."""
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.done)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    async def deltas(self) -> AsyncIterator[str]:
+        """Yields every part of the answer, from the first, until it is complete."""
+        sent = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: self.done or len(self.parts) > sent)
+                pending, done = self.parts[sent:], self.done
+            for part in pending:
+                yield part
+            sent += len(pending)
+            if done and sent == len(self.parts):
+                if self.error is not None:
+                    raise self.error
+                if not sent and self.result:
+                    # Joined a flight that does not stream: the answer comes whole
+                    yield self.result
+                return
+
+    def leave(self) -> None:
+        self.subscribers -= 1
+        if self.subscribers <= 0 and not self.done and self.task is not None:
+            logger.info("Every request for an in-flight answer went away, stopping its generation.")
+            # The task only finishes on a later loop iteration; nobody may join it meanwhile.
+            self.abandoned = True
+            self.task.cancel()
+
+
+Produce = Callable[[Flight], Awaitable[str]]
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent generations of the same answer.
+
+    The first request for a key starts `produce(flight)` as a background
+    task; requests for the same key that arrive while it runs subscribe to
+    that flight instead of starting their own, and all receive its result,
+    stream or error. A key is forgotten as soon as its flight completes, so
+    later requests are served by the answer cache or generate anew.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, Flight] = {}
+        self._lock = threading.Lock()
+        self.generations = 0
+        self.coalesced = 0
+        self.cancelled = 0
+        self.max_subscribers = 0
+
+    def join(self, key: Optional[str], produce: Produce) -> Tuple[Flight, bool]:
+        """
+        Subscribes to the flight for `key`, starting it if there is none; a
+        None key always starts a flight of its own. Returns the flight and
+        whether this call started it.
+        """
+        flight = self._flights.get(key) if key is not None else None
+        if flight is not None and not flight.done and not flight.abandoned:
+            flight.subscribers += 1
+            with self._lock:
+                self.coalesced += 1
+                self.max_subscribers = max(self.max_subscribers, flight.subscribers)
+            return flight, False
+
+        flight = Flight(key)
+        flight.subscribers = 1
+        if key is not None:
+            self._flights[key] = flight
+        flight.task = asyncio.get_running_loop().create_task(self._run(flight, produce))
+        # Also runs for a task cancelled before it started
+        flight.task.add_done_callback(lambda _: self._forget(flight))
+        with self._lock:
+            self.generations += 1
+        return flight, True
+
+    async def _run(self, flight: Flight, produce: Produce) -> None:
+        result: Optional[str] = None
+        error: Optional[BaseException] = None
+        try:
+            result = await produce(flight)
+        except asyncio.CancelledError as e:
+            with self._lock:
+                self.cancelled += 1
+            error = e
+        except Exception as e:
+            error = e
+        finally:
+            await flight._finish(result, error)
+
+    def _forget(self, flight: Flight) -> None:
+        if flight.key is not None and self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            requests = self.generations + self.coalesced
+            return {
+                "in_flight": len(self._flights),
+                "generations": self.generations,
+                "coalesced_requests": self.coalesced,
+                "generations_saved_ratio": self.coalesced / requests if requests else 0.0,
+                "cancelled": self.cancelled,
+                "max_subscribers": self.max_subscribers,
+            }
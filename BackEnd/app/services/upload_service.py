@@ -0,0 +1,261 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+logger = logging.getLogger(__name__)
+
+# Bytes buffered in memory before a write is handed to a thread.
+WRITE_BUFFER_BYTES = 1024 * 1024
+# Slack for multipart boundaries and part headers when checking Content-Length.
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+# Bytes read per step when hashing a file already on disk.
+HASH_READ_BYTES = 1024 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """The upload is bigger than allowed."""
+
+
+class UploadFormatError(Exception):
+    """The request body is not a usable upload."""
+
+
+@dataclass
+class StoredUpload:
+    """A fully received upload, still at its temporary path."""
+    path: Path
+    filename: str
+    size: int
+    sha256: str
+
+
+def safe_filename(filename: Optional[str]) -> str:
+    """Strips directories from a client-supplied filename."""
+    name = Path((filename or "").replace("\\", "/")).name
+    if name in ("", ".", ".."):
+        raise UploadFormatError("A filename is required.")
+    return name
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(HASH_READ_BYTES):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class _FileSink:
+    """
+    Writes a byte stream to disk without blocking the event loop: data is
+    hashed and size-checked as it arrives and flushed to a thread in ~1 MiB
+    blocks.
+    """
+
+    def __init__(self, path: Path, max_bytes: int, offset: int = 0, digest=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.size = offset
+        self.digest = digest if digest is not None else hashlib.sha256()
+        self._buffer = bytearray()
+        self._file = None
+
+    async def open(self) -> None:
+        def _open():
+            f = open(self.path, "r+b" if self.size else "wb")
+            f.seek(self.size)
+            f.truncate()
+            return f
+        self._file = await asyncio.to_thread(_open)
+
+    async def write(self, data: bytes) -> None:
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise UploadTooLargeError(f"Upload exceeds the limit of {self.max_bytes} bytes.")
+        self.digest.update(data)
+        self._buffer += data
+        if len(self._buffer) >= WRITE_BUFFER_BYTES:
+            await self.flush()
+
+    async def flush(self) -> None:
+        if self._buffer:
+            block, self._buffer = bytes(self._buffer), bytearray()
+            await asyncio.to_thread(self._file.write, block)
+
+    async def close(self) -> None:
+        if self._file is not None:
+            try:
+                await self.flush()
+            finally:
+                await asyncio.to_thread(self._file.close)
+                self._file = None
+
+
+def _check_content_length(request: Request, max_bytes: int) -> None:
+    length = request.headers.get("content-length")
+    if length is not None and length.isdigit() and int(length) > max_bytes:
+        raise UploadTooLargeError(f"Upload exceeds the limit of {max_bytes} bytes.")
+
+
+async def receive_multipart(request: Request, dest: Path, max_bytes: int, field: str = "file") -> StoredUpload:
+    """
+    Streams the `field` file part of a multipart/form-data request to `dest`,
+    hashing it on the way. Unlike `UploadFile`, nothing is spooled to a
+    temporary file first, and oversized uploads are rejected as soon as the
+    limit is crossed (or up front, from Content-Length).
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise UploadFormatError("Expected a multipart/form-data upload.")
+    _check_content_length(request, max_bytes + MULTIPART_OVERHEAD_BYTES)
+
+    # The parser's callbacks are synchronous: collect events per received
+    # chunk and handle them (with async writes) afterwards.
+    events: List[Tuple[str, bytes]] = []
+    header: Dict[str, bytearray] = {"field": bytearray(), "value": bytearray()}
+
+    def on_header_field(data: bytes, start: int, end: int) -> None:
+        header["field"] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int) -> None:
+        header["value"] += data[start:end]
+
+    def on_header_end() -> None:
+        events.append(("header", bytes(header["field"]).lower() + b"\x00" + bytes(header["value"])))
+        header["field"], header["value"] = bytearray(), bytearray()
+
+    parser = MultipartParser(params[b"boundary"], callbacks={
+        "on_part_begin": lambda: events.append(("begin", b"")),
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_part_data": lambda data, start, end: events.append(("data", data[start:end])),
+        "on_part_end": lambda: events.append(("end", b"")),
+    })
+
+    sink: Optional[_FileSink] = None
+    filename: Optional[str] = None
+    in_file_part = done = False
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for kind, data in events:
+                if kind == "begin":
+                    in_file_part = False
+                elif kind == "header" and not done:
+                    name, _, value = data.partition(b"\x00")
+                    if name == b"content-disposition":
+                        _, disposition = parse_options_header(value)
+                        if disposition.get(b"name", b"").decode() == field and b"filename" in disposition:
+                            filename = safe_filename(disposition[b"filename"].decode())
+                            sink = _FileSink(dest, max_bytes)
+                            await sink.open()
+                            in_file_part = True
+                elif kind == "data" and in_file_part:
+                    await sink.write(data)
+                elif kind == "end" and in_file_part:
+                    in_file_part, done = False, True
+            events.clear()
+        parser.finalize()
+    except BaseException:
+        if sink is not None:
+            await sink.close()
+        dest.unlink(missing_ok=True)
+        raise
+
+    if sink is None or not done:
+        dest.unlink(missing_ok=True)
+        raise UploadFormatError(f"No complete '{field}' file part in the upload.")
+    await sink.close()
+    return StoredUpload(path=dest, filename=filename, size=sink.size, sha256=sink.digest.hexdigest())
+
+
+class ResumableUploads:
+    """
+    Receives large files in sequential chunks that can be resumed after a
+    dropped connection. Chunks append to a partial file; the offset persisted
+    by the caller is the source of truth for where the next chunk starts.
+
+    The running hash is kept in memory while chunks arrive in order, so a
+    completed upload normally needs no second pass over the file; after a
+    restart (or on another worker) the partial file is re-hashed instead.
+    Hashes of uploads idle for `ttl_seconds` are forgotten.
+    """
+
+    def __init__(self, partial_dir: Path, max_bytes: int, max_chunk_bytes: int, ttl_seconds: float):
+        self.partial_dir = Path(partial_dir)
+        self.max_bytes = max_bytes
+        self.max_chunk_bytes = max_chunk_bytes
+        self.ttl_seconds = ttl_seconds
+        self._digests: Dict[str, Tuple[int, Any, float]] = {}
+
+    def new_id(self) -> str:
+        return uuid.uuid4().hex
+
+    def path(self, upload_id: str) -> Path:
+        return self.partial_dir / f"{upload_id}.part"
+
+    def _forget_idle(self) -> None:
+        cutoff = time.monotonic() - self.ttl_seconds
+        for upload_id in [upload_id for upload_id, (_, _, used) in self._digests.items() if used < cutoff]:
+            del self._digests[upload_id]
+
+    async def append(self, request: Request, upload_id: str, offset: int, total_size: int) -> int:
+        """
+        Appends the request body at `offset`, returning the new offset. The
+        caller makes sure no other request, on any worker, appends to the
+        upload meanwhile, and that `offset` is the stored one.
+        """
+        _check_content_length(request, self.max_chunk_bytes)
+        self.partial_dir.mkdir(parents=True, exist_ok=True)
+        self._forget_idle()
+        size, digest, _ = self._digests.pop(upload_id, (None, None, None))
+        if size != offset:
+            digest = None
+            if offset:
+                digest = await asyncio.to_thread(self._hash_prefix, self.path(upload_id), offset)
+
+        sink = _FileSink(self.path(upload_id), min(total_size, self.max_bytes), offset=offset, digest=digest)
+        await sink.open()
+        try:
+            async for chunk in request.stream():
+                if sink.size - offset + len(chunk) > self.max_chunk_bytes:
+                    raise UploadTooLargeError(f"Chunk exceeds the limit of {self.max_chunk_bytes} bytes.")
+                await sink.write(chunk)
+        except BaseException:
+            # Drop the partial chunk; the client resumes from `offset`.
+            await sink.close()
+            await asyncio.to_thread(os.truncate, self.path(upload_id), offset)
+            raise
+        await sink.close()
+        self._digests[upload_id] = (sink.size, sink.digest, time.monotonic())
+        return sink.size
+
+    def _hash_prefix(self, path: Path, length: int):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            remaining = length
+            while remaining and (block := f.read(min(HASH_READ_BYTES, remaining))):
+                digest.update(block)
+                remaining -= len(block)
+        return digest
+
+    async def complete(self, upload_id: str, filename: str, size: int) -> StoredUpload:
+        """Returns the finished upload, hashing it if the running hash was lost."""
+        path = self.path(upload_id)
+        cached_size, digest, _ = self._digests.pop(upload_id, (None, None, None))
+        sha256 = digest.hexdigest() if cached_size == size else await asyncio.to_thread(file_sha256, path)
+        return StoredUpload(path=path, filename=filename, size=size, sha256=sha256)
+
+    def discard(self, upload_id: str) -> None:
+        self._digests.pop(upload_id, None)
+        self.path(upload_id).unlink(missing_ok=True)
@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import lancedb
+
+from app.services.retrieval import INDEX_TYPES
+from app.services.shared_state import SharedState
+
+logger = logging.getLogger(__name__)
+
+# Shared-state key limiting scheduled runs to one per interval across workers
+MAINTENANCE_KEY = "vector-maintenance:run"
+
+
+def _disk_bytes(path: Path) -> Optional[int]:
+    if not path.is_dir():
+        return None
+    return sum(file.stat().st_size for file in path.rglob("*") if file.is_file())
+
+
+class VectorMaintenance:
+    """
+    Housekeeping for the LanceDB tables under `uri`.
+
+    Every insert and delete writes a new table version, so tables pile up
+    small fragments and old versions. `run()` compacts each table's
+    fragments, deletes versions older than `keep_versions_seconds` (their
+    files are what makes `tmp/lancedb` grow) and folds new rows into the
+    indexes; with `rebuild_indexes`, indexes that incremental updates have
+    split into several parts are rebuilt from scratch. `report()` gives each
+    table's rows, fragments, versions, indexes and bytes.
+
+    `start()` schedules `run()` every `interval_seconds`; with Redis, only
+    one worker runs it per interval.
+    """
+
+    def __init__(
+        self,
+        uri: str,
+        keep_versions_seconds: float,
+        rebuild_indexes: bool = True,
+        interval_seconds: float = 0.0,
+        state: Optional[SharedState] = None,
+    ):
+        self.uri = uri
+        self.keep_versions_seconds = keep_versions_seconds
+        self.rebuild_indexes = rebuild_indexes
+        self.interval_seconds = interval_seconds
+        self.state = state
+        self._task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.failures = 0
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    def _connect(self):
+        return lancedb.connect(self.uri)
+
+    def table_report(self, table) -> Dict[str, Any]:
+        stats = table.stats()
+        indexes = []
+        for index in table.list_indices():
+            index_stats = table.index_stats(index.name)
+            indexes.append({
+                "name": index.name,
+                "type": index_stats.index_type if index_stats else index.index_type,
+                "columns": list(index.columns),
+                "indexed_rows": index_stats.num_indexed_rows if index_stats else None,
+                "unindexed_rows": index_stats.num_unindexed_rows if index_stats else None,
+                "parts": index_stats.num_indices if index_stats else None,
+            })
+        return {
+            "rows": stats["num_rows"],
+            "fragments": stats["fragment_stats"]["num_fragments"],
+            "small_fragments": stats["fragment_stats"]["num_small_fragments"],
+            "versions": len(table.list_versions()),
+            "data_bytes": stats["total_bytes"],
+            "disk_bytes": _disk_bytes(Path(self.uri) / f"{table.name}.lance"),
+            "indexes": indexes,
+        }
+
+    def report(self) -> Dict[str, Any]:
+        """Current size and layout of every table."""
+        connection = self._connect()
+        tables = {}
+        for name in connection.table_names():
+            try:
+                tables[name] = self.table_report(connection.open_table(name))
+            except Exception as e:
+                tables[name] = {"error": str(e)}
+        with self._lock:
+            return {
+                "uri": self.uri,
+                "disk_bytes": sum(table.get("disk_bytes") or 0 for table in tables.values()),
+                "tables": tables,
+                "interval_seconds": self.interval_seconds,
+                "keep_versions_seconds": self.keep_versions_seconds,
+                "runs": self.runs,
+                "failures": self.failures,
+                "last_run": self.last_run,
+            }
+
+    def _rebuild_split_indexes(self, table) -> List[str]:
+        rebuilt = []
+        for index in table.list_indices():
+            index_stats = table.index_stats(index.name)
+            if index_stats is None or (index_stats.num_indices or 1) <= 1:
+                continue
+            column = index.columns[0]
+            if index_stats.index_type == "FTS":
+                table.create_fts_index(column, replace=True)
+            elif index_stats.index_type in INDEX_TYPES:
+                config = INDEX_TYPES[index_stats.index_type](distance_type=index_stats.distance_type or "l2")
+                table.create_index(column, config=config, replace=True, name=index.name)
+            else:
+                continue
+            rebuilt.append(index.name)
+        return rebuilt
+
+    def maintain_table(self, table) -> Dict[str, Any]:
+        started = time.perf_counter()
+        before = self.table_report(table)
+        table.optimize(cleanup_older_than=timedelta(seconds=self.keep_versions_seconds))
+        rebuilt = self._rebuild_split_indexes(table) if self.rebuild_indexes else []
+        if rebuilt:
+            # Drop the files the old indexes leave behind as well
+            table.optimize(cleanup_older_than=timedelta(seconds=self.keep_versions_seconds))
+        after = self.table_report(table)
+        result = {
+            "seconds": time.perf_counter() - started,
+            "rows": after["rows"],
+            "fragments": [before["fragments"], after["fragments"]],
+            "versions": [before["versions"], after["versions"]],
+            "disk_bytes": [before["disk_bytes"], after["disk_bytes"]],
+            "indexes_rebuilt": rebuilt,
+        }
+        logger.info(
+            f"Maintained vector table '{table.name}' in {result['seconds']:.1f}s: fragments {before['fragments']} -> "
+            f"{after['fragments']}, versions {before['versions']} -> {after['versions']}, "
+            f"bytes {before['disk_bytes']} -> {after['disk_bytes']}, indexes rebuilt: {', '.join(rebuilt) or 'none'}"
+        )
+        return result
+
+    def run(self) -> Dict[str, Any]:
+        """Maintains every table; a table that fails is reported and skipped. Slow, so call it off the event loop."""
+        started = time.time()
+        connection = self._connect()
+        tables = {}
+        failed = False
+        for name in connection.table_names():
+            try:
+                tables[name] = self.maintain_table(connection.open_table(name))
+            except Exception as e:
+                failed = True
+                logger.error(f"Maintenance of vector table '{name}' failed: {e}")
+                tables[name] = {"error": str(e)}
+        result = {"started_at": started, "seconds": time.time() - started, "tables": tables}
+        with self._lock:
+            self.runs += 1
+            self.failures += int(failed)
+            self.last_run = result
+        return result
+
+    async def _run(self) -> None:
+        # With shared state, checked at least hourly so restarts don't keep postponing a daily run
+        poll_seconds = min(self.interval_seconds, 3600.0) if self.state is not None else self.interval_seconds
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(poll_seconds)
+            try:
+                if self.state is not None and await self.state.window_acquire(MAINTENANCE_KEY, self.interval_seconds, 1) is not None:
+                    continue
+                await loop.run_in_executor(None, self.run)
+            except Exception as e:
+                logger.error(f"Scheduled vector store maintenance failed: {e}")
+
+    async def start(self) -> None:
+        if self.interval_seconds > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
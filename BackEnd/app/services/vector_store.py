@@ -0,0 +1,146 @@
+import json
+import logging
+from hashlib import md5
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pyarrow as pa
+from agno.document import Document
+
+from app.services.retrieval import CachedLanceDb
+
+logger = logging.getLogger(__name__)
+
+# Knowledge source of a chunk, by the extension of the file it came from
+SOURCE_TYPES = {".pdf": "pdf", ".doc": "docx", ".docx": "docx", ".txt": "txt"}
+
+# Tables of the combined and per-source knowledge bases, with the source type of their rows (None: by
+# filename). The combined table goes first: its rows carry the file ids ingestion recorded.
+LEGACY_TABLES = {
+    "local_docs_combined": None,
+    "local_docs_pdf": "pdf",
+    "local_docs_docx": "docx",
+    "local_docs_txt": "txt",
+}
+
+MIGRATION_BATCH_SIZE = 1000
+
+
+def source_type_for(filename: Optional[str]) -> Optional[str]:
+    return SOURCE_TYPES.get(Path(filename).suffix.lower()) if filename else None
+
+
+class KnowledgeStore(CachedLanceDb):
+    """
+    The one LanceDb table holding every knowledge chunk, whatever its source.
+
+    Besides LanceDb's vector, id and payload, each row carries the
+    `source_type` ("pdf", "docx", "txt") and `file_id` of the file it came
+    from, so searches can be restricted to a type or file inside LanceDB,
+    e.g. `search(query, filters={"source_type": ["pdf", "docx"]})`.
+    """
+
+    filter_columns = ("source_type", "file_id")
+
+    def _base_schema(self) -> pa.Schema:
+        # Sized from the configured dimensions rather than by embedding a probe text
+        return pa.schema([
+            pa.field(self._vector_col, pa.list_(pa.float32(), self.dimensions)),
+            pa.field(self._id, pa.string()),
+            pa.field("payload", pa.string()),
+            pa.field("source_type", pa.string()),
+            pa.field("file_id", pa.int64()),
+        ])
+
+    def _existing_ids(self, ids: List[str]) -> set:
+        if self.table is None or not ids:
+            return set()
+        quoted = ", ".join(f"'{doc_id}'" for doc_id in ids)
+        rows = self.table.search().where(f"{self._id} IN ({quoted})").select([self._id]).limit(len(ids)).to_arrow()
+        return set(rows.column(self._id).to_pylist())
+
+    def insert(self, documents: List[Document], filters: Optional[Dict[str, Any]] = None) -> None:
+        if not documents:
+            return
+        if self.table is None:
+            logger.error("Table not initialized. Please create the table first")
+            return
+
+        rows: Dict[str, Dict[str, Any]] = {}
+        for document in documents:
+            content = document.content.replace("\x00", "\ufffd")
+            rows.setdefault(md5(content.encode()).hexdigest(), {"document": document, "content": content})
+        existing = self._existing_ids(list(rows))
+
+        data = []
+        for doc_id, row in rows.items():
+            if doc_id in existing:
+                continue
+            document = row["document"]
+            meta_data = dict(document.meta_data or {})
+            meta_data.update(filters or {})
+            meta_data.setdefault("source_type", source_type_for(meta_data.get("filename")))
+            document.meta_data = meta_data
+            document.embed(embedder=self.embedder)
+            data.append({
+                self._id: doc_id,
+                self._vector_col: document.embedding,
+                "payload": json.dumps({"name": document.name, "meta_data": meta_data, "content": row["content"], "usage": document.usage}),
+                "source_type": meta_data["source_type"],
+                "file_id": meta_data.get("file_id"),
+            })
+        if not data:
+            return
+        if self.on_bad_vectors is not None:
+            self.table.add(data, on_bad_vectors=self.on_bad_vectors, fill_value=self.fill_value)
+        else:
+            self.table.add(data)
+
+    def upsert(self, documents: List[Document], filters: Optional[Dict[str, Any]] = None) -> None:
+        self.insert(documents, filters=filters)
+
+    def _migrated_rows(self, batch: pa.RecordBatch, source_type: Optional[str]) -> List[Dict[str, Any]]:
+        rows = []
+        for row in batch.to_pylist():
+            payload = json.loads(row["payload"])
+            meta_data = payload.get("meta_data") or {}
+            meta_data["source_type"] = source_type or meta_data.get("source_type") or source_type_for(meta_data.get("filename"))
+            payload["meta_data"] = meta_data
+            rows.append({
+                self._id: row["id"],
+                self._vector_col: row["vector"],
+                "payload": json.dumps(payload),
+                "source_type": meta_data["source_type"],
+                "file_id": meta_data.get("file_id"),
+            })
+        return rows
+
+    def migrate(self, legacy_tables: Dict[str, Optional[str]]) -> int:
+        """
+        Moves the rows of the given tables into this one, with their
+        existing vectors (nothing is embedded again), then drops them.
+        Chunks already here are skipped, so an interrupted migration can
+        simply run again. Returns the number of rows added.
+        """
+        added = 0
+        for name, source_type in legacy_tables.items():
+            if name == self.table_name or name not in self.connection.table_names():
+                continue
+            try:
+                legacy = self.connection.open_table(name)
+                vector_type = legacy.schema.field("vector").type
+                if getattr(vector_type, "list_size", self.dimensions) != self.dimensions:
+                    logger.warning(f"Not migrating '{name}': its vectors do not have {self.dimensions} dimensions.")
+                    continue
+                before = self.table.count_rows()
+                for batch in legacy.search().select(["vector", "id", "payload"]).limit(None).to_batches(MIGRATION_BATCH_SIZE):
+                    rows = self._migrated_rows(batch, source_type)
+                    if rows:
+                        self.table.merge_insert(self._id).when_not_matched_insert_all().execute(rows)
+                moved = self.table.count_rows() - before
+                self.connection.drop_table(name)
+                added += moved
+                logger.info(f"Migrated {moved} new chunks from '{name}' into '{self.table_name}' and dropped it.")
+            except Exception as e:
+                logger.error(f"Could not migrate '{name}' into '{self.table_name}', will retry on next start: {e}")
+        return added
@@ -0,0 +1,94 @@
+import sys
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agno.embedder.ollama import OllamaEmbedder
+
+from app.services.embedding_cache import CachedEmbedder, EmbeddingCache
+from app.services.embedding_batcher import EmbeddingBatcher
+
+DIMENSIONS = 1024
+
+
+def make_stub_handler(request_latency: float, per_item_latency: float):
+    """A fake Ollama `/api/embed` endpoint with configurable latency."""
+
+    class StubEmbedHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            time.sleep(request_latency + per_item_latency * len(inputs))
+            payload = json.dumps({
+                "model": body["model"],
+                "embeddings": [[random.random() for _ in range(DIMENSIONS)] for _ in inputs],
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    return StubEmbedHandler
+
+
+def run_benchmark(num_chunks: int, batch_size: int, max_in_flight: int, request_latency: float, per_item_latency: float):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_stub_handler(request_latency, per_item_latency))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host = f"http://127.0.0.1:{server.server_port}"
+    texts = [f"chunk {i} " + "lorem ipsum " * 40 for i in range(num_chunks)]
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            # Before: one request per chunk, as LanceDb.insert does.
+            embedder = CachedEmbedder(
+                embedder=OllamaEmbedder(id="mxbai-embed-large", host=host, dimensions=DIMENSIONS),
+                cache=EmbeddingCache(os.path.join(tmp, "sequential.db"), 1 << 30),
+            )
+            started = time.perf_counter()
+            for text in texts:
+                embedder.get_embedding(text)
+            sequential = num_chunks / (time.perf_counter() - started)
+
+            # After: batched prefetch, then the per-chunk calls hit the cache.
+            embedder = CachedEmbedder(
+                embedder=OllamaEmbedder(id="mxbai-embed-large", host=host, dimensions=DIMENSIONS),
+                cache=EmbeddingCache(os.path.join(tmp, "batched.db"), 1 << 30),
+            )
+            batcher = EmbeddingBatcher(batch_size=batch_size, max_in_flight=max_in_flight, max_retries=0)
+            started = time.perf_counter()
+            batcher.prefetch(embedder, texts)
+            for text in texts:
+                embedder.get_embedding(text)
+            batched = num_chunks / (time.perf_counter() - started)
+    finally:
+        server.shutdown()
+
+    print(f"Chunks:              {num_chunks}")
+    print(f"Per-chunk requests:  {sequential:8.1f} chunks/s")
+    print(f"Batched ({batch_size} x {max_in_flight}):   {batched:8.1f} chunks/s")
+    print(f"Speed-up:            {batched / sequential:8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ingestion embedding throughput against a stub Ollama server.")
+    parser.add_argument("--chunks", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--max-in-flight", type=int, default=2)
+    parser.add_argument("--request-latency", type=float, default=0.01, help="Seconds of overhead per HTTP request")
+    parser.add_argument("--per-item-latency", type=float, default=0.001, help="Seconds of work per embedded text")
+    args = parser.parse_args()
+    run_benchmark(args.chunks, args.batch_size, args.max_in_flight, args.request_latency, args.per_item_latency)
@@ -0,0 +1,130 @@
+import sys
+import os
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ollama import Client as OllamaClient
+
+from app.services.ollama_pool import OllamaPool
+
+DIMENSIONS = 1024
+
+
+def make_stub_handler(latency: float, parallel: int, seen: dict):
+    """
+    A fake Ollama server (`/api/chat`, `/api/embed`, `/api/version`) that,
+    like OLLAMA_NUM_PARALLEL, serves `parallel` requests at a time.
+    """
+    slots = threading.Semaphore(parallel)
+
+    class StubOllamaHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _reply(self, payload: dict):
+            body = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self._reply({"version": "0.0.0-stub"})
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            seen["keep_alive"] = body.get("keep_alive")
+            seen["connections"].add(self.client_address)
+            with slots:
+                time.sleep(latency)
+            if self.path == "/api/embed":
+                inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+                self._reply({"model": body["model"], "embeddings": [[0.0] * DIMENSIONS for _ in inputs]})
+            else:
+                self._reply({
+                    "model": body["model"],
+                    "created_at": "2024-01-01T00:00:00Z",
+                    "message": {"role": "assistant", "content": "Markets were up."},
+                    "done": True,
+                    "prompt_eval_count": 12,
+                    "eval_count": 4,
+                })
+
+        def log_message(self, *args):
+            pass
+
+    return StubOllamaHandler
+
+
+def start_stub(latency: float, parallel: int):
+    seen = {"keep_alive": None, "connections": set()}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_stub_handler(latency, parallel, seen))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, seen
+
+
+def run_load(client: OllamaClient, requests: int, concurrency: int) -> tuple:
+    def one(i: int) -> bool:
+        try:
+            if i % 2:
+                client.embed(model="mxbai-embed-large", input="How did the market do today?")
+            else:
+                client.chat(model="mistral", messages=[{"role": "user", "content": "How did the market do today?"}])
+            return True
+        except Exception:
+            return False
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        ok = sum(executor.map(one, range(requests)))
+    return ok, time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Ollama host pool against fake Ollama servers.")
+    parser.add_argument("--requests", type=int, default=200, help="Chat and embedding requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent callers (agent runs, ingestion batches)")
+    parser.add_argument("--latency", type=float, default=0.1, help="Seconds each fake host takes per request")
+    parser.add_argument("--parallel", type=int, default=4, help="Requests each fake host serves at once")
+    parser.add_argument("--slow-factor", type=float, default=4.0, help="How much slower the last host is")
+    args = parser.parse_args()
+
+    latencies = [args.latency, args.latency, args.latency * args.slow_factor]
+    stubs = [start_stub(latency, args.parallel) for latency in latencies]
+    urls = [f"http://127.0.0.1:{server.server_address[1]}" for server, _ in stubs]
+    print(f"{args.requests} requests, {args.concurrency} concurrent; host latency {args.latency * 1000:.0f} ms "
+          f"({args.parallel} at a time), last host x{args.slow_factor:g}")
+
+    # What the agent did before: a fresh client per model, one host
+    ok, elapsed = run_load(OllamaClient(host=urls[0]), args.requests, args.concurrency)
+    print(f"{'single host':24} {ok / elapsed:8.1f} req/s  errors {args.requests - ok}")
+
+    for _, seen in stubs:
+        seen["connections"].clear()
+    pool = OllamaPool(urls, keep_alive="30m", health_check_seconds=0.5)
+    pool.start()
+    ok, elapsed = run_load(pool.client(), args.requests, args.concurrency)
+    per_host = ", ".join(f"{host['requests']}" for host in pool.stats()["hosts"])
+    print(f"{'pool, 3 hosts':24} {ok / elapsed:8.1f} req/s  errors {args.requests - ok}  requests per host [{per_host}]")
+    print(f"{'':24} keep_alive seen by hosts: {[seen['keep_alive'] for _, seen in stubs]}, "
+          f"connections opened: {[len(seen['connections']) for _, seen in stubs]}")
+    pool.stop()
+
+    # A host that is down: requests fail over to the others without errors
+    dead = ThreadingHTTPServer(("127.0.0.1", 0), BaseHTTPRequestHandler)
+    dead_url = f"http://127.0.0.1:{dead.server_address[1]}"
+    dead.server_close()
+    pool = OllamaPool([dead_url] + urls[1:], keep_alive="30m", health_check_seconds=0.5)
+    pool.start()
+    ok, elapsed = run_load(pool.client(), args.requests, args.concurrency)
+    stats = pool.stats()
+    print(f"{'pool, one host down':24} {ok / elapsed:8.1f} req/s  errors {args.requests - ok}  "
+          f"failovers {stats['failovers']}  requests per host {[host['requests'] for host in stats['hosts']]}")
+    pool.stop()
@@ -0,0 +1,109 @@
+import sys
+import os
+import logging
+import time
+import random
+import argparse
+import tempfile
+from typing import List
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+from agno.document import Document
+from agno.embedder.base import Embedder
+from agno.vectordb.lancedb import SearchType
+
+from app.services.retrieval import CachedLanceDb
+
+WORDS = ("market inflation bond yield equity dividend portfolio risk hedge index fund rate credit "
+         "liquidity volatility earnings revenue margin growth tax pension retirement budget").split()
+
+
+class FakeEmbedder(Embedder):
+    """
+    Bag-of-words vectors (texts sharing words are close, as with a real
+    model), taking `latency` seconds per call like a local Ollama.
+    """
+
+    latency: float = 0.0
+
+    def _word(self, word: str) -> np.ndarray:
+        return np.random.default_rng(sum(map(ord, word)) * 7919 + len(word)).standard_normal(self.dimensions)
+
+    def get_embedding(self, text: str) -> List[float]:
+        time.sleep(self.latency)
+        vector = sum(self._word(word) for word in text.split())
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def get_embedding_and_usage(self, text: str):
+        return self.get_embedding(text), None
+
+
+def load(vector_db: CachedLanceDb, rows: int) -> None:
+    rng = random.Random(0)
+    for start in range(0, rows, 1000):
+        vector_db.insert([
+            Document(name=f"chunk-{i}", content=" ".join(rng.choices(WORDS, k=40)) + f" #{i}")
+            for i in range(start, min(rows, start + 1000))
+        ])
+
+
+def run(vector_db: CachedLanceDb, queries: List[str], k: int) -> tuple:
+    started = time.perf_counter()
+    results = [[document.name for document in vector_db.search(query, limit=k)] for query in queries]
+    return (time.perf_counter() - started) / len(queries), results
+
+
+def recall(results: List[List[str]], exact: List[List[str]]) -> float:
+    return float(np.mean([len(set(r) & set(e)) / max(1, len(e)) for r, e in zip(results, exact)]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark knowledge search with and without the vector index and result cache.")
+    parser.add_argument("--rows", type=int, default=20000, help="Chunks in the table")
+    parser.add_argument("--dimensions", type=int, default=1024, help="Embedding size")
+    parser.add_argument("--queries", type=int, default=50, help="Distinct questions")
+    parser.add_argument("--repeat", type=int, default=3, help="Times each question is asked")
+    parser.add_argument("--k", type=int, default=5, help="Chunks per search")
+    parser.add_argument("--embed-latency", type=float, default=0.03, help="Seconds per query embedding")
+    parser.add_argument("--index-type", default="IVF_PQ", help="IVF_PQ, IVF_HNSW_SQ or IVF_FLAT")
+    parser.add_argument("--search-type", default="vector", choices=["vector", "hybrid"], help="Search type to measure")
+    args = parser.parse_args()
+    logging.getLogger("agno").setLevel(logging.WARNING)
+
+    embedder = FakeEmbedder(dimensions=args.dimensions)
+    rng = random.Random(1)
+    queries = [" ".join(rng.choices(WORDS, k=8)) for _ in range(args.queries)]
+    search_type = SearchType.vector if args.search_type == "vector" else SearchType.hybrid
+
+    with tempfile.TemporaryDirectory() as tmp:
+        def table(**kwargs) -> CachedLanceDb:
+            return CachedLanceDb(uri=tmp, table_name="chunks", search_type=search_type, embedder=embedder,
+                                 index_type=args.index_type, index_min_rows=1, **kwargs)
+
+        started = time.perf_counter()
+        load(table(cache_max_entries=0), args.rows)
+        print(f"Loaded {args.rows} chunks of {args.dimensions} dimensions in {time.perf_counter() - started:.1f}s; "
+              f"{args.queries} questions x{args.repeat}, k={args.k}, {args.search_type} search, "
+              f"embedding {args.embed_latency * 1000:.0f} ms")
+        embedder.latency = args.embed_latency
+
+        seconds, exact = run(table(cache_max_entries=0), queries, args.k)
+        print(f"{'scan every row':28} {seconds * 1000:8.1f} ms/search  recall 1.000")
+
+        started = time.perf_counter()
+        indexed = table(cache_max_entries=0)
+        indexed.maintain_index()
+        print(f"{'':28} {args.index_type} index built in {time.perf_counter() - started:.1f}s")
+        for nprobes in (5, 20, 50):
+            seconds, results = run(table(cache_max_entries=0, nprobes=nprobes), queries, args.k)
+            print(f"{f'index, nprobes={nprobes}':28} {seconds * 1000:8.1f} ms/search  recall {recall(results, exact):.3f}")
+        seconds, results = run(table(cache_max_entries=0, nprobes=20, refine_factor=5), queries, args.k)
+        print(f"{'index, nprobes=20, refine=5':28} {seconds * 1000:8.1f} ms/search  recall {recall(results, exact):.3f}")
+
+        cached = table(cache_max_entries=1024, nprobes=20)
+        seconds, _ = run(cached, queries * args.repeat, args.k)
+        stats = cached.stats()
+        print(f"{'index + result cache':28} {seconds * 1000:8.1f} ms/search  hit ratio {stats['hit_ratio']:.2f}")
@@ -0,0 +1,41 @@
+import sys
+import os
+import argparse
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.core.config import settings
+from app.services.vector_maintenance import VectorMaintenance
+
+
+def print_report(report: dict) -> None:
+    for name, table in report["tables"].items():
+        if "error" in table:
+            print(f"{name:24} error: {table['error']}")
+            continue
+        indexes = ", ".join(f"{index['name']} ({index['type']}, {index['parts']} parts)" for index in table["indexes"]) or "none"
+        print(f"{name:24} {table['rows']:>9} rows  {table['fragments']:>5} fragments  {table['versions']:>5} versions  "
+              f"{(table['disk_bytes'] or 0) / 1024 / 1024:>9.1f} MiB  indexes: {indexes}")
+    print(f"{'total':24} {report['disk_bytes'] / 1024 / 1024:>60.1f} MiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact the LanceDB tables, prune old versions and rebuild split indexes.")
+    parser.add_argument("--uri", default=settings.LANCEDB_URI, help="LanceDB directory")
+    parser.add_argument("--keep-versions-hours", type=float, default=settings.VECTOR_MAINTENANCE_KEEP_VERSIONS_HOURS,
+                        help="Table versions newer than this are kept")
+    parser.add_argument("--no-rebuild", action="store_true", help="Only update indexes incrementally")
+    parser.add_argument("--report", action="store_true", help="Only print the tables' size, without maintaining them")
+    args = parser.parse_args()
+
+    maintenance = VectorMaintenance(
+        uri=args.uri,
+        keep_versions_seconds=args.keep_versions_hours * 3600,
+        rebuild_indexes=not args.no_rebuild,
+    )
+    print_report(maintenance.report())
+    if not args.report:
+        result = maintenance.run()
+        print(f"\nMaintained {len(result['tables'])} tables in {result['seconds']:.1f}s\n")
+        print_report(maintenance.report())
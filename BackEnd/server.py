@@ -1,22 +1,26 @@
 import os
 import sys
+import time
 import asyncio
 import logging
-from fastapi import FastAPI, HTTPException, Depends, status, Form, UploadFile, File
+from fastapi import FastAPI, HTTPException, Depends, Request, status, Form, UploadFile, File
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple
 from jose import jwt, JWTError
 import bcrypt
 import logging.config
 from datetime import datetime, timedelta
 from contextlib import asynccontextmanager
+from functools import lru_cache
 import shutil
 from pathlib import Path
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func
-import importlib.util
+from sqlalchemy import func, or_, and_, select, update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -26,21 +30,53 @@ load_dotenv()
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # --- Model Imports ---
-from app.models.user import User as UserModel
+from app.models.user import User as UserModel, UserSession as UserSessionModel
 from app.models.chat import UserQuestion
 from app.models.system import SystemConfig as SystemConfigModel
-from app.models.knowledge import KnowledgeFile as KnowledgeFileModel, IngestionStatus
-from app.core.database import Base, engine, SessionLocal
+from app.models.knowledge import KnowledgeFile as KnowledgeFileModel, KnowledgeChunk, IngestionJob as IngestionJobModel, IngestionStatus, UploadSession as UploadSessionModel
+from app.core.config import settings
+from app.core.default_agents import SPECIALIST_AGENTS
+from app.core.database import Base, engine, SessionLocal, AsyncSessionLocal, async_engine, add_missing_columns, get_async_db
+from app.services.agent_service import AgentRegistry
+from app.services.agent_runner import AgentRunner, AgentQueueFullError, AgentRunTimeoutError
+from app.services.agent_team import Specialist, get_agent_team_if_built
+from app.services.pre_router import PreRouter, Route
+from app.services import knowledge_service
+from app.services.embedding_cache import CachedEmbedder, get_embedding_cache
+from app.services.ollama_pool import get_ollama_pool
+from app.services.retrieval import CachedLanceDb
+from app.services.vector_maintenance import VectorMaintenance
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.ingestion_queue import IngestionQueue
+from app.services.document_parser import DocumentParser
+from app.services.answer_cache import AnswerCache, CachedAnswer, SharedAnswers
+from app.services.single_flight import Flight, SingleFlight
+from app.services.principal_cache import Principal, get_principal_cache
+from app.services.password_hasher import PasswordHasher, PasswordHasherBusyError
+from app.services.login_throttle import LoginThrottle
+from app.services.client_ip import TrustedProxies
+from app.services.shared_state import SharedState
+from app.services.session_store import SessionStore
+from app.services.runtime_config import InvalidConfigValueError, RuntimeConfig, SystemConfigStore
+from app.services.chat_history import ChatHistoryWriter, backfill_user_stats, decode_cursor, encode_cursor
+from app.services import upload_service
+from app.services.upload_service import ResumableUploads, StoredUpload, UploadFormatError, UploadTooLargeError
 
 # --- Agno Imports ---
 from agno.models.ollama import Ollama
 from agno.agent import Agent
+from agno.run.response import RunEvent
 
 # --- Pydantic Schema Imports ---
-from app.schemas.user import UserCreate, User, UserLogin, UserUpdateAdmin
+from app.schemas.user import UserCreate, User, UserLogin, UserUpdateAdmin, UserAdminDetailResponse, UserPage
 from app.schemas.system import SystemConfigUpdate, SystemConfigResponse
-from app.schemas.chat import ChatRequest
-from app.schemas.knowledge import KnowledgeFile as KnowledgeFileSchema
+from app.schemas.chat import ChatRequest, ChatStreamRequest, ChatStreamChunk, ChatHistoryItem, ChatHistoryPage
+from app.schemas.knowledge import (
+    KnowledgeFile as KnowledgeFileSchema,
+    IngestionJob as IngestionJobSchema,
+    UploadSession as UploadSessionSchema,
+    UploadSessionCreate,
+)
 
 # --- Logging Setup ---
 logger = logging.getLogger(__name__)
@@ -51,6 +87,134 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 AGENT_DIR = Path("app/agents")
+UPLOAD_DIR = Path("tmp/uploads")
+UPLOAD_PARTIAL_DIR = UPLOAD_DIR / ".partial"
+# Added to the chunk timeout, so a lease never expires while its chunk may still be written
+UPLOAD_LEASE_MARGIN_SECONDS = 60
+# The agent whose knowledge base uploads are ingested into
+FINANCIAL_AGENT_NAME = "financial_advisor"
+# The agent answering questions
+CHAT_AGENT_NAME = settings.CHAT_AGENT
+# Recorded as the agent for messages the pre-router answered itself
+PRE_ROUTER_NAME = "pre-router"
+
+agent_registry = AgentRegistry(AGENT_DIR, retry_seconds=settings.AGENT_LOAD_RETRY_SECONDS)
+agent_runner = AgentRunner(
+    max_concurrency=settings.AGENT_MAX_CONCURRENCY,
+    max_queue=settings.AGENT_MAX_QUEUE,
+    timeout_seconds=settings.AGENT_RUN_TIMEOUT_SECONDS,
+)
+embedding_batcher = EmbeddingBatcher(
+    batch_size=settings.EMBEDDING_BATCH_SIZE,
+    max_in_flight=settings.EMBEDDING_MAX_IN_FLIGHT,
+    max_retries=settings.EMBEDDING_MAX_RETRIES,
+)
+
+document_parser = DocumentParser(
+    max_workers=settings.PARSER_WORKERS,
+    pages_per_task=settings.PARSER_PAGES_PER_TASK,
+    max_pending=settings.PARSER_MAX_PENDING,
+)
+
+shared_state = SharedState(
+    url=settings.REDIS_URL or (f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/{settings.REDIS_DB}" if settings.REDIS_HOST else None),
+    prefix=settings.REDIS_KEY_PREFIX,
+    max_connections=settings.REDIS_MAX_CONNECTIONS,
+    retry_seconds=settings.REDIS_RETRY_SECONDS,
+)
+sessions = SessionStore(shared_state, ttl_seconds=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+principal_cache = get_principal_cache()
+# Users changed on any worker are dropped from every worker's principal cache.
+shared_state.subscribe("principals", lambda user_id: principal_cache.invalidate(user_id=int(user_id)))
+chat_history = ChatHistoryWriter(
+    session_factory=SessionLocal,
+    batch_size=settings.CHAT_HISTORY_BATCH_SIZE,
+    flush_seconds=settings.CHAT_HISTORY_FLUSH_SECONDS,
+    max_buffer=settings.CHAT_HISTORY_MAX_BUFFER,
+)
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+    rounds=settings.BCRYPT_ROUNDS,
+)
+login_throttle = LoginThrottle(
+    state=shared_state,
+    max_attempts_per_ip=settings.LOGIN_MAX_ATTEMPTS_PER_IP,
+    ip_window_seconds=settings.LOGIN_IP_WINDOW_SECONDS,
+    max_failures_per_user=settings.LOGIN_MAX_FAILURES_PER_USER,
+    failure_window_seconds=settings.LOGIN_FAILURE_WINDOW_SECONDS,
+)
+trusted_proxies = TrustedProxies(settings.TRUSTED_PROXIES)
+
+answer_cache = AnswerCache(
+    ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+    similarity_threshold=settings.ANSWER_CACHE_SIMILARITY_THRESHOLD or None,
+)
+shared_answers = SharedAnswers(shared_state, answer_cache)
+answer_flights = SingleFlight()
+
+@lru_cache(maxsize=1)
+def _routing_embedder() -> CachedEmbedder:
+    """The knowledge base's embedding model, sharing its embedding cache."""
+    return CachedEmbedder(
+        embedder=get_ollama_pool().embedder(id=settings.EMBEDDING_MODEL, dimensions=settings.EMBEDDING_DIMENSIONS),
+        cache=get_embedding_cache(settings.EMBEDDING_CACHE_PATH, settings.EMBEDDING_CACHE_MAX_BYTES),
+    )
+
+# Routing to specialists only applies when the team answers questions
+pre_router = PreRouter(
+    specialists=SPECIALIST_AGENTS if CHAT_AGENT_NAME == "team" else [],
+    embed=lambda text: _routing_embedder().get_embedding(text),
+    min_similarity=settings.PRE_ROUTER_MIN_SIMILARITY,
+    min_margin=settings.PRE_ROUTER_MIN_MARGIN,
+)
+
+system_config = SystemConfigStore(session_factory=AsyncSessionLocal, poll_seconds=settings.SYSTEM_CONFIG_POLL_SECONDS)
+
+def _apply_runtime_config(config: RuntimeConfig) -> None:
+    """Pushes admin-editable settings into the running components."""
+    answer_cache.ttl_seconds = config.answer_cache_ttl_seconds
+    principal_cache.ttl_seconds = config.auth_cache_ttl_seconds
+    agent_runner.max_queue = config.agent_max_queue
+    agent_runner.timeout_seconds = config.agent_run_timeout_seconds
+    login_throttle.max_attempts_per_ip = config.login_max_attempts_per_ip
+    login_throttle.max_failures_per_user = config.login_max_failures_per_user
+
+system_config.on_change(_apply_runtime_config)
+
+resumable_uploads = ResumableUploads(
+    partial_dir=UPLOAD_PARTIAL_DIR,
+    max_bytes=settings.UPLOAD_MAX_BYTES,
+    max_chunk_bytes=settings.UPLOAD_CHUNK_MAX_BYTES,
+    ttl_seconds=settings.UPLOAD_SESSION_TTL_HOURS * 3600,
+)
+
+def _get_knowledge():
+    agent = agent_registry.get(FINANCIAL_AGENT_NAME)
+    return agent.knowledge if agent else None
+
+vector_maintenance = VectorMaintenance(
+    uri=settings.LANCEDB_URI,
+    keep_versions_seconds=settings.VECTOR_MAINTENANCE_KEEP_VERSIONS_HOURS * 3600,
+    rebuild_indexes=settings.VECTOR_MAINTENANCE_REBUILD_INDEXES,
+    interval_seconds=settings.VECTOR_MAINTENANCE_INTERVAL_HOURS * 3600,
+    state=shared_state,
+)
+
+ingestion_queue = IngestionQueue(
+    session_factory=SessionLocal,
+    get_knowledge=_get_knowledge,
+    batcher=embedding_batcher,
+    parser=document_parser,
+    upload_dir=UPLOAD_DIR,
+    workers=settings.INGESTION_WORKERS,
+    poll_seconds=settings.INGESTION_POLL_SECONDS,
+    lease_seconds=settings.INGESTION_LEASE_SECONDS,
+    max_attempts=settings.INGESTION_MAX_ATTEMPTS,
+    on_change=lambda: shared_state.run_threadsafe(shared_answers.invalidate()),
+)
 
 # --- App Initialization ---
 app = FastAPI(title="Genie AI Platform", version="2.0.0")
@@ -63,112 +227,408 @@ app.add_middleware(
 )
 
 # --- Dependencies & Security ---
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 security = HTTPBearer()
 
 def create_access_token(data: dict):
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    return jwt.encode({**data, "exp": expire}, SECRET_KEY, algorithm=ALGORITHM)
+    return jwt.encode({**data, "exp": expire, "iat": time.time()}, SECRET_KEY, algorithm=ALGORITHM)
 
-def get_current_user(token: HTTPAuthorizationCredentials = Depends(security), session: Session = Depends(get_db)):
+def _decode_token(token: HTTPAuthorizationCredentials) -> dict:
     try:
-        payload = jwt.decode(token.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        user = session.query(UserModel).filter(UserModel.username == payload.get("sub")).first()
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
-        return user
+        return jwt.decode(token.credentials, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
         raise HTTPException(status_code=401, detail="Could not validate credentials")
 
-def get_admin_user(user: UserModel = Depends(get_current_user)):
+async def get_current_user(token: HTTPAuthorizationCredentials = Depends(security)) -> Principal:
+    """
+    Authenticates the bearer token. The user is served from the principal
+    cache, so a DB session is only opened on a cache miss; disabled users
+    are refused and the token's session is checked against the shared
+    session store.
+    """
+    payload = _decode_token(token)
+    user = await principal_cache.load_async(payload.get("sub") or "", AsyncSessionLocal)
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found")
+    # Without Redis, revoking a disabled user's sessions only reaches one worker; the
+    # other workers refuse them once their cached principal expires (AUTH_CACHE_TTL_SECONDS)
+    if not user.is_active:
+        raise HTTPException(status_code=401, detail="This account has been disabled.")
+    if payload.get("sid") and await sessions.is_revoked(payload["sid"], user.id, payload.get("iat", 0)):
+        raise HTTPException(status_code=401, detail="Session has ended. Please log in again.")
+    return user
+
+async def get_admin_user(user: Principal = Depends(get_current_user)):
     if not user.is_admin:
         raise HTTPException(status_code=403, detail="Admin access required")
     return user
 
 # --- Core API Logic ---
-def get_financial_agent(db: Session = Depends(get_db)) -> Optional[Agent]:
+def get_financial_agent() -> Optional[Agent]:
     """
-    Loads the single Financial Advisor agent.
+    Returns the warm chat agent (the Financial Advisor unless CHAT_AGENT says
+    otherwise) from the process-wide registry. Runs go through
+    `agent_registry.run`/`stream`, each on an instance of its own.
     """
-    logger.info("Loading Financial Advisor agent.")
-    agent_file = AGENT_DIR / "financial_advisor.py"
-    
-    if not agent_file.exists():
-        logger.error("Financial advisor agent file not found.")
-        return None
+    return agent_registry.get(CHAT_AGENT_NAME)
 
-    try:
-        module_name = agent_file.stem
-        spec = importlib.util.spec_from_file_location(module_name, agent_file)
-        agent_module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(agent_module)
-
-        if hasattr(agent_module, "get_agent"):
-            agent = agent_module.get_agent()
-            logger.info(f"Loaded agent '{agent.name}'.")
-            return agent
-    except Exception as e:
-        logger.error(f"Failed to load agent from {agent_file.name}: {e}", exc_info=True)
-    
-    return None
+def _agent_session(user: Principal) -> dict:
+    """Each user's runs share one agent session, so history and memories stay with their owner."""
+    return {"user_id": str(user.id), "session_id": f"user-{user.id}"}
 
 # --- API Endpoints ---
+def _client_ip(request: Request) -> str:
+    return trusted_proxies.client_ip(request)
+
+def _throttled(retry_after: int) -> HTTPException:
+    return HTTPException(status_code=429, detail="Too many attempts. Please try again later.", headers={"Retry-After": str(retry_after)})
+
+def _hasher_busy() -> HTTPException:
+    return HTTPException(status_code=503, detail="The server is busy. Please try again shortly.", headers={"Retry-After": "1"})
+
 @app.post("/api/auth/login")
-def login(username: str = Form(...), password: str = Form(...), session: Session = Depends(get_db)):
+async def login(request: Request, username: str = Form(...), password: str = Form(...), session: AsyncSession = Depends(get_async_db)):
     logger.info(f"Login attempt for user: {username}")
-    user = session.query(UserModel).filter(UserModel.username == username).first()
-    if user and bcrypt.checkpw(password.encode('utf-8'), user.hashed_password.encode('utf-8')):
-        return {
-            "access_token": create_access_token({"sub": user.username, "email": user.email, "is_admin": user.is_admin, "id": user.id}),
-            "token_type": "bearer"
-        }
-    raise HTTPException(status_code=401, detail="Invalid credentials")
+    retry_after = await login_throttle.check(_client_ip(request), username)
+    if retry_after:
+        logger.warning(f"Throttled login attempt for user: {username}")
+        raise _throttled(retry_after)
+
+    user = await session.scalar(select(UserModel).where(UserModel.username == username))
+    try:
+        valid = user is not None and await password_hasher.verify(password, user.hashed_password)
+        if valid and password_hasher.needs_rehash(user.hashed_password):
+            # The configured bcrypt cost changed: upgrade the hash while we have the password.
+            user.hashed_password = await password_hasher.hash(password)
+            await session.commit()
+            password_hasher.record_rehash()
+    except PasswordHasherBusyError:
+        raise _hasher_busy()
+    if not valid:
+        await login_throttle.record_failure(username)
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    if not user.is_active:
+        raise HTTPException(status_code=403, detail="This account has been disabled.")
+
+    await login_throttle.record_success(username)
+    # The user is about to make authenticated requests: refresh their principal.
+    await shared_state.publish("principals", str(user.id))
+    session_id = await sessions.create(user.id, _client_ip(request))
+    return {
+        "access_token": create_access_token({"sub": user.username, "email": user.email, "is_admin": user.is_admin, "id": user.id, "sid": session_id}),
+        "token_type": "bearer"
+    }
+
+@app.post("/api/auth/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(token: HTTPAuthorizationCredentials = Depends(security), user: Principal = Depends(get_current_user)):
+    """
+    Ends the session of the presented token on every worker.
+    """
+    session_id = _decode_token(token).get("sid")
+    if session_id:
+        await sessions.revoke(session_id, user.id)
+
+@app.get("/api/users/me/sessions", response_model=List[dict])
+async def get_my_sessions(user: Principal = Depends(get_current_user)):
+    """
+    Lists the user's active login sessions, newest first.
+    """
+    return await sessions.list(user.id)
 
 @app.get("/api/users/me", response_model=User)
-def get_me(user: UserModel = Depends(get_current_user)):
+async def get_me(user: Principal = Depends(get_current_user)):
     return user
 
+def _question_embedder(agent: Agent):
+    """The knowledge base's (cached) embedder, used to match similar questions."""
+    embedder = getattr(getattr(agent.knowledge, "vector_db", None), "embedder", None)
+    return embedder.get_embedding if embedder is not None else None
+
+def _answer_scope(user: Principal) -> str:
+    """Answers draw on the asker's history and memories, so they are cached and shared per user."""
+    return _agent_session(user)["session_id"]
+
+async def _lookup_answer(agent: Agent, request: ChatRequest, scope: str) -> Tuple[Optional[CachedAnswer], Optional[object], Optional[int]]:
+    """
+    Looks the question up in the answer cache for `scope`. Returns the cached answer (if
+    any), the question's vector and the cache version to store a fresh answer
+    under, or None as version when the answer must not be cached.
+    """
+    if not system_config.snapshot.answer_cache_enabled:
+        return None, None, None
+    if not request.use_cache:
+        answer_cache.record_bypass()
+        return None, None, None
+    version = answer_cache.version
+    loop = asyncio.get_running_loop()
+    cached, vector = await loop.run_in_executor(None, answer_cache.lookup, request.message, _question_embedder(agent), scope)
+    if cached is None:
+        # Maybe another worker answered it already.
+        cached = await shared_answers.get(request.message, scope)
+        if cached is not None:
+            answer_cache.store(request.message, cached.answer, cached.generation_seconds, version, vector, scope)
+    return cached, vector, version
+
+async def _store_answer(question: str, answer: str, started: float, version: int, vector: Optional[object], scope: str) -> None:
+    generation_seconds = time.perf_counter() - started
+    answer_cache.store(question, answer, generation_seconds, version, vector, scope)
+    await shared_answers.put(question, answer, generation_seconds, version, scope)
+
+def _join_flight(request: ChatRequest, scope: str, generate) -> Tuple[Flight, bool]:
+    """
+    Shares the generation with concurrent requests for the same question,
+    scope (the generation runs in the asker's agent session) and knowledge
+    base version. Returns the flight and whether this request leads it.
+    """
+    if not settings.AGENT_COALESCE_REQUESTS or not request.use_cache:
+        return answer_flights.join(None, generate)
+    return answer_flights.join(f"{answer_cache.version}:{AnswerCache.key(request.message, scope)}", generate)
+
+async def _route(request: ChatRequest) -> Tuple[Optional[Route], Optional[Specialist]]:
+    """
+    Runs the pre-router. Returns its decision (None when it is disabled) and
+    the specialist to ask directly, if it picked one.
+    """
+    if not settings.PRE_ROUTER_ENABLED:
+        return None, None
+    loop = asyncio.get_running_loop()
+    route = await loop.run_in_executor(None, pre_router.route, request.message)
+    team = get_agent_team_if_built()
+    specialist = team.specialists.get(route.target) if team is not None and route.target else None
+    return route, specialist
+
+def _record_question(user: Principal, question: str, answer: Optional[str], agent_name: Optional[str], started: float, success: bool) -> None:
+    chat_history.record(
+        user_id=user.id,
+        question=question,
+        answer=answer,
+        agent_used=agent_name,
+        latency_ms=int((time.perf_counter() - started) * 1000),
+        success=success,
+    )
+
 @app.post("/api/ask", response_model=dict)
 async def ask_question(
     request: ChatRequest, 
     financial_agent: Optional[Agent] = Depends(get_financial_agent), 
-    current_user: UserModel = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
+    started = time.perf_counter()
+    answer = None
+    agent_name = financial_agent.name if financial_agent else None
     try:
+        route, specialist = await _route(request)
+        if route is not None and route.reply is not None:
+            agent_name = PRE_ROUTER_NAME
+            answer = route.reply
+            return {"response": answer, "cached": False}
+
         if not financial_agent:
-            raise HTTPException(status_code=503, detail="The Financial Advisor agent is not available. Please check the server configuration.")
+            raise HTTPException(status_code=503, detail="The chat agent is not available. Please check the server configuration.")
 
-        # Directly run the financial agent
-        response_obj = financial_agent.run(request.message)
-        logger.info(f"Agent '{financial_agent.name}' responded to the user.")
-        
-        if hasattr(response_obj, 'content'):
-            response = response_obj.content
-        else:
-            response = str(response_obj)
+        cached, vector, version = await _lookup_answer(financial_agent, request, _answer_scope(current_user))
+        if cached is not None:
+            logger.info("Answered the user from the answer cache.")
+            answer = cached.answer
+            return {"response": answer, "cached": True}
+
+        # A specialist picked by the pre-router answers without the Manager
+        if specialist is not None:
+            agent_name = specialist.name
+        def run(message: str):
+            if specialist is not None:
+                return specialist.run(message)
+            return agent_registry.run(CHAT_AGENT_NAME, message, **_agent_session(current_user))
+
+        async def generate(flight: Flight) -> str:
+            # Run the agent on the dedicated worker pool so the event loop stays free
+            response_obj = await agent_runner.run(run, request.message)
+            logger.info(f"Agent '{agent_name}' responded to the user.")
+
+            if hasattr(response_obj, 'content'):
+                response = response_obj.content
+            else:
+                response = str(response_obj)
 
-        return {"response": response}
+            if version is not None and isinstance(response, str):
+                await _store_answer(request.message, response, started, version, vector, _answer_scope(current_user))
+            return response
+
+        flight, leader = _join_flight(request, _answer_scope(current_user), generate)
+        try:
+            response = await flight.wait()
+        finally:
+            flight.leave()
+        answer = response
+        return {"response": response, "cached": False, "coalesced": not leader}
+    except HTTPException:
+        raise
+    except AgentQueueFullError as e:
+        logger.warning(f"Rejected question: {e}")
+        raise HTTPException(status_code=503, detail="The agent is busy. Please try again shortly.", headers={"Retry-After": "5"})
+    except AgentRunTimeoutError as e:
+        logger.warning(f"Question timed out: {e}")
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Error processing question: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to get a response from the agent: {e}")
+    finally:
+        _record_question(current_user, request.message, answer, agent_name, started, success=answer is not None)
+
+def _sse(chunk: ChatStreamChunk) -> str:
+    return f"event: {chunk.event}\ndata: {chunk.model_dump_json(exclude_none=True)}\n\n"
+
+async def _whole_answer_stream(answer: str, cached: bool):
+    """An answer that is already complete, sent as a single delta."""
+    yield _sse(ChatStreamChunk(event="delta", content=answer))
+    yield _sse(ChatStreamChunk(event="done", response=answer, timestamp=datetime.utcnow().isoformat(), cached=cached))
+
+def _sse_response(stream) -> StreamingResponse:
+    return StreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/api/ask/stream")
+async def ask_question_stream(
+    request: ChatStreamRequest,
+    http_request: Request,
+    financial_agent: Optional[Agent] = Depends(get_financial_agent),
+    current_user: Principal = Depends(get_current_user)
+):
+    """
+    Streams the agent's answer as Server-Sent Events. Generation is stopped as
+    soon as the client disconnects.
+    """
+    started = time.perf_counter()
+    route, specialist = await _route(request)
+    if route is not None and route.reply is not None:
+        _record_question(current_user, request.message, route.reply, PRE_ROUTER_NAME, started, success=True)
+        return _sse_response(_whole_answer_stream(route.reply, cached=False))
+
+    if not financial_agent:
+        _record_question(current_user, request.message, None, None, started, success=False)
+        raise HTTPException(status_code=503, detail="The chat agent is not available. Please check the server configuration.")
+
+    cached, vector, version = await _lookup_answer(financial_agent, request, _answer_scope(current_user))
+    if cached is not None:
+        logger.info("Streamed an answer to the user from the answer cache.")
+        _record_question(current_user, request.message, cached.answer, financial_agent.name, started, success=True)
+        return _sse_response(_whole_answer_stream(cached.answer, cached=True))
+
+    # A specialist picked by the pre-router answers without the Manager
+    agent_name = specialist.name if specialist is not None else financial_agent.name
+
+    def run_stream(message: str):
+        if specialist is not None:
+            return specialist.stream(message)
+        return agent_registry.stream(CHAT_AGENT_NAME, message, **_agent_session(current_user))
+
+    async def generate(flight: Flight) -> str:
+        events = await agent_runner.stream(run_stream, request.message)
+        flight.mark_started()
+        try:
+            async for event in events:
+                content = getattr(event, "content", None)
+                if getattr(event, "event", None) == RunEvent.run_response_content.value and isinstance(content, str) and content:
+                    await flight.publish(content)
+        finally:
+            await events.aclose()
+        logger.info(f"Agent '{agent_name}' streamed a response.")
+        response = "".join(flight.parts)
+        if version is not None:
+            await _store_answer(request.message, response, started, version, vector, _answer_scope(current_user))
+        return response
+
+    flight, leader = _join_flight(request, _answer_scope(current_user), generate)
+    try:
+        await flight.started()
+    except AgentQueueFullError as e:
+        flight.leave()
+        logger.warning(f"Rejected streaming question: {e}")
+        _record_question(current_user, request.message, None, agent_name, started, success=False)
+        raise HTTPException(status_code=503, detail="The agent is busy. Please try again shortly.", headers={"Retry-After": "5"})
+    except AgentRunTimeoutError as e:
+        flight.leave()
+        logger.warning(f"Streaming question timed out: {e}")
+        _record_question(current_user, request.message, None, agent_name, started, success=False)
+        raise HTTPException(status_code=504, detail=str(e))
+    except BaseException:
+        flight.leave()
+        raise
+
+    async def event_stream():
+        parts = []
+        success = False
+        try:
+            async for content in flight.deltas():
+                if await http_request.is_disconnected():
+                    logger.info("Client disconnected from the answer stream.")
+                    return
+                parts.append(content)
+                yield _sse(ChatStreamChunk(event="delta", content=content))
+            response = "".join(parts)
+            success = True
+            yield _sse(ChatStreamChunk(event="done", response=response, timestamp=datetime.utcnow().isoformat(), cached=False, coalesced=not leader))
+        except Exception as e:
+            logger.error(f"Error streaming answer: {e}", exc_info=True)
+            yield _sse(ChatStreamChunk(event="error", content=f"Failed to get a response from the agent: {e}"))
+        finally:
+            # Generation stops once every request sharing it has gone.
+            flight.leave()
+            # Interrupted answers are kept as far as they got.
+            _record_question(current_user, request.message, "".join(parts) or None, agent_name, started, success)
+
+    return _sse_response(event_stream())
+
+@app.get("/api/users/me/history", response_model=ChatHistoryPage)
+async def get_my_history(
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Returns the user's questions and answers, newest first. Pages are
+    keyset-paginated: pass the returned `next_cursor` to get the next page.
+    Interactions are written in the background and show up within about
+    CHAT_HISTORY_FLUSH_SECONDS.
+    """
+    limit = max(1, min(limit, 100))
+    query = select(UserQuestion).where(UserQuestion.user_id == user.id)
+    if cursor:
+        try:
+            timestamp, row_id = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.where(or_(
+            UserQuestion.timestamp < timestamp,
+            and_(UserQuestion.timestamp == timestamp, UserQuestion.id < row_id),
+        ))
+    rows = (await db.scalars(query.order_by(UserQuestion.timestamp.desc(), UserQuestion.id.desc()).limit(limit + 1))).all()
+    items = [ChatHistoryItem.model_validate(row) for row in rows[:limit]]
+    next_cursor = encode_cursor(rows[limit - 1].timestamp, rows[limit - 1].id) if len(rows) > limit else None
+    return ChatHistoryPage(items=items, next_cursor=next_cursor)
 
 @app.post("/api/auth/register", response_model=User, status_code=201)
-def register_user(user: UserCreate, session: Session = Depends(get_db)):
-    db_user = session.query(UserModel).filter(UserModel.email == user.email).first()
+async def register_user(user: UserCreate, request: Request, session: AsyncSession = Depends(get_async_db)):
+    retry_after = await login_throttle.check(_client_ip(request))
+    if retry_after:
+        raise _throttled(retry_after)
+
+    db_user = await session.scalar(select(UserModel).where(UserModel.email == user.email))
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    db_user = session.query(UserModel).filter(UserModel.username == user.username).first()
+    db_user = await session.scalar(select(UserModel).where(UserModel.username == user.username))
     if db_user:
         raise HTTPException(status_code=400, detail="Username already taken")
 
-    hashed_password = bcrypt.hashpw(user.password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    try:
+        hashed_password = await password_hasher.hash(user.password)
+    except PasswordHasherBusyError:
+        raise _hasher_busy()
     db_user = UserModel(
         username=user.username,
         email=user.email,
@@ -176,59 +636,83 @@ def register_user(user: UserCreate, session: Session = Depends(get_db)):
         is_admin=user.is_admin
     )
     session.add(db_user)
-    session.commit()
-    session.refresh(db_user)
+    await session.commit()
+    await session.refresh(db_user)
     
     # Manually add the missing field to satisfy the response model
-    user_response = User.model_validate(db_user)
-    user_response.chat_requests_count = 0
+    user_response = User.model_validate({**db_user.__dict__, "chat_requests_count": 0})
     
     return user_response
 
 @app.get("/api/admin/config", response_model=List[SystemConfigResponse])
-def get_system_config(admin: User = Depends(get_admin_user), session: Session = Depends(get_db)):
-    return session.query(SystemConfigModel).all()
+async def get_system_config(admin: User = Depends(get_admin_user), session: AsyncSession = Depends(get_async_db)):
+    return (await session.scalars(select(SystemConfigModel))).all()
 
 @app.post("/api/admin/config", response_model=SystemConfigResponse)
-def update_system_config(config_update: SystemConfigUpdate, admin: User = Depends(get_admin_user), session: Session = Depends(get_db)):
-    config_item = session.query(SystemConfigModel).filter(SystemConfigModel.key == config_update.key).first()
-    if config_item:
-        config_item.value = config_update.value
-        session.commit()
-        session.refresh(config_item)
-        return config_item
-    else:
-        new_config = SystemConfigModel(key=config_update.key, value=config_update.value)
-        session.add(new_config)
-        session.commit()
-        session.refresh(new_config)
-        return new_config
-
-@app.get("/api/admin/users", response_model=List[User])
-def list_users(admin: User = Depends(get_admin_user), session: Session = Depends(get_db)):
-    users = session.query(
-        UserModel,
-        func.count(UserQuestion.id).label("chat_requests_count")
-    ).outerjoin(UserQuestion, UserModel.id == UserQuestion.user_id)\
-     .group_by(UserModel.id)\
-     .all()
-
-    user_responses = []
-    for user, count in users:
-        user_data = user.__dict__
-        user_data['chat_requests_count'] = count
-        user_responses.append(User.model_validate(user_data))
-        
-    return user_responses
+async def update_system_config(config_update: SystemConfigUpdate, admin: User = Depends(get_admin_user), session: AsyncSession = Depends(get_async_db)):
+    """
+    Sets one runtime setting. It applies to this worker immediately and to
+    the others within SYSTEM_CONFIG_POLL_SECONDS.
+    """
+    try:
+        return await system_config.save(session, config_update.key, config_update.value)
+    except InvalidConfigValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/admin/config/runtime", response_model=dict)
+async def get_runtime_config(admin: User = Depends(get_admin_user)):
+    """
+    Returns the typed config snapshot this worker is using and its version.
+    """
+    return system_config.stats()
+
+def _user_response(user: UserModel) -> UserAdminDetailResponse:
+    count = user.chat_requests_count or 0
+    return UserAdminDetailResponse.model_validate({**user.__dict__, "chat_requests_count": count, "total_requests": count})
+
+@app.get("/api/admin/users", response_model=UserPage)
+async def list_users(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    search: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    is_admin: Optional[bool] = None,
+    admin: User = Depends(get_admin_user),
+    session: AsyncSession = Depends(get_async_db)
+):
+    """
+    Returns users newest first with their chat statistics. Pages are
+    keyset-paginated: pass the returned `next_cursor` to get the next page.
+    `search` matches part of the username or email.
+    """
+    limit = max(1, min(limit, 200))
+    query = select(UserModel)
+    if cursor:
+        try:
+            query = query.where(UserModel.id < int(cursor))
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid cursor: {cursor}")
+    if search:
+        query = query.where(or_(
+            func.lower(UserModel.username).contains(search.lower(), autoescape=True),
+            func.lower(UserModel.email).contains(search.lower(), autoescape=True),
+        ))
+    if is_active is not None:
+        query = query.where(UserModel.is_active == is_active)
+    if is_admin is not None:
+        query = query.where(UserModel.is_admin == is_admin)
+    rows = (await session.scalars(query.order_by(UserModel.id.desc()).limit(limit + 1))).all()
+    next_cursor = str(rows[limit - 1].id) if len(rows) > limit else None
+    return UserPage(items=[_user_response(user) for user in rows[:limit]], next_cursor=next_cursor)
 
 @app.patch("/api/admin/users/{user_id}", response_model=User)
-def update_user_by_admin(
+async def update_user_by_admin(
     user_id: int,
     user_update: UserUpdateAdmin,
     admin: User = Depends(get_admin_user),
-    session: Session = Depends(get_db)
+    session: AsyncSession = Depends(get_async_db)
 ):
-    user = session.query(UserModel).filter(UserModel.id == user_id).first()
+    user = await session.get(UserModel, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -237,153 +721,535 @@ def update_user_by_admin(
         setattr(user, key, value)
         
     session.add(user)
-    session.commit()
-    session.refresh(user)
-    return user
+    await session.commit()
+    await session.refresh(user)
+    if user.is_active is False:
+        await sessions.revoke_user(user.id)
+    await shared_state.publish("principals", str(user.id))
+    return _user_response(user)
 
-@app.get("/api/admin/users/{user_id}", response_model=User)
-def read_user(
+@app.get("/api/admin/users/{user_id}", response_model=UserAdminDetailResponse)
+async def read_user(
     user_id: int,
     current_user: User = Depends(get_admin_user),
-    session: Session = Depends(get_db)
+    session: AsyncSession = Depends(get_async_db)
 ):
-    user = session.query(UserModel).filter(UserModel.id == user_id).first()
+    user = await session.get(UserModel, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
+    return _user_response(user)
 
 @app.delete("/api/admin/users/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user(user_id: int, current_user: User = Depends(get_admin_user), session: Session = Depends(get_db)):
-    user = session.query(UserModel).filter(UserModel.id == user_id).first()
+async def delete_user(user_id: int, current_user: User = Depends(get_admin_user), session: AsyncSession = Depends(get_async_db)):
+    user = await session.get(UserModel, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    session.delete(user)
-    session.commit()
+    # SQLite does not enforce foreign keys but PostgreSQL does: unlink the
+    # user's history, sessions and the resumable uploads they started.
+    for model, column in (
+        (UserQuestion, UserQuestion.user_id),
+        (UserSessionModel, UserSessionModel.user_id),
+        (UploadSessionModel, UploadSessionModel.created_by),
+    ):
+        await session.execute(update(model).where(column == user_id).values({column: None}))
+    await session.delete(user)
+    await session.commit()
+    await sessions.revoke_user(user_id)
+    await shared_state.publish("principals", str(user_id))
+
+def _register_upload(db: Session, upload: StoredUpload) -> dict:
+    """
+    Moves a fully received upload into place and queues it for ingestion,
+    unless the same content (or filename) is already in the knowledge base.
+    """
+    try:
+        duplicate = db.query(KnowledgeFileModel).filter(KnowledgeFileModel.content_hash == upload.sha256).first()
+        if duplicate:
+            raise HTTPException(status_code=409, detail=f"The same content was already uploaded as '{duplicate.filename}'.")
+        if db.query(KnowledgeFileModel).filter(KnowledgeFileModel.filename == upload.filename).first():
+            raise HTTPException(status_code=409, detail=f"File '{upload.filename}' already exists.")
+
+        db_file = KnowledgeFileModel(
+            filename=upload.filename,
+            status=IngestionStatus.PROCESSING,
+            content_hash=upload.sha256,
+            size_bytes=upload.size,
+        )
+        db.add(db_file)
+        db.flush()
+        os.replace(upload.path, UPLOAD_DIR / upload.filename)
+        job = ingestion_queue.enqueue_ingest(db, db_file.id)
+        db.commit()
+    except IntegrityError:
+        # Lost a race with a concurrent upload of the same content or filename
+        db.rollback()
+        duplicate = db.query(KnowledgeFileModel).filter(KnowledgeFileModel.content_hash == upload.sha256).first()
+        if duplicate:
+            raise HTTPException(status_code=409, detail=f"The same content was already uploaded as '{duplicate.filename}'.")
+        raise HTTPException(status_code=409, detail=f"File '{upload.filename}' already exists.")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        upload.path.unlink(missing_ok=True)
+    ingestion_queue.notify()
+    logger.info(f"Successfully uploaded file: {upload.filename} ({upload.size} bytes)")
+    return {"filename": upload.filename, "job_id": job.id, "message": "File uploaded and is now being processed."}
 
 @app.post("/api/admin/knowledge/upload", status_code=200)
 async def upload_knowledge_file(
-    admin: UserModel = Depends(get_admin_user),
-    file: UploadFile = File(...),
+    request: Request,
+    admin: Principal = Depends(get_admin_user),
     agent: Agent = Depends(get_financial_agent),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Handles uploading of knowledge files, tracks them in the database,
-    and triggers the knowledge base ingestion process.
+    Handles uploading of knowledge files (multipart/form-data, field `file`),
+    tracks them in the database, and queues them for ingestion into the
+    knowledge base. The body is streamed to disk and hashed as it arrives.
     """
     if not agent:
         raise HTTPException(status_code=503, detail="Financial agent is not available. Cannot process file.")
-        
-    logger.info(f"Knowledge base received a new resource: {file.filename}")
-    
-    # Check if file already exists
-    if db.query(KnowledgeFileModel).filter(KnowledgeFileModel.filename == file.filename).first():
-        raise HTTPException(status_code=409, detail=f"File '{file.filename}' already exists.")
 
-    upload_dir = Path("tmp/uploads")
-    upload_dir.mkdir(parents=True, exist_ok=True)
-    file_path = upload_dir / file.filename
-    
+    UPLOAD_PARTIAL_DIR.mkdir(parents=True, exist_ok=True)
     try:
-        # Create DB record first
-        db_file = KnowledgeFileModel(filename=file.filename, status=IngestionStatus.PROCESSING)
-        db.add(db_file)
-        db.commit()
-        db.refresh(db_file)
-        
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        logger.info(f"Successfully uploaded file: {file.filename}")
-
-        asyncio.create_task(load_and_recreate_knowledge(agent, db_file.id, db_file.filename, db))
+        upload = await upload_service.receive_multipart(
+            request, UPLOAD_PARTIAL_DIR / f"{resumable_uploads.new_id()}.upload", settings.UPLOAD_MAX_BYTES
+        )
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info(f"Knowledge base received a new resource: {upload.filename}")
 
-        return {"filename": file.filename, "message": "File uploaded and is now being processed."}
+    try:
+        return await db.run_sync(_register_upload, upload)
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Failed to save or process uploaded file {file.filename}: {e}", exc_info=True)
-        # Rollback DB change if something went wrong after the record was created
-        if 'db_file' in locals():
-            db.delete(db_file)
-            db.commit()
+        logger.error(f"Failed to save or process uploaded file {upload.filename}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Could not process file: {e}")
 
-async def load_and_recreate_knowledge(agent: Agent, file_id: int, filename: str, db: Session):
+async def _release_upload_lease(db: AsyncSession, upload_id: str, lease: str) -> None:
+    await db.rollback()
+    await db.execute(
+        update(UploadSessionModel)
+        .where(UploadSessionModel.id == upload_id, UploadSessionModel.lease_owner == lease)
+        .values(lease_owner=None, lease_expires_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+
+async def _get_upload_session(db: AsyncSession, upload_id: str) -> UploadSessionModel:
+    upload_session = await db.get(UploadSessionModel, upload_id)
+    if not upload_session:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return upload_session
+
+@app.post("/api/admin/knowledge/uploads", response_model=UploadSessionSchema, status_code=201)
+async def create_upload_session(
+    upload: UploadSessionCreate,
+    admin: Principal = Depends(get_admin_user),
+    agent: Agent = Depends(get_financial_agent),
+    db: AsyncSession = Depends(get_async_db)
+):
     """
-    Asynchronously loads knowledge and updates the file's status in the DB.
+    Starts a resumable upload for a large file. Send the content in order
+    with `PUT /api/admin/knowledge/uploads/{id}`.
     """
-    logger.info(f"Server is now parsing '{filename}' for consumption as knowledge for the agent.")
+    if not agent:
+        raise HTTPException(status_code=503, detail="Financial agent is not available. Cannot process file.")
     try:
-        loop = asyncio.get_running_loop()
-        await loop.run_in_executor(None, agent.knowledge.load, True)
-        
-        # Update status to INGESTED on success
-        if file_id > 0:
-            db_file = db.query(KnowledgeFileModel).filter(KnowledgeFileModel.id == file_id).first()
-            if db_file:
-                db_file.status = IngestionStatus.INGESTED
-                db.commit()
-        logger.info(f"Successfully parsed and added '{filename}' to the knowledge base.")
+        filename = upload_service.safe_filename(upload.filename)
+    except UploadFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if upload.size_bytes <= 0 or upload.size_bytes > settings.UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Uploads must be between 1 and {settings.UPLOAD_MAX_BYTES} bytes.")
+    if await db.scalar(select(KnowledgeFileModel.id).where(KnowledgeFileModel.filename == filename)):
+        raise HTTPException(status_code=409, detail=f"File '{filename}' already exists.")
+
+    expired = await db.scalars(select(UploadSessionModel).where(
+        UploadSessionModel.updated_at < datetime.utcnow() - timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)
+    ))
+    for stale in expired.all():
+        resumable_uploads.discard(stale.id)
+        await db.delete(stale)
+
+    upload_session = UploadSessionModel(
+        id=resumable_uploads.new_id(), filename=filename, size_bytes=upload.size_bytes, created_by=admin.id
+    )
+    db.add(upload_session)
+    await db.commit()
+    await db.refresh(upload_session)
+    return upload_session
+
+@app.get("/api/admin/knowledge/uploads/{upload_id}", response_model=UploadSessionSchema)
+async def get_upload_session(upload_id: str, admin: Principal = Depends(get_admin_user), db: AsyncSession = Depends(get_async_db)):
+    """
+    Returns a resumable upload; `received_bytes` is the offset to resume from.
+    """
+    return await _get_upload_session(db, upload_id)
+
+@app.put("/api/admin/knowledge/uploads/{upload_id}", status_code=200)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    admin: Principal = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Appends the raw request body to a resumable upload. The `Upload-Offset`
+    header must equal the bytes received so far; on a mismatch (e.g. after a
+    dropped connection) the response is 409 with the offset to resume from.
+    The last chunk queues the file for ingestion.
+    """
+    offset = request.headers.get("upload-offset", "")
+    if not offset.isdigit():
+        raise HTTPException(status_code=400, detail="The Upload-Offset header is required.")
+    offset = int(offset)
+
+    # Claim the upload at this offset, so no request on any worker appends to it meanwhile
+    lease = resumable_uploads.new_id()
+    now = datetime.utcnow()
+    claimed = await db.execute(
+        update(UploadSessionModel)
+        .where(
+            UploadSessionModel.id == upload_id,
+            UploadSessionModel.received_bytes == offset,
+            UploadSessionModel.received_bytes < UploadSessionModel.size_bytes,
+            or_(UploadSessionModel.lease_expires_at.is_(None), UploadSessionModel.lease_expires_at < now),
+        )
+        .values(
+            lease_owner=lease,
+            lease_expires_at=now + timedelta(seconds=settings.UPLOAD_CHUNK_TIMEOUT_SECONDS + UPLOAD_LEASE_MARGIN_SECONDS),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    upload_session = await _get_upload_session(db, upload_id)
+    if claimed.rowcount != 1:
+        detail = f"Expected offset {upload_session.received_bytes}."
+        if upload_session.received_bytes == offset:
+            detail = "Another chunk of this upload is being received."
+        raise HTTPException(status_code=409, detail=detail, headers={"Upload-Offset": str(upload_session.received_bytes)})
+
+    try:
+        received = await asyncio.wait_for(
+            resumable_uploads.append(request, upload_id, offset, upload_session.size_bytes),
+            timeout=settings.UPLOAD_CHUNK_TIMEOUT_SECONDS,
+        )
+    except BaseException as e:
+        await _release_upload_lease(db, upload_id, lease)
+        if isinstance(e, UploadTooLargeError):
+            raise HTTPException(status_code=413, detail=str(e))
+        if isinstance(e, asyncio.TimeoutError):
+            raise HTTPException(status_code=408, detail="The chunk took too long to arrive.", headers={"Upload-Offset": str(offset)})
+        raise
+
+    complete = received >= upload_session.size_bytes
+    # The last chunk keeps the lease until the upload is registered
+    values = {"received_bytes": received} if complete else {"received_bytes": received, "lease_owner": None, "lease_expires_at": None}
+    recorded = await db.execute(
+        update(UploadSessionModel)
+        .where(UploadSessionModel.id == upload_id, UploadSessionModel.lease_owner == lease)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    if recorded.rowcount != 1:
+        # Cancelled while the chunk arrived
+        resumable_uploads.discard(upload_id)
+        raise HTTPException(status_code=404, detail="Upload not found")
+    response = {"upload_id": upload_id, "received_bytes": received, "size_bytes": upload_session.size_bytes}
+    if not complete:
+        return response
+
+    upload = await resumable_uploads.complete(upload_id, upload_session.filename, received)
+    await db.delete(upload_session)
+    try:
+        return {**response, **await db.run_sync(_register_upload, upload)}
     except Exception as e:
-        logger.error(f"Failed to parse and load knowledge from '{filename}': {e}", exc_info=True)
-        # Update status to FAILED on error
-        if file_id > 0:
-            db_file = db.query(KnowledgeFileModel).filter(KnowledgeFileModel.id == file_id).first()
-            if db_file:
-                db_file.status = IngestionStatus.FAILED
-                db.commit()
+        # The received file is gone either way; drop the session with it.
+        await db.execute(delete(UploadSessionModel).where(UploadSessionModel.id == upload_id))
+        await db.commit()
+        if isinstance(e, HTTPException):
+            raise
+        logger.error(f"Failed to save or process uploaded file {upload.filename}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Could not process file: {e}")
+
+@app.delete("/api/admin/knowledge/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def cancel_upload(upload_id: str, admin: Principal = Depends(get_admin_user), db: AsyncSession = Depends(get_async_db)):
+    """
+    Abandons a resumable upload and deletes what was received.
+    """
+    upload_session = await _get_upload_session(db, upload_id)
+    await db.delete(upload_session)
+    await db.commit()
+    # A chunk still arriving finds the upload gone and stops there
+    resumable_uploads.discard(upload_id)
+
+async def _orphaned_chunk_ids(db: AsyncSession, file_id: int, doc_ids: List[str]) -> List[str]:
+    """Returns the chunk ids of a file that no other file shares."""
+    shared = set(await db.scalars(
+        select(KnowledgeChunk.doc_id)
+        .where(KnowledgeChunk.file_id != file_id, KnowledgeChunk.doc_id.in_(doc_ids))
+    ))
+    return [doc_id for doc_id in doc_ids if doc_id not in shared]
 
 @app.get("/api/admin/knowledge/files", response_model=List[KnowledgeFileSchema])
-def get_knowledge_files(admin: UserModel = Depends(get_admin_user), db: Session = Depends(get_db)):
+async def get_knowledge_files(admin: Principal = Depends(get_admin_user), db: AsyncSession = Depends(get_async_db)):
+    """
+    Returns a list of all uploaded knowledge base files, their status and the
+    progress of their latest ingestion job.
+    """
+    latest_jobs = select(func.max(IngestionJobModel.id)).group_by(IngestionJobModel.file_id)
+    jobs = {
+        job.file_id: job
+        for job in await db.scalars(select(IngestionJobModel).where(IngestionJobModel.id.in_(latest_jobs)))
+    }
+    files = []
+    for db_file in await db.scalars(select(KnowledgeFileModel)):
+        file_response = KnowledgeFileSchema.model_validate(db_file)
+        if db_file.id in jobs:
+            file_response.job = IngestionJobSchema.model_validate(jobs[db_file.id])
+        files.append(file_response)
+    return files
+
+@app.get("/api/admin/knowledge/jobs", response_model=List[IngestionJobSchema])
+async def get_ingestion_jobs(limit: int = 50, admin: Principal = Depends(get_admin_user), db: AsyncSession = Depends(get_async_db)):
+    """
+    Returns the most recent ingestion jobs, newest first.
+    """
+    return (await db.scalars(select(IngestionJobModel).order_by(IngestionJobModel.id.desc()).limit(min(limit, 500)))).all()
+
+@app.post("/api/admin/knowledge/rebuild", response_model=IngestionJobSchema, status_code=202)
+async def rebuild_knowledge_base(admin: Principal = Depends(get_admin_user), db: AsyncSession = Depends(get_async_db)):
     """
-    Returns a list of all uploaded knowledge base files and their status.
+    Queues a full rebuild of the knowledge base from every uploaded file.
+    Overlapping requests share one pending rebuild.
     """
-    return db.query(KnowledgeFileModel).all()
+    job = await db.run_sync(ingestion_queue.enqueue_rebuild)
+    await db.commit()
+    await db.refresh(job)
+    ingestion_queue.notify()
+    return job
 
 @app.delete("/api/admin/knowledge/files/{file_id}", status_code=200)
 async def delete_knowledge_file(
     file_id: int,
-    admin: UserModel = Depends(get_admin_user),
+    admin: Principal = Depends(get_admin_user),
     agent: Agent = Depends(get_financial_agent),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Deletes a knowledge file from disk and the database, then triggers a
-    knowledge base rebuild.
+    Deletes a knowledge file from disk and the database and removes only that
+    file's vectors from the knowledge base.
     """
     if not agent:
-        raise HTTPException(status_code=503, detail="Financial agent is not available. Cannot rebuild knowledge base.")
+        raise HTTPException(status_code=503, detail="Financial agent is not available. Cannot update knowledge base.")
 
-    db_file = db.query(KnowledgeFileModel).filter(KnowledgeFileModel.id == file_id).first()
+    db_file = await db.get(KnowledgeFileModel, file_id)
     if not db_file:
         raise HTTPException(status_code=404, detail="File not found")
 
-    file_path = Path("tmp/uploads") / db_file.filename
+    file_path = UPLOAD_DIR / db_file.filename
+    filename = db_file.filename
+
+    if not await db.run_sync(ingestion_queue.release_file, file_id):
+        raise HTTPException(status_code=409, detail=f"File '{filename}' is being ingested or the knowledge base rebuilt. Try again once it finishes.")
     
     try:
-        # 1. Delete the physical file
+        loop = asyncio.get_running_loop()
+        chunks = (await db.scalars(select(KnowledgeChunk).where(KnowledgeChunk.file_id == file_id))).all()
+        doc_ids = [chunk.doc_id for chunk in chunks]
+        if not doc_ids and file_path.exists():
+            # Ingested before chunk ids were tracked: re-read (no embedding) to find them.
+            documents = await loop.run_in_executor(None, knowledge_service.read_file, agent.knowledge, file_path)
+            doc_ids = list({knowledge_service.chunk_id(document) for document in documents})
+
+        # 1. Remove this file's vectors (chunks shared with other files are kept)
+        orphaned = await _orphaned_chunk_ids(db, file_id, doc_ids)
+        await loop.run_in_executor(None, knowledge_service.remove_chunks, agent.knowledge, orphaned)
+        await shared_answers.invalidate()
+
+        # 2. Delete the physical file
         if file_path.exists():
             os.remove(file_path)
-            logger.info(f"Deleted knowledge file from disk: {db_file.filename}")
+            logger.info(f"Deleted knowledge file from disk: {filename}")
         
-        # 2. Delete the record from the database
-        filename = db_file.filename
-        db.delete(db_file)
-        db.commit()
+        # 3. Delete the records from the database
+        for chunk in chunks:
+            await db.delete(chunk)
+        await db.delete(db_file)
+        await db.commit()
 
-        # 3. Trigger a knowledge base rebuild asynchronously
-        logger.info(f"Triggering knowledge base rebuild after deleting {filename}.")
-        asyncio.create_task(load_and_recreate_knowledge(agent, 0, "all files", db)) # Pass a dummy ID
-
-        return {"message": f"File '{filename}' deleted and knowledge base is being updated."}
+        return {"message": f"File '{filename}' deleted and removed from the knowledge base."}
     except Exception as e:
-        logger.error(f"Failed to delete knowledge file {db_file.filename}: {e}", exc_info=True)
-        db.rollback()
+        logger.error(f"Failed to delete knowledge file {filename}: {e}", exc_info=True)
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Could not delete file: {e}")
 
+@app.get("/api/admin/knowledge/embedding-cache", response_model=dict)
+def get_embedding_cache_stats(admin: Principal = Depends(get_admin_user)):
+    """
+    Returns size and hit rate of the persistent embedding cache.
+    """
+    return get_embedding_cache(settings.EMBEDDING_CACHE_PATH, settings.EMBEDDING_CACHE_MAX_BYTES).stats()
+
+@app.get("/api/admin/knowledge/retrieval", response_model=dict)
+def get_retrieval_stats(admin: Principal = Depends(get_admin_user)):
+    """
+    Returns result-cache hits, search latency and vector index state of the knowledge search.
+    """
+    knowledge = _get_knowledge()
+    if knowledge is None or not isinstance(knowledge.vector_db, CachedLanceDb):
+        raise HTTPException(status_code=503, detail="The knowledge base is not available.")
+    return {"top_k": knowledge.num_documents, **knowledge.vector_db.stats()}
+
+@app.get("/api/admin/knowledge/vector-store", response_model=dict)
+def get_vector_store_stats(admin: Principal = Depends(get_admin_user)):
+    """
+    Returns rows, fragments, versions, indexes and bytes on disk of each vector table, and the last maintenance run.
+    """
+    return vector_maintenance.report()
+
+@app.post("/api/admin/knowledge/vector-store/maintenance", response_model=dict)
+async def run_vector_store_maintenance(admin: Principal = Depends(get_admin_user)):
+    """
+    Compacts the vector tables, prunes their old versions and rebuilds split indexes now.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, vector_maintenance.run)
+
+@app.get("/api/admin/knowledge/embedding-batcher", response_model=dict)
+def get_embedding_batcher_stats(admin: Principal = Depends(get_admin_user)):
+    """
+    Returns batch counts, retries and throughput of ingestion embedding.
+    """
+    return embedding_batcher.stats()
+
+@app.get("/api/admin/chat/answer-cache", response_model=dict)
+def get_answer_cache_stats(admin: Principal = Depends(get_admin_user)):
+    """
+    Returns hit ratio and generation time saved by the answer cache.
+    """
+    return {**answer_cache.stats(), "shared": shared_answers.stats()}
+
+@app.delete("/api/admin/chat/answer-cache", status_code=status.HTTP_204_NO_CONTENT)
+async def clear_answer_cache(admin: Principal = Depends(get_admin_user)):
+    """
+    Drops every cached answer on every worker.
+    """
+    await shared_answers.invalidate()
+
+@app.get("/api/admin/chat/history-writer", response_model=dict)
+def get_chat_history_writer_stats(admin: Principal = Depends(get_admin_user)):
+    """
+    Returns buffered, written and dropped counts of the chat history writer.
+    """
+    return chat_history.stats()
+
+@app.get("/api/admin/shared-state", response_model=dict)
+def get_shared_state_stats(admin: Principal = Depends(get_admin_user)):
+    """
+    Returns whether shared state is kept in Redis or per worker, and fallback counts.
+    """
+    return shared_state.stats()
+
+@app.get("/api/admin/auth/principal-cache", response_model=dict)
+def get_principal_cache_stats(admin: Principal = Depends(get_admin_user)):
+    """
+    Returns hit rate of the authenticated-user cache.
+    """
+    return principal_cache.stats()
+
+@app.get("/api/admin/auth/password-hasher", response_model=dict)
+def get_password_hasher_stats(admin: Principal = Depends(get_admin_user)):
+    """
+    Returns bcrypt pool load and login throttling counters.
+    """
+    return {**password_hasher.stats(), "throttle": login_throttle.stats()}
+
+@app.get("/api/admin/agents/registry", response_model=dict)
+def get_agent_registry_stats(admin: Principal = Depends(get_admin_user)):
+    """
+    Returns load times and cache-hit counters for the warm agent registry.
+    """
+    return agent_registry.stats()
+
+@app.get("/api/admin/agents/runner", response_model=dict)
+def get_agent_runner_stats(admin: Principal = Depends(get_admin_user)):
+    """
+    Returns queue depth, wait and run times for the agent worker pool.
+    """
+    return agent_runner.stats()
+
+@app.get("/api/admin/agents/team", response_model=dict)
+def get_agent_team_stats(admin: Principal = Depends(get_admin_user)):
+    """
+    Returns specialist fan-out, latency and timeouts for the agent team.
+    """
+    team = get_agent_team_if_built()
+    return team.stats() if team is not None else {"built": False}
+
+@app.get("/api/admin/chat/router", response_model=dict)
+def get_pre_router_stats(admin: Principal = Depends(get_admin_user)):
+    """
+    Returns how messages were routed and how long routing took.
+    """
+    return pre_router.stats()
+
+@app.get("/api/admin/chat/coalescing", response_model=dict)
+def get_coalescing_stats(admin: Principal = Depends(get_admin_user)):
+    """
+    Returns how many generations were shared by concurrent identical questions.
+    """
+    return answer_flights.stats()
+
+@app.get("/api/admin/ollama", response_model=dict)
+def get_ollama_stats(admin: Principal = Depends(get_admin_user)):
+    """
+    Returns health, in-flight and total requests for each Ollama host.
+    """
+    return get_ollama_pool().stats()
+
 @app.on_event("startup")
 async def startup_event():
     logger.info("Starting up the application.")
     # Create database tables
     Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine)
+    backfill_user_stats(engine)
+    await shared_state.start()
+    await shared_answers.start()
+    await system_config.start()
+    get_ollama_pool().start()
+    # Warm the agents so the first request doesn't pay for building them
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, agent_registry.get, FINANCIAL_AGENT_NAME)
+    if CHAT_AGENT_NAME != FINANCIAL_AGENT_NAME:
+        await loop.run_in_executor(None, agent_registry.get, CHAT_AGENT_NAME)
+    # Start ingestion workers, resuming jobs left over from a previous run; they first
+    # bring the vector index up to date, without holding up startup
+    await ingestion_queue.start()
+    await chat_history.start()
+    await vector_maintenance.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await vector_maintenance.stop()
+    await chat_history.stop()
+    await system_config.stop()
+    await ingestion_queue.stop()
+    document_parser.shutdown()
+    password_hasher.shutdown()
+    agent_runner.shutdown()
+    team = get_agent_team_if_built()
+    if team is not None:
+        team.shutdown()
+    get_ollama_pool().stop()
+    await shared_state.stop()
+    await async_engine.dispose()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,65 @@
+import asyncio
+
+import fakeredis
+
+from app.services.answer_cache import AnswerCache, SharedAnswers
+from app.services.shared_state import SharedState
+
+
+def embed(question: str):
+    # Every question about the market is "similar"
+    return [1.0, 0.0] if "market" in question.lower() else [0.0, 1.0]
+
+
+def make_cache() -> AnswerCache:
+    return AnswerCache(ttl_seconds=60, max_entries=10, similarity_threshold=0.9)
+
+
+def test_exact_match_within_scope():
+    cache = make_cache()
+    cache.store("How did the market do?", "Up.", 1.0, cache.version, scope="user-1")
+    cached, _ = cache.lookup("how did the market do", scope="user-1")
+    assert cached.answer == "Up."
+    assert cache.exact_hits == 1
+
+
+def test_two_users_asking_the_same_question():
+    cache = make_cache()
+    cache.store("And what about the second one?", "Bonds, from user 1's conversation.", 1.0, cache.version, scope="user-1")
+    cached, _ = cache.lookup("And what about the second one?", embed, scope="user-2")
+    assert cached is None
+    cache.store("And what about the second one?", "Gold, from user 2's conversation.", 1.0, cache.version, scope="user-2")
+    assert cache.lookup("And what about the second one?", scope="user-1")[0].answer == "Bonds, from user 1's conversation."
+    assert cache.lookup("And what about the second one?", scope="user-2")[0].answer == "Gold, from user 2's conversation."
+
+
+def test_similar_questions_match_only_within_scope():
+    cache = make_cache()
+    _, vector = cache.lookup("How did the market do today?", embed, scope="user-1")
+    cache.store("How did the market do today?", "Up.", 1.0, cache.version, vector, scope="user-1")
+    assert cache.lookup("What did the market do?", embed, scope="user-2")[0] is None
+    cached, _ = cache.lookup("What did the market do?", embed, scope="user-1")
+    assert cached.answer == "Up."
+    assert cache.semantic_hits == 1
+
+
+def test_answers_across_an_invalidation_are_not_stored():
+    cache = make_cache()
+    version = cache.version
+    cache.invalidate()
+    cache.store("How did the market do?", "Up.", 1.0, version, scope="user-1")
+    assert cache.lookup("How did the market do?", scope="user-1")[0] is None
+
+
+def test_shared_answers_are_per_scope():
+    cache = make_cache()
+    state = SharedState(None, "test:", max_connections=4, retry_seconds=30.0,
+                        client=fakeredis.FakeAsyncRedis(decode_responses=True))
+    answers = SharedAnswers(state, cache)
+
+    async def main():
+        await answers.put("How did the market do?", "Up.", 1.0, cache.version, scope="user-1")
+        return await answers.get("How did the market do?", "user-1"), await answers.get("How did the market do?", "user-2")
+    mine, theirs = asyncio.run(main())
+    assert mine.answer == "Up."
+    assert theirs is None
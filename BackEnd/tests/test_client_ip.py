@@ -0,0 +1,26 @@
+from app.services.client_ip import TrustedProxies
+
+
+def test_direct_clients_cannot_forge_their_ip():
+    proxies = TrustedProxies("10.0.0.0/8")
+    assert proxies.resolve("203.0.113.7", ["1.2.3.4"]) == "203.0.113.7"
+
+
+def test_client_behind_trusted_proxy():
+    proxies = TrustedProxies("10.0.0.0/8, ::1")
+    assert proxies.resolve("10.1.2.3", ["203.0.113.7"]) == "203.0.113.7"
+    assert proxies.resolve("::1", ["203.0.113.7, 10.1.2.3"]) == "203.0.113.7"
+
+
+def test_spoofed_hops_before_the_proxy_are_ignored():
+    proxies = TrustedProxies("10.0.0.0/8")
+    # The client sent "X-Forwarded-For: 1.2.3.4"; the proxy appended the real address
+    assert proxies.resolve("10.1.2.3", ["1.2.3.4, 203.0.113.7"]) == "203.0.113.7"
+    assert proxies.resolve("10.1.2.3", ["1.2.3.4", "203.0.113.7"]) == "203.0.113.7"
+
+
+def test_missing_header_and_invalid_entries():
+    proxies = TrustedProxies("10.0.0.0/8,not-an-ip")
+    assert proxies.resolve("10.1.2.3", []) == "10.1.2.3"
+    assert proxies.resolve(None, ["203.0.113.7"]) == "unknown"
+    assert len(proxies.networks) == 1
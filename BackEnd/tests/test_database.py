@@ -0,0 +1,55 @@
+import threading
+
+from sqlalchemy import inspect, text
+
+import app.models.knowledge  # noqa: F401 (registers the tables)
+import app.models.user  # noqa: F401
+from app.core.database import Base, _add_column, add_missing_columns, create_db_engine
+
+
+def make_engine(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(text("ALTER TABLE upload_sessions DROP COLUMN lease_owner"))
+    return engine
+
+
+def columns(engine):
+    return {column["name"] for column in inspect(engine).get_columns("upload_sessions")}
+
+
+def test_adds_missing_columns(tmp_path):
+    engine = make_engine(tmp_path)
+    assert "lease_owner" not in columns(engine)
+    add_missing_columns(engine)
+    assert "lease_owner" in columns(engine)
+
+
+def test_column_added_meanwhile_by_another_worker(tmp_path):
+    engine = make_engine(tmp_path)
+    table = Base.metadata.tables["upload_sessions"]
+    add_missing_columns(engine)
+    # This worker inspected the schema before the other one migrated it
+    _add_column(engine, table, table.c.lease_owner)
+    assert "lease_owner" in columns(engine)
+
+
+def test_workers_migrating_at_once(tmp_path):
+    engine = make_engine(tmp_path)
+    errors = []
+    start = threading.Barrier(4)
+
+    def worker():
+        start.wait()
+        try:
+            add_missing_columns(create_db_engine(f"sqlite:///{tmp_path / 'test.db'}"))
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert "lease_owner" in columns(engine)
@@ -0,0 +1,51 @@
+from app.services.embedding_cache import EmbeddingCache
+
+VECTOR = [0.5] * 256  # 1 KiB as float32
+
+
+def test_hit_and_miss(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.db"), 1 << 20)
+    key = EmbeddingCache.key("mxbai-embed-large", 256, "market")
+    assert cache.get(key) is None
+    cache.put(key, "mxbai-embed-large", 256, VECTOR)
+    assert cache.get(key) == VECTOR
+    assert cache.missing([key, "other"]) == ["other"]
+    assert cache.stats()["hits"] == cache.stats()["misses"] == 1
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.db"), 10 * 1024)
+    for i in range(10):
+        cache.put(f"k{i}", "m", 256, VECTOR)
+    # A hit keeps k0, even though it was written first
+    cache.get("k0")
+    cache.put("k10", "m", 256, VECTOR)
+    stats = cache.stats()
+    assert stats["bytes"] <= 9 * 1024
+    assert cache.get("k0") == VECTOR
+    assert cache.get("k1") is None
+    assert stats["evictions"] == 2
+
+
+def test_budget_holds_across_processes(tmp_path):
+    # Every worker opens the same file; each only writes part of the data.
+    workers = [EmbeddingCache(str(tmp_path / "cache.db"), 20 * 1024) for _ in range(4)]
+    for i in range(40):
+        workers[i % 4].put(f"k{i}", "m", 256, VECTOR)
+    assert workers[0].stats()["bytes"] <= 20 * 1024
+    assert sum(worker.evictions for worker in workers) > 0
+
+
+def test_hits_are_written_back_in_batches(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = EmbeddingCache(path, 1 << 20)
+    cache.TOUCH_BATCH_SIZE = 3
+    for i in range(3):
+        cache.put(f"k{i}", "m", 256, VECTOR)
+    before = dict(cache._conn.execute("SELECT key, last_used FROM embeddings"))
+    cache.get("k0")
+    cache.get("k1")
+    assert dict(cache._conn.execute("SELECT key, last_used FROM embeddings")) == before
+    cache.get("k2")
+    after = dict(cache._conn.execute("SELECT key, last_used FROM embeddings"))
+    assert all(after[key] > before[key] for key in before)
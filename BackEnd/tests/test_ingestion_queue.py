@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+import app.models.chat  # noqa: F401 (registers the tables)
+import app.models.user  # noqa: F401
+from app.core.database import Base, create_db_engine
+from app.models.knowledge import IngestionJob, JobKind, JobStatus
+from app.services.ingestion_queue import IngestionQueue
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+
+def make_queue(session_factory, owner: str) -> IngestionQueue:
+    queue = IngestionQueue(
+        session_factory, lambda: None, None, None, "tmp", workers=1,
+        poll_seconds=1, lease_seconds=60, max_attempts=3,
+    )
+    queue.owner = owner
+    return queue
+
+
+def add_job(session_factory, kind: JobKind, status: JobStatus = JobStatus.PENDING) -> int:
+    with session_factory() as db:
+        job = IngestionJob(kind=kind, status=status, available_at=datetime.utcnow() - timedelta(seconds=1))
+        if status == JobStatus.RUNNING:
+            job.lease_owner = "other"
+            job.lease_expires_at = datetime.utcnow() + timedelta(seconds=60)
+        db.add(job)
+        db.commit()
+        return job.id
+
+
+class StaleChecks(IngestionQueue):
+    """A worker whose checks ran before another worker's claim committed."""
+
+    def _running(self, db):
+        return super()._running(db).filter(IngestionJob.id == -1)
+
+
+def test_claims_oldest_job(session_factory):
+    first = add_job(session_factory, JobKind.INGEST)
+    add_job(session_factory, JobKind.INGEST)
+    assert make_queue(session_factory, "a")._claim() == first
+
+
+def test_rebuild_waits_for_running_jobs(session_factory):
+    add_job(session_factory, JobKind.INGEST, JobStatus.RUNNING)
+    add_job(session_factory, JobKind.REBUILD)
+    assert make_queue(session_factory, "a")._claim() is None
+
+
+def test_nothing_is_claimed_during_a_rebuild(session_factory):
+    add_job(session_factory, JobKind.REBUILD, JobStatus.RUNNING)
+    add_job(session_factory, JobKind.INGEST)
+    assert make_queue(session_factory, "a")._claim() is None
+
+
+@pytest.mark.parametrize("running, pending", [
+    (JobKind.INGEST, JobKind.REBUILD),
+    (JobKind.REBUILD, JobKind.INGEST),
+])
+def test_claim_rechecks_exclusivity(session_factory, running, pending):
+    add_job(session_factory, running, JobStatus.RUNNING)
+    job_id = add_job(session_factory, pending)
+    queue = StaleChecks(session_factory, lambda: None, None, None, "tmp", 1, 1, 60, 3)
+    assert queue._claim() is None
+    with session_factory() as db:
+        assert db.get(IngestionJob, job_id).status == JobStatus.PENDING
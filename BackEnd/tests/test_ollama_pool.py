@@ -0,0 +1,130 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from app.services.ollama_pool import OllamaPool
+from scripts.benchmark_ollama_pool import start_stub
+
+
+@pytest.fixture
+def stubs():
+    """Two fake Ollama hosts; the second is much slower than the first."""
+    servers = [start_stub(latency, parallel=8) for latency in (0.01, 0.2)]
+    yield [(f"http://127.0.0.1:{server.server_address[1]}", seen) for server, seen in servers]
+    for server, _ in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def dead_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), BaseHTTPRequestHandler)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    server.server_close()
+    return url
+
+
+def chat(client):
+    return client.chat(model="mistral", messages=[{"role": "user", "content": "How did the market do today?"}])
+
+
+def test_picks_host_with_fewest_outstanding_requests():
+    pool = OllamaPool(["http://a:11434", "http://b:11434", "http://c:11434"])
+    a, b, c = pool.hosts
+    a.outstanding, b.outstanding, c.outstanding = 2, 0, 1
+    assert pool._acquire([]) is b
+    assert b.outstanding == 1
+    # b and c now tie on outstanding; c has served fewer requests
+    assert pool._acquire([]) is c
+    assert pool._acquire([b, c]) is a
+    assert pool._acquire(pool.hosts) is None
+    pool._release(b)
+    assert b.outstanding == 0
+
+
+def test_ties_go_to_least_used_host():
+    pool = OllamaPool(["http://a:11434", "http://b:11434"])
+    a, b = pool.hosts
+    a.requests = 5
+    assert pool._acquire([]) is b
+
+
+def test_slow_host_gets_fewer_requests(stubs):
+    pool = OllamaPool([url for url, _ in stubs])
+    client = pool.client()
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        replies = list(executor.map(lambda _: chat(client), range(40)))
+    assert all(reply.message.content == "Markets were up." for reply in replies)
+    fast, slow = pool.stats()["hosts"]
+    assert fast["requests"] + slow["requests"] == 40
+    assert fast["requests"] > slow["requests"]
+    assert fast["outstanding"] == slow["outstanding"] == 0
+
+
+def test_response_releases_host(stubs):
+    pool = OllamaPool([stubs[0][0]])
+    pool.client().embed(model="mxbai-embed-large", input="market")
+    assert pool.hosts[0].outstanding == 0
+    assert pool.hosts[0].requests == 1
+
+
+def test_fails_over_on_connect_error(stubs, dead_url):
+    pool = OllamaPool([dead_url, stubs[0][0]], failure_cooldown_seconds=60)
+    client = pool.client()
+    assert chat(client).message.content == "Markets were up."
+    dead, live = pool.hosts
+    assert pool.failovers == 1
+    assert not dead.healthy and dead.failures == 1
+    assert dead.outstanding == live.outstanding == 0
+    # The dead host is skipped until its cooldown ends
+    chat(client)
+    assert dead.requests == 1
+    assert live.requests == 2
+
+
+def test_all_hosts_down_raises(dead_url):
+    pool = OllamaPool([dead_url, dead_url])
+    with pytest.raises(httpx.ConnectError):
+        pool._send(httpx.Request("POST", f"{dead_url}/api/chat", json={"model": "mistral"}))
+    assert all(host.outstanding == 0 for host in pool.hosts)
+    assert pool.failovers == 1
+
+
+def test_health_check_marks_hosts(stubs, dead_url):
+    pool = OllamaPool([dead_url, stubs[0][0]])
+    pool.check_health()
+    dead, live = pool.hosts
+    assert not dead.healthy
+    assert live.healthy
+
+
+def test_injects_keep_alive(stubs):
+    url, seen = stubs[0]
+    client = OllamaPool([url], keep_alive="30m").client()
+    chat(client)
+    assert seen["keep_alive"] == "30m"
+    client.embed(model="mxbai-embed-large", input="market")
+    assert seen["keep_alive"] == "30m"
+
+
+def test_keeps_callers_keep_alive(stubs):
+    url, seen = stubs[0]
+    client = OllamaPool([url], keep_alive="30m").client()
+    client.chat(model="mistral", messages=[{"role": "user", "content": "Hi"}], keep_alive=0)
+    assert seen["keep_alive"] == 0
+
+
+def test_numeric_keep_alive_is_sent_as_a_number(stubs):
+    url, seen = stubs[0]
+    chat(OllamaPool([url], keep_alive="-1").client())
+    assert seen["keep_alive"] == -1
+    assert OllamaPool([url], keep_alive="1.5").keep_alive == 1.5
+
+
+def test_no_keep_alive_by_default(stubs):
+    url, seen = stubs[0]
+    chat(OllamaPool([url]).client())
+    assert seen["keep_alive"] is None
@@ -0,0 +1,180 @@
+import asyncio
+import time
+
+import fakeredis
+import pytest
+
+from app.services.session_store import SessionStore
+from app.services.shared_state import SharedState
+
+
+def make_state(redis: bool) -> SharedState:
+    client = fakeredis.FakeAsyncRedis(decode_responses=True) if redis else None
+    return SharedState(None, "test:", max_connections=4, retry_seconds=30.0, client=client)
+
+
+def run(state: SharedState, scenario):
+    async def main():
+        await state.start()
+        try:
+            return await scenario(state)
+        finally:
+            await state.stop()
+    return asyncio.run(main())
+
+
+@pytest.fixture(params=["redis", "local"])
+def state(request) -> SharedState:
+    return make_state(request.param == "redis")
+
+
+def test_values_and_sets(state):
+    async def scenario(state):
+        await state.set_json("a", {"x": 1}, ttl_seconds=60)
+        assert await state.get_many_json(["a", "missing"]) == [{"x": 1}, None]
+        assert await state.incr("counter") == 1
+        assert await state.incr("counter") == 2
+        await state.set_add("members", "one", 60)
+        await state.set_add("members", "two", 60)
+        await state.set_remove("members", "one")
+        assert await state.set_members("members") == {"two"}
+        await state.delete("a", "members")
+        assert await state.get_json("a") is None
+        assert await state.set_members("members") == set()
+    run(state, scenario)
+
+
+def test_window_acquire_limits(state):
+    async def scenario(state):
+        assert [await state.window_acquire("login", 60, 3) for _ in range(3)] == [None, None, None]
+        retry_after = await state.window_acquire("login", 60, 3)
+        assert retry_after is not None and 0 < retry_after <= 60
+        # A refused attempt is not recorded, so the count stays at the limit.
+        assert (await state.window_count("login", 60))[0] == 3
+        assert await state.window_acquire("other", 60, 3) is None
+    run(state, scenario)
+
+
+def test_window_acquire_expires(state):
+    async def scenario(state):
+        assert await state.window_acquire("burst", 0.2, 1) is None
+        assert await state.window_acquire("burst", 0.2, 1) is not None
+        await asyncio.sleep(0.3)
+        assert await state.window_acquire("burst", 0.2, 1) is None
+    run(state, scenario)
+
+
+def test_redis_keys_are_prefixed():
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    state = SharedState(None, "test:", max_connections=4, retry_seconds=30.0, client=client)
+
+    async def scenario(state):
+        await state.set_json("a", 1)
+        return await client.get("test:a")
+    assert run(state, scenario) == "1"
+
+
+def test_falls_back_to_local_while_redis_is_down():
+    server = fakeredis.FakeServer()
+    client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    state = SharedState(None, "test:", max_connections=4, retry_seconds=30.0, client=client)
+
+    async def scenario(state):
+        assert state.shared
+        server.connected = False
+        await state.set_json("a", 1)
+        assert not state.shared
+        assert state.redis_errors == 1
+        # Served from process memory until the retry interval passes
+        server.connected = True
+        assert await state.get_json("a") == 1
+        assert state.local_operations == 2
+        assert await client.get("test:a") is None
+        state._down_until = 0.0
+        assert state.shared
+        assert await state.get_json("a") is None
+    run(state, scenario)
+
+
+def test_unreachable_redis_at_start():
+    server = fakeredis.FakeServer()
+    server.connected = False
+    state = SharedState(None, "test:", max_connections=4, retry_seconds=30.0,
+                        client=fakeredis.FakeAsyncRedis(server=server, decode_responses=True))
+
+    async def scenario(state):
+        assert not state.shared
+        assert await state.window_acquire("login", 60, 1) is None
+        assert await state.window_acquire("login", 60, 1) is not None
+        return state.stats()
+    stats = run(state, scenario)
+    assert stats["backend"] == "local"
+    assert stats["redis_errors"] >= 1
+
+
+def test_broadcast_reaches_other_workers():
+    server = fakeredis.FakeServer()
+    workers = [
+        SharedState(None, "test:", max_connections=4, retry_seconds=30.0,
+                    client=fakeredis.FakeAsyncRedis(server=server, decode_responses=True))
+        for _ in range(2)
+    ]
+    received = [[], []]
+    for worker, messages in zip(workers, received):
+        worker.subscribe("cache", messages.append)
+
+    async def main():
+        for worker in workers:
+            await worker.start()
+        try:
+            await asyncio.sleep(0.1)
+            await workers[0].publish("cache", "flush")
+            for _ in range(50):
+                if received[1]:
+                    break
+                await asyncio.sleep(0.05)
+        finally:
+            for worker in workers:
+                await worker.stop()
+    asyncio.run(main())
+    assert received == [["flush"], ["flush"]]
+
+
+def test_session_revocation(state):
+    async def scenario(state):
+        sessions = SessionStore(state, ttl_seconds=60)
+        issued_at = time.time()
+        first = await sessions.create(1, "127.0.0.1")
+        second = await sessions.create(1, None)
+        other = await sessions.create(2, None)
+        assert {record["session_id"] for record in await sessions.list(1)} == {first, second}
+        assert not await sessions.is_revoked(first, 1, issued_at)
+
+        await sessions.revoke(first, 1)
+        assert await sessions.is_revoked(first, 1, issued_at)
+        assert not await sessions.is_revoked(second, 1, issued_at)
+        assert [record["session_id"] for record in await sessions.list(1)] == [second]
+
+        await sessions.revoke_user(1)
+        assert await sessions.is_revoked(second, 1, issued_at)
+        assert await sessions.list(1) == []
+        # Tokens issued after the user was revoked (a fresh login) are valid
+        assert not await sessions.is_revoked(second, 1, time.time() + 1)
+        assert not await sessions.is_revoked(other, 2, issued_at)
+    run(state, scenario)
+
+
+def test_revocation_is_seen_by_other_workers():
+    server = fakeredis.FakeServer()
+    workers = [
+        SessionStore(SharedState(None, "test:", max_connections=4, retry_seconds=30.0,
+                                 client=fakeredis.FakeAsyncRedis(server=server, decode_responses=True)), 60)
+        for _ in range(2)
+    ]
+
+    async def main():
+        issued_at = time.time()
+        session_id = await workers[0].create(7, None)
+        await workers[1].revoke(session_id, 7)
+        return await workers[0].is_revoked(session_id, 7, issued_at)
+    assert asyncio.run(main())
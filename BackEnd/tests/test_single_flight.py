@@ -0,0 +1,68 @@
+import asyncio
+
+from app.services.single_flight import Flight, SingleFlight
+
+
+def test_concurrent_requests_share_a_generation():
+    flights = SingleFlight()
+    calls = []
+
+    async def produce(flight: Flight) -> str:
+        calls.append(flight.key)
+        await asyncio.sleep(0.05)
+        return "Up."
+
+    async def main():
+        joined = [flights.join("q", produce) for _ in range(3)]
+        try:
+            return [await flight.wait() for flight, _ in joined], [leader for _, leader in joined]
+        finally:
+            for flight, _ in joined:
+                flight.leave()
+    results, leaders = asyncio.run(main())
+    assert results == ["Up."] * 3
+    assert leaders == [True, False, False]
+    assert calls == ["q"]
+    assert flights.stats()["in_flight"] == 0
+
+
+def test_join_after_last_subscriber_left_starts_a_new_generation():
+    flights = SingleFlight()
+
+    async def produce(flight: Flight) -> str:
+        await asyncio.sleep(0.05)
+        return "Up."
+
+    async def main():
+        first, _ = flights.join("q", produce)
+        first.leave()
+        # The cancelled task has not finished yet, so its key is still registered
+        second, leader = flights.join("q", produce)
+        try:
+            return await second.wait(), leader, second is first
+        finally:
+            second.leave()
+    result, leader, same = asyncio.run(main())
+    assert result == "Up."
+    assert leader and not same
+    assert flights.stats()["in_flight"] == 0
+
+
+def test_abandoned_flight_is_forgotten():
+    flights = SingleFlight()
+    started = asyncio.Event()
+
+    async def produce(flight: Flight) -> str:
+        started.set()
+        await asyncio.sleep(10)
+        return "Up."
+
+    async def main():
+        flight, _ = flights.join("q", produce)
+        await started.wait()
+        flight.leave()
+        await asyncio.gather(flight.task, return_exceptions=True)
+        await asyncio.sleep(0)
+    asyncio.run(main())
+    assert flights.stats()["cancelled"] == 1
+    assert flights.stats()["in_flight"] == 0
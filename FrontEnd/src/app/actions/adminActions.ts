@@ -3,9 +3,11 @@
 import { revalidatePath } from 'next/cache';
 import { API_BASE_URL } from '@/lib/config';
 
-export async function getUsers(token: string) {
+export async function getUsers(token: string, cursor?: string | null) {
     try {
-        const response = await fetch(`${API_BASE_URL}/api/admin/users`, {
+        // Returns one page: { items, next_cursor }
+        const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+        const response = await fetch(`${API_BASE_URL}/api/admin/users${query}`, {
             cache: 'no-store',
             method: 'GET',
             headers: {
@@ -0,0 +1,47 @@
+import { NextRequest, NextResponse } from 'next/server';
+import { logger } from '@/lib/logger';
+
+const API_BASE_URL = process.env.NEXT_PUBLIC_API_BASE_URL || 'http://localhost:8000';
+
+export async function POST(req: NextRequest) {
+  try {
+    const authHeader = req.headers.get('authorization');
+    if (!authHeader) {
+        return NextResponse.json({ error: 'Unauthorized' }, { status: 401 });
+    }
+
+    const body = await req.json();
+    logger.info('Forwarding streaming chat request to backend', { message: body.message });
+
+    // Abort the backend request when the browser goes away so generation stops.
+    const backendRes = await fetch(`${API_BASE_URL}/api/ask/stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'Authorization': authHeader,
+      },
+      body: JSON.stringify(body),
+      signal: req.signal,
+    });
+
+    if (!backendRes.ok || !backendRes.body) {
+      const errorData = await backendRes.text();
+      logger.error(`Backend streaming chat request failed with status ${backendRes.status}`, { error: errorData });
+      return NextResponse.json({ error: 'Failed to get response from agent.' }, { status: backendRes.status });
+    }
+
+    // Pass the Server-Sent Events through untouched.
+    return new Response(backendRes.body, {
+      status: 200,
+      headers: {
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'Connection': 'keep-alive',
+      },
+    });
+
+  } catch (error) {
+    logger.error('Unexpected error in streaming chat proxy endpoint', error);
+    return NextResponse.json({ error: 'Internal server error' }, { status: 500 });
+  }
+}
@@ -1,15 +1,28 @@
-import { NextResponse } from 'next/server';
+import { NextRequest, NextResponse } from 'next/server';
+import { logger } from '@/lib/logger';
 
-export async function POST() {
+const API_BASE_URL = process.env.NEXT_PUBLIC_API_BASE_URL || 'http://localhost:8000';
+
+export async function POST(request: NextRequest) {
   try {
-    // In a real application, you would invalidate the token on the server-side if using a blacklist.
-    // For JWT, the client is responsible for deleting the token.
-    // Here, we clear the cookie by setting its expiry to a past date.
+    // Revoke the session on the backend so the token stops working on every worker
+    const authHeader = request.headers.get('authorization');
+    if (authHeader && authHeader.startsWith('Bearer ')) {
+      const backendRes = await fetch(`${API_BASE_URL}/api/auth/logout`, {
+        method: 'POST',
+        headers: { 'Authorization': authHeader },
+      });
+      if (!backendRes.ok && backendRes.status !== 401) {
+        logger.warning(`Backend logout failed with status ${backendRes.status}`);
+      }
+    }
+
+    // Clear the cookie by setting its expiry to a past date.
     const response = NextResponse.json({ message: 'Logout successful' });
     response.cookies.set('token', '', { httpOnly: true, path: '/', expires: new Date(0) });
     return response;
   } catch (error) {
-    console.error('Logout error:', error);
+    logger.error('Logout error', error);
     return NextResponse.json({ message: 'Internal server error' }, { status: 500 });
   }
-} 
\ No newline at end of file
+}
@@ -1,25 +1,7 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { authService } from '@/lib/auth';
+import { logger } from '@/lib/logger';
 
-// Mock user history data
-const userHistory = [
-  {
-    id: '1',
-    question: 'What is the current market trend?',
-    answer: 'Based on recent data, the market shows an upward trend...',
-    agent_name: 'Financial Analyst',
-    timestamp: '2024-01-19T20:30:00Z',
-    response_time: 2.5
-  },
-  {
-    id: '2',
-    question: 'Analyze the quarterly earnings report',
-    answer: 'The quarterly earnings report indicates strong performance...',
-    agent_name: 'Data Processor',
-    timestamp: '2024-01-19T20:25:00Z',
-    response_time: 1.8
-  }
-];
+const API_BASE_URL = process.env.NEXT_PUBLIC_API_BASE_URL || 'http://localhost:8000';
 
 export async function GET(request: NextRequest) {
   try {
@@ -29,17 +11,29 @@ export async function GET(request: NextRequest) {
       return NextResponse.json({ error: 'Unauthorized' }, { status: 401 });
     }
 
-    const token = authHeader.replace('Bearer ', '');
-    const decoded = authService.verifyToken(token);
+    // Pass pagination (`limit`, `cursor`) through to the backend
+    const params = new URLSearchParams();
+    for (const key of ['limit', 'cursor']) {
+      const value = request.nextUrl.searchParams.get(key);
+      if (value) params.set(key, value);
+    }
+
+    const backendRes = await fetch(`${API_BASE_URL}/api/users/me/history?${params}`, {
+      headers: { 'Authorization': authHeader },
+    });
+
+    if (!backendRes.ok) {
+      const errorData = await backendRes.text();
+      logger.error(`Backend history request failed with status ${backendRes.status}`, { error: errorData });
+      return NextResponse.json({ error: 'Failed to get user history' }, { status: backendRes.status });
+    }
 
-    // In a real application, you would filter history by user ID
-    // For now, return mock data
-    return NextResponse.json(userHistory);
+    return NextResponse.json(await backendRes.json());
   } catch (error) {
-    console.error('User history error:', error);
+    logger.error('User history error', error);
     return NextResponse.json(
       { error: 'Failed to get user history' },
       { status: 500 }
     );
   }
-} 
\ No newline at end of file
+}
@@ -15,19 +15,22 @@ interface User {
   is_admin: boolean;
   created_at: string;
   chat_requests_count: number;
+  last_activity: string | null;
 }
 
 export function UserManagement() {
   const [users, setUsers] = useState<User[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [selectedUserIds, setSelectedUserIds] = useState<number[]>([]);
   const { toast } = useToast();
   const { token } = useAuth();
 
-  const fetchUsers = async () => {
+  const fetchUsers = async (cursor: string | null = null) => {
     if (!token) return;
     try {
-      const fetchedUsers = await getUsers(token);
-      setUsers(fetchedUsers);
+      const page = await getUsers(token, cursor);
+      setUsers(prev => (cursor ? [...prev, ...page.items] : page.items));
+      setNextCursor(page.next_cursor);
     } catch (error) {
       toast({
         title: 'Error fetching users',
@@ -120,6 +123,7 @@ export function UserManagement() {
                 <TableHead>Admin</TableHead>
                 <TableHead>Created At</TableHead>
                 <TableHead>Chats</TableHead>
+                <TableHead>Last Active</TableHead>
             </TableRow>
             </TableHeader>
             <TableBody>
@@ -136,10 +140,18 @@ export function UserManagement() {
                 <TableCell>{user.is_admin ? 'Yes' : 'No'}</TableCell>
                 <TableCell>{new Date(user.created_at).toLocaleDateString()}</TableCell>
                 <TableCell>{user.chat_requests_count}</TableCell>
+                <TableCell>{user.last_activity ? new Date(user.last_activity).toLocaleDateString() : '-'}</TableCell>
                 </TableRow>
             ))}
             </TableBody>
         </Table>
+        {nextCursor && (
+            <div className="flex justify-center mt-4">
+                <Button variant="outline" onClick={() => fetchUsers(nextCursor)}>
+                    Load more
+                </Button>
+            </div>
+        )}
     </div>
   );
 } 
\ No newline at end of file
@@ -105,10 +105,15 @@ export function AuthProvider({ children }: { children: ReactNode }) {
     setUser(null);
     setToken(null);
 
-    // No need to call backend logout, as token is self-contained (JWT)
-    // and will be invalid on the client side anyway.
-    // If you had session-based auth on the backend, you would need this.
-    
+    // Revoke the session server-side; the redirect does not wait on it.
+    if (token) {
+      fetch('/api/auth/logout', {
+        method: 'POST',
+        headers: { 'Authorization': `Bearer ${token}` },
+        keepalive: true,
+      }).catch((error) => logger.error('Logout request failed', error));
+    }
+
     window.location.href = '/login';
   };
 